@@ -16,11 +16,35 @@ New Features:
 - Enhanced scoring with description bonuses
 """
 
+import hashlib
+import json
+import numpy as np
 import pandas as pd
 import re
 import os
 from datetime import datetime
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from keyword_automaton import KeywordAutomaton
+from taxonomy import TAXONOMY_FILE, load_taxonomy
+
+# "batch" scores all products at once (BatchKeywordScorer); "row" runs
+# categorize_product_enhanced on each row
+SCORER_MODE = os.getenv("CATEGORY_SCORER", "batch")
+
+# Process pool for large feeds: worker processes, the smallest feed worth
+# sharding, and rows per shard (0 = split evenly, a few shards per worker)
+CATEGORY_WORKERS = int(os.getenv("CATEGORY_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_MIN_ROWS = int(os.getenv("CATEGORY_PARALLEL_MIN_ROWS", "500"))
+CATEGORY_CHUNK_SIZE = int(os.getenv("CATEGORY_CHUNK_SIZE", "0"))
+
+# Persistent scoring results, keyed by a hash of each product's inputs.
+# Bump SCORER_VERSION whenever the scoring code changes so cached results
+# from the old logic are dropped; edits to the keyword tables invalidate
+# the cache on their own through tables_version().
+CATEGORIZATION_CACHE_FILE = os.getenv("CATEGORIZATION_CACHE_FILE", "categorization_cache.json")
+SCORER_VERSION = 1
 
 def load_csv_file():
     """Load the merchant feed CSV file"""
@@ -243,7 +267,16 @@ def get_brand_defaults():
     }
 
 def get_category_reference():
-    """Expanded category ID to Name mapping for reference"""
+    """
+    Category ID to name mapping for reports: the full Google taxonomy from
+    the shared index when the taxonomy file is present, otherwise the
+    built-in names below
+    """
+    if os.path.isfile(TAXONOMY_FILE):
+        try:
+            return load_taxonomy(TAXONOMY_FILE).paths
+        except Exception as e:
+            print(f"⚠️ Could not load {TAXONOMY_FILE}, using built-in category names: {e}")
     return {
         588: 'Home & Garden > Decor > Home Fragrances > Candles',
         574: 'Home & Garden > Decor > Baskets',
@@ -510,6 +543,373 @@ def analyze_fallback_patterns(text):
     
     return {'category': None, 'score': 0, 'pattern': None}
 
+# Context words per category group used by calculate_context_bonus:
+# (category ids, context words, points per word present)
+CONTEXT_GROUPS = [
+    ([2915], ['scent', 'smell', 'aroma', 'fragrant', 'perfumed', 'aromatic',
+              'spray', 'bottle', 'ml', 'fluid', 'liquid', 'essential', 'oil'], 3),
+    ([3367], ['photo', 'picture', 'image', 'display', 'wall', 'desk',
+              'memory', 'family', 'wedding', 'graduation'], 3),
+    ([594], ['bulb', 'watt', 'bright', 'dim', 'glow', 'illumination',
+             'switch', 'shade', 'cord', 'plug'], 3),
+    ([3553, 3498, 674, 2169], ['kitchen', 'dining', 'meal', 'food', 'eat', 'drink',
+                               'dishwasher', 'microwave', 'table', 'dinner'], 2),
+]
+
+def _is_word_char(char):
+    # Same character class as \w in a str regex
+    return char.isalnum() or char == '_'
+
+def _word_boundary(text, index):
+    """Whether \b matches at index of text."""
+    before = index > 0 and _is_word_char(text[index - 1])
+    after = index < len(text) and _is_word_char(text[index])
+    return before != after
+
+class BatchKeywordScorer:
+    """
+    Batch version of the keyword strategy of categorize_product_enhanced.
+
+    The keyword tables are compiled once into an Aho-Corasick automaton, so
+    each product's text is scanned a single time for every keyword. The
+    matches of all products are collected into one sparse (product, keyword)
+    table and scored with NumPy, adding the bonuses in the same order as the
+    per-row code so the float scores are identical.
+    """
+
+    def __init__(self, category_mappings, description_keywords):
+        self.all_keywords = {**category_mappings, **description_keywords}
+        self.keywords = list(self.all_keywords)
+        self.automaton = KeywordAutomaton((keyword, index) for index, keyword in enumerate(self.keywords))
+
+        self.category_ids = np.array([self.all_keywords[k] for k in self.keywords], dtype=np.int64)
+        self.keyword_lengths = np.array([len(k) for k in self.keywords], dtype=np.int64)
+        word_counts = np.array([len(k.split()) for k in self.keywords], dtype=np.int64)
+        self.phrase_bonus = np.where(word_counts >= 3, 25, np.where(word_counts == 2, 15, 0))
+        self.is_description_keyword = np.array([k in description_keywords for k in self.keywords])
+        # Context group of each keyword's category (-1: no context bonus)
+        self.context_group = np.full(len(self.keywords), -1, dtype=np.int64)
+        for group, (category_ids, _, _) in enumerate(CONTEXT_GROUPS):
+            self.context_group[np.isin(self.category_ids, category_ids)] = group
+
+    def match(self, title_lower, description_lower):
+        """
+        Scan one product's combined text.
+
+        Returns:
+            {keyword index: [in_title, in_description, boundary, title_pos]}
+            for every keyword occurring in the combined text.
+        """
+        combined_text = f"{title_lower} {description_lower}"
+        title_end = len(title_lower)
+        found = {}
+        for start, end, index in self.automaton.iter_matches(combined_text):
+            entry = found.get(index)
+            if entry is None:
+                entry = found[index] = [False, False, False, -1]
+            if end <= title_end:
+                entry[0] = True
+                if entry[3] == -1 or start < entry[3]:
+                    entry[3] = start
+            if start > title_end:
+                entry[1] = True
+            if not entry[2] and _word_boundary(combined_text, start) and _word_boundary(combined_text, end):
+                entry[2] = True
+        return found
+
+    def context_bonuses(self, combined_text):
+        """calculate_context_bonus for each context group."""
+        return [min(sum(points for word in words if word in combined_text), 15)
+                for _, words, points in CONTEXT_GROUPS]
+
+    def score(self, texts):
+        """
+        Best keyword match for each product.
+
+        Args:
+            texts: (title_lower, description_lower) per product.
+
+        Returns:
+            One entry per product: (keyword, category_id, score, location), or
+            None when no keyword matched or a match spans the title/description
+            join (those rows are left to categorize_product_enhanced).
+        """
+        rows, keyword_ids, flags, positions, contexts = [], [], [], [], []
+        usable = []
+        for row, (title_lower, description_lower) in enumerate(texts):
+            found = self.match(title_lower, description_lower)
+            # A keyword only found across the join leaves the row's match
+            # location to the per-row code
+            ok = bool(found) and all(entry[0] or entry[1] for entry in found.values())
+            usable.append(ok)
+            if not ok:
+                continue
+            contexts.append(self.context_bonuses(f"{title_lower} {description_lower}"))
+            for index in sorted(found):
+                in_title, in_description, boundary, title_pos = found[index]
+                rows.append(row)
+                keyword_ids.append(index)
+                flags.append((in_title, in_description, boundary))
+                positions.append(title_pos)
+
+        results = [None] * len(texts)
+        if not rows:
+            return results
+
+        rows = np.array(rows, dtype=np.int64)
+        keyword_ids = np.array(keyword_ids, dtype=np.int64)
+        flags = np.array(flags, dtype=bool).reshape(-1, 3)
+        in_title, in_description, boundary = flags[:, 0], flags[:, 1], flags[:, 2]
+        positions = np.array(positions, dtype=np.int64)
+
+        # Context bonus of each match: its row's bonus for the keyword's group
+        context_rows = np.cumsum(usable) - 1
+        contexts = np.array(contexts, dtype=np.int64).reshape(-1, len(CONTEXT_GROUPS))
+        groups = self.context_group[keyword_ids]
+        context_bonus = np.where(groups >= 0, contexts[context_rows[rows], np.maximum(groups, 0)], 0)
+
+        # Same additions, in the same order, as categorize_product_enhanced
+        score = np.full(len(rows), 15.0)
+        score += np.where(in_title, 30, np.where(in_description, 15, 0))
+        score += np.where(boundary, 20, 0)
+        score += self.keyword_lengths[keyword_ids] * 1.2
+        score += self.phrase_bonus[keyword_ids]
+        score += np.where(positions != -1, np.maximum(0, 15 - (positions / 8)), 0)
+        score += np.where(self.is_description_keyword[keyword_ids] & in_description, 10, 0)
+        score += context_bonus
+
+        # Highest score per row; ties go to the first keyword in table order
+        order = np.lexsort((keyword_ids, -score, rows))
+        best_rows, first = np.unique(rows[order], return_index=True)
+        for row, match in zip(best_rows, order[first]):
+            keyword = self.keywords[keyword_ids[match]]
+            location = "title" if in_title[match] else "description"
+            results[row] = (keyword, self.all_keywords[keyword], float(score[match]), location)
+        return results
+
+def categorize_products_batch(rows, category_mappings, description_keywords, brand_defaults, manual_overrides,
+                              scorer=None):
+    """
+    Analysis dicts for many rows at once, identical to calling
+    categorize_product_enhanced on each. Manual overrides and rows without
+    a usable keyword match (brand and pattern fallbacks) use the per-row code.
+    """
+    scorer = scorer or BatchKeywordScorer(category_mappings, description_keywords)
+
+    texts = []
+    for row in rows:
+        title_raw = row.get('title', '')
+        title = str(title_raw) if pd.notna(title_raw) and title_raw is not None else ''
+        description_raw = row.get('description', '')
+        description = str(description_raw) if pd.notna(description_raw) and description_raw is not None else ''
+        texts.append((title.lower(), description.lower()))
+
+    best = scorer.score(texts)
+    analyses = []
+    for row, match in zip(rows, best):
+        product_id = str(row.get('id', '')) if row.get('id') is not None else ''
+        if match is None or product_id in manual_overrides:
+            analyses.append(categorize_product_enhanced(
+                row, category_mappings, description_keywords, brand_defaults, manual_overrides
+            ))
+            continue
+
+        keyword, best_match, best_score, location = match
+        current_category = row.get('google_product_category', '')
+        confidence = 'LOW'
+        if best_score >= 50:
+            confidence = 'HIGH'
+        elif best_score >= 30:
+            confidence = 'MEDIUM'
+        analyses.append({
+            'original_category': current_category,
+            'suggested_category': best_match,
+            'confidence': confidence,
+            'score': best_score,
+            'matched_keyword': keyword,
+            'changed': bool(best_match and best_match != current_category),
+            'source': f'Keyword Match ({location})'
+        })
+    return analyses
+
+def categorize_rows(rows, category_mappings, description_keywords, brand_defaults, manual_overrides,
+                    mode=SCORER_MODE, scorer=None):
+    """Analysis dicts for rows in the given scoring mode ("batch" or "row")."""
+    if mode == 'batch':
+        return categorize_products_batch(rows, category_mappings, description_keywords, brand_defaults,
+                                         manual_overrides, scorer)
+    return [categorize_product_enhanced(row, category_mappings, description_keywords, brand_defaults, manual_overrides)
+            for row in rows]
+
+# Keyword tables of a pool worker, set once per process by _init_worker
+_worker_tables = None
+
+def _init_worker(category_mappings, description_keywords, brand_defaults, manual_overrides, mode):
+    global _worker_tables
+    scorer = BatchKeywordScorer(category_mappings, description_keywords) if mode == 'batch' else None
+    _worker_tables = (category_mappings, description_keywords, brand_defaults, manual_overrides, mode, scorer)
+
+def _categorize_chunk(rows):
+    category_mappings, description_keywords, brand_defaults, manual_overrides, mode, scorer = _worker_tables
+    return categorize_rows(rows, category_mappings, description_keywords, brand_defaults, manual_overrides,
+                           mode, scorer)
+
+def categorize_rows_parallel(rows, category_mappings, description_keywords, brand_defaults, manual_overrides,
+                             workers=CATEGORY_WORKERS, chunk_size=CATEGORY_CHUNK_SIZE, mode=SCORER_MODE):
+    """
+    categorize_rows over a process pool. The keyword tables are sent to each
+    worker once (pool initializer), rows go out in contiguous shards and the
+    analyses come back in the original row order.
+    """
+    if workers <= 1 or len(rows) < PARALLEL_MIN_ROWS:
+        return categorize_rows(rows, category_mappings, description_keywords, brand_defaults, manual_overrides, mode)
+
+    if chunk_size <= 0:
+        chunk_size = max(1, -(-len(rows) // (workers * 4)))
+    # Plain dicts pickle far smaller than Series; categorization only uses .get()
+    records = [row.to_dict() if isinstance(row, pd.Series) else row for row in rows]
+    chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+    print(f"   Sharding {len(rows)} products into {len(chunks)} chunks across {workers} processes")
+
+    analyses = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(category_mappings, description_keywords, brand_defaults,
+                                       manual_overrides, mode)) as pool:
+        for chunk_analyses in pool.map(_categorize_chunk, chunks):
+            analyses.extend(chunk_analyses)
+    return analyses
+
+def tables_version(category_mappings, description_keywords, brand_defaults):
+    """Hash of the keyword tables, context words and SCORER_VERSION."""
+    tables = {
+        'scorer_version': SCORER_VERSION,
+        'category_mappings': sorted(category_mappings.items()),
+        'description_keywords': sorted(description_keywords.items()),
+        'brand_defaults': sorted(brand_defaults.items()),
+        # Keyword order decides ties, so it is part of the version too
+        'keyword_order': list({**category_mappings, **description_keywords}),
+        'context_groups': CONTEXT_GROUPS,
+    }
+    return hashlib.sha256(json.dumps(tables, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def _text_field(row, field):
+    value = row.get(field, '')
+    return str(value) if pd.notna(value) and value is not None else ''
+
+def categorization_key(row):
+    """Hash of the inputs that decide a product's keyword/brand/pattern match."""
+    inputs = [_text_field(row, 'title'), _text_field(row, 'description'), _text_field(row, 'brand')]
+    return hashlib.sha256(json.dumps(inputs).encode('utf-8')).hexdigest()
+
+class CategorizationCache:
+    def __init__(self, version, path=CATEGORIZATION_CACHE_FILE):
+        """
+        Load cached scoring results.
+
+        Args:
+            version: tables_version() of this run; a cache written with other
+                     tables (or another SCORER_VERSION) is discarded.
+            path: JSON file holding the cache.
+        """
+        self.path = path
+        self.version = version
+        self.entries = {}
+        self.used = set()
+        self.stats = {'hits': 0, 'misses': 0}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == version:
+                    self.entries = data.get('entries', {})
+                    print(f"✅ Loaded {len(self.entries)} cached categorizations from {path}")
+                else:
+                    print(f"♻️ Keyword tables changed since {path} was written; re-scoring every product")
+            except Exception as e:
+                print(f"⚠️ Error reading {path}: {e}")
+
+    def get(self, key):
+        """The cached decision for a key, or None."""
+        decision = self.entries.get(key)
+        if decision is None:
+            self.stats['misses'] += 1
+        else:
+            self.stats['hits'] += 1
+            self.used.add(key)
+        return decision
+
+    def put(self, key, decision):
+        self.entries[key] = decision
+        self.used.add(key)
+
+    def save(self):
+        """Write entries used this run (products that left the feed are dropped)."""
+        data = {'version': self.version, 'entries': {key: self.entries[key] for key in sorted(self.used)}}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        print(f"✅ Saved {len(self.used)} categorizations to {self.path} "
+              f"({self.stats['hits']} reused, {self.stats['misses']} scored)")
+
+def analysis_decision(analysis):
+    """The part of an analysis that depends only on the cached inputs."""
+    return {
+        'category': analysis['suggested_category'] if analysis['source'] != 'No Match' else None,
+        'confidence': analysis['confidence'],
+        'score': analysis['score'],
+        'matched_keyword': analysis['matched_keyword'],
+        'source': analysis['source'],
+    }
+
+def decision_analysis(decision, current_category):
+    """Rebuild categorize_product_enhanced's analysis for a row from a cached decision."""
+    best_match = decision['category']
+    return {
+        'original_category': current_category,
+        'suggested_category': best_match if best_match else current_category,
+        'confidence': decision['confidence'],
+        'score': decision['score'],
+        'matched_keyword': decision['matched_keyword'],
+        'changed': bool(best_match and best_match != current_category),
+        'source': decision['source']
+    }
+
+def categorize_rows_cached(rows, category_mappings, description_keywords, brand_defaults, manual_overrides, cache):
+    """
+    categorize_rows_parallel for products whose inputs changed since the
+    cached run; unchanged products reuse their cached decision.
+    """
+    analyses = [None] * len(rows)
+    pending = []
+    reused = 0
+    for i, row in enumerate(rows):
+        product_id = str(row.get('id', '')) if row.get('id') is not None else ''
+        if product_id in manual_overrides:
+            # Overrides are a dict lookup; not worth caching
+            analyses[i] = categorize_product_enhanced(row, category_mappings, description_keywords,
+                                                      brand_defaults, manual_overrides)
+            continue
+        key = categorization_key(row)
+        decision = cache.get(key)
+        if decision is None:
+            pending.append((i, key))
+        else:
+            analyses[i] = decision_analysis(decision, row.get('google_product_category', ''))
+            reused += 1
+
+    if pending:
+        print(f"   Scoring {len(pending)} new or changed products ({reused} from cache)")
+        scored = categorize_rows_parallel([rows[i] for i, _ in pending], category_mappings, description_keywords,
+                                          brand_defaults, manual_overrides)
+        for (i, key), analysis in zip(pending, scored):
+            cache.put(key, analysis_decision(analysis))
+            analyses[i] = analysis
+    else:
+        print(f"   No new or changed products; {reused} categorizations from cache")
+    return analyses
+
 def analyze_low_confidence_patterns(results):
     """Analyze patterns in low confidence items for quick fixes"""
     low_confidence_items = [r for r in results if r['analysis']['confidence'] == 'LOW']
@@ -581,16 +981,21 @@ def generate_quick_fix_recommendations(patterns, category_reference):
 
 def process_products_enhanced(df, manual_overrides):
     """Process all products with enhanced description analysis"""
-    print("\n🔄 Processing products with enhanced description analysis...")
+    print(f"\n🔄 Processing products with enhanced description analysis ({SCORER_MODE} scoring)...")
     
     category_mappings = get_comprehensive_category_mappings()
     description_keywords = get_description_specific_keywords()
     brand_defaults = get_brand_defaults()
     results = []
     
-    for index, row in df.iterrows():
-        analysis = categorize_product_enhanced(row, category_mappings, description_keywords, brand_defaults, manual_overrides)
-        
+    indexed_rows = list(df.iterrows())
+    rows = [row for _, row in indexed_rows]
+    cache = CategorizationCache(tables_version(category_mappings, description_keywords, brand_defaults))
+    analyses = categorize_rows_cached(rows, category_mappings, description_keywords, brand_defaults, manual_overrides,
+                                      cache)
+    cache.save()
+    
+    for (index, row), analysis in zip(indexed_rows, analyses):
         # Create updated row
         updated_row = row.copy()
         updated_row['google_product_category'] = analysis['suggested_category']
@@ -0,0 +1,229 @@
+"""
+Row-level change detection for feed CSVs.
+
+Every product row is fingerprinted (SHA-256 of its field/value pairs) and
+only {id: fingerprint} is stored per feed, so the committed state stays a
+small fraction of the feed itself. Comparing a new feed with that state
+gives a changeset of added, removed and modified product IDs. Row order and column order do not count as changes, so the workflow
+only publishes when a product actually changed.
+
+Usage in the workflow:
+
+    python change_detection.py --feed <csv> --state <json> --name google --changeset <json>
+        writes the changeset and "<name>_feed_changed=true|false" (plus
+        added/removed/modified counts) to $GITHUB_OUTPUT
+
+    python change_detection.py --feed <csv> --state <json> --save
+        records the feed as published
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bump when the state file layout changes; older state is discarded
+STATE_FORMAT = 2
+
+KEY_COLUMN = "id"
+
+def row_fingerprint(row):
+    """SHA-256 of a row's field/value pairs, independent of column order."""
+    digest = hashlib.sha256()
+    for field in sorted(row):
+        digest.update(field.encode("utf-8"))
+        digest.update(b"\x1f")
+        digest.update((row[field] or "").encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+def read_feed_rows(path, key=KEY_COLUMN):
+    """
+    Fields and {id: {field: value}} of a feed CSV, values as the exact strings
+    in the file. Rows without an id are skipped; for a repeated id the last
+    row wins, as it would in the feed consumers.
+    """
+    rows = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames or []
+        if key not in fields:
+            raise ValueError(f"{path} has no '{key}' column")
+        for row in reader:
+            row_key = (row.get(key) or "").strip()
+            if not row_key:
+                continue
+            if row_key in rows:
+                logger.warning(f"⚠️ Duplicate {key} '{row_key}' in {path}; keeping the last row")
+            rows[row_key] = {field: row.get(field) or "" for field in fields}
+    return fields, rows
+
+def has_changes(changeset):
+    """Whether a changeset adds, removes or modifies any product."""
+    return bool(changeset["added"] or changeset["removed"] or changeset["modified"])
+
+class FeedFingerprints:
+    def __init__(self, path, key=KEY_COLUMN):
+        """
+        Load the fingerprints recorded for a feed.
+
+        Args:
+            path: JSON state file; a missing, unreadable or outdated file
+                  starts empty, so every product counts as added.
+            key: Column identifying a product.
+        """
+        self.path = path
+        self.key = key
+        self.fields = []
+        self.products = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if state.get("format") == STATE_FORMAT and state.get("key") == key:
+                    self.fields = state.get("fields", [])
+                    self.products = state.get("products", {})
+                    logger.info(f"Loaded fingerprints of {len(self.products)} products from {path}")
+                else:
+                    logger.info(f"Ignoring fingerprints in {path} from an older format")
+            except Exception as e:
+                logger.error(f"Error loading fingerprints {path}: {e}")
+        else:
+            logger.info(f"No fingerprints at {path}; every product counts as new")
+
+    def diff(self, rows):
+        """
+        Changeset from the recorded feed to rows ({id: {field: value}}).
+
+        Returns:
+            dict with sorted "added", "removed" and "modified" ids and
+            "unchanged"/"total" counts.
+        """
+        added = sorted(key for key in rows if key not in self.products)
+        removed = sorted(key for key in self.products if key not in rows)
+        modified = []
+        unchanged = 0
+        for key in sorted(rows.keys() & self.products.keys()):
+            if self.products[key] == row_fingerprint(rows[key]):
+                unchanged += 1
+            else:
+                modified.append(key)
+        return {
+            "added": added,
+            "removed": removed,
+            "modified": modified,
+            "unchanged": unchanged,
+            "total": len(rows),
+        }
+
+    def update(self, fields, rows):
+        """Record rows as the published state of the feed."""
+        self.fields = sorted(fields)
+        self.products = {key: row_fingerprint(row) for key, row in rows.items()}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "format": STATE_FORMAT,
+                "key": self.key,
+                "saved_at": datetime.utcnow().isoformat(),
+                "fields": self.fields,
+                "products": self.products,
+            }, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved fingerprints of {len(self.products)} products to {self.path}")
+
+def detect_changes(feed_path, state_path, key=KEY_COLUMN):
+    """
+    Changeset of a feed CSV against its recorded fingerprints. A change in
+    the feed's columns is reported as "fields_changed" (and counts as a
+    change even when no product value moved).
+    """
+    fields, rows = read_feed_rows(feed_path, key)
+    fingerprints = FeedFingerprints(state_path, key)
+    changeset = fingerprints.diff(rows)
+    changeset["fields_changed"] = bool(fingerprints.products) and sorted(fields) != sorted(fingerprints.fields)
+    changeset["changed"] = has_changes(changeset) or changeset["fields_changed"]
+    return changeset
+
+def record_feed(feed_path, state_path, key=KEY_COLUMN):
+    """Record a feed CSV as published."""
+    fields, rows = read_feed_rows(feed_path, key)
+    fingerprints = FeedFingerprints(state_path, key)
+    fingerprints.update(fields, rows)
+    fingerprints.save()
+
+def write_changeset(changeset, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(changeset, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def write_github_outputs(name, changeset):
+    """Append <name>_feed_changed and the change counts to $GITHUB_OUTPUT, if set."""
+    outputs = {
+        f"{name}_feed_changed": "true" if changeset["changed"] else "false",
+        f"{name}_added": len(changeset["added"]),
+        f"{name}_removed": len(changeset["removed"]),
+        f"{name}_modified": len(changeset["modified"]),
+    }
+    github_output = os.getenv("GITHUB_OUTPUT")
+    if github_output:
+        with open(github_output, "a", encoding="utf-8") as f:
+            for output, value in outputs.items():
+                f.write(f"{output}={value}\n")
+    return outputs
+
+def main():
+    parser = argparse.ArgumentParser(description="Row-level change detection for feed CSVs")
+    parser.add_argument("--feed", required=True, help="Feed CSV to check")
+    parser.add_argument("--state", required=True, help="JSON file with the fingerprints of the last published feed")
+    parser.add_argument("--name", default="feed", help="Prefix of the $GITHUB_OUTPUT values")
+    parser.add_argument("--changeset", help="Write the changeset JSON to this file")
+    parser.add_argument("--key", default=KEY_COLUMN, help="Column identifying a product")
+    parser.add_argument("--save", action="store_true", help="Record the feed as published instead of diffing it")
+    args = parser.parse_args()
+
+    if args.save:
+        if not os.path.exists(args.feed):
+            logger.error(f"❌ Feed not found: {args.feed}")
+            sys.exit(1)
+        record_feed(args.feed, args.state, args.key)
+        return
+
+    if os.path.exists(args.feed):
+        changeset = detect_changes(args.feed, args.state, args.key)
+    else:
+        logger.warning(f"⚠️ Feed not found: {args.feed}; nothing to publish")
+        changeset = {"added": [], "removed": [], "modified": [], "unchanged": 0, "total": 0,
+                     "fields_changed": False, "changed": False}
+
+    if args.changeset:
+        write_changeset(changeset, args.changeset)
+    write_github_outputs(args.name, changeset)
+
+    if changeset["changed"]:
+        logger.info(f"✅ {args.name} feed changes: {len(changeset['added'])} added, {len(changeset['removed'])} removed, "
+                    f"{len(changeset['modified'])} modified, {changeset['unchanged']} unchanged")
+        for key in changeset["modified"][:10]:
+            logger.info(f"   ~ {key}")
+    else:
+        logger.info(f"ℹ️ No {args.name} feed changes ({changeset['total']} products unchanged)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Persistent crawler state in SQLite.
+
+Replaces seen_products.json: instead of rewriting every visited and product
+URL as one JSON document each run, each URL is a row keyed by URL with its
+discovery metadata:
+
+    url | is_product | visited | first_seen | last_seen | last_status | content_hash | lastmod
+
+A URL counts as visited once discovered (see()); pages that were only fetched
+(record_fetch(), e.g. listing pages) keep their status without being marked
+visited, so the deep crawl still follows them.
+
+Membership checks are primary-key lookups, so startup no longer loads the
+whole history. Writes are upserts committed in batches or every
+CRAWL_STATE_COMMIT_SECONDS; the database runs in WAL mode so an interrupted
+crawl keeps everything committed before it.
+
+The same database checkpoints the crawl itself so `crawler.py --resume` can
+pick up an interrupted run: the pagination cursor of every listing seed, the
+pending deep-crawl frontier and whether the last run completed.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CRAWL_STATE_DB = os.getenv("CRAWL_STATE_DB", "crawl_state.db")
+
+# Upserts buffered before a commit, and the longest a write stays uncommitted
+COMMIT_BATCH = int(os.getenv("CRAWL_STATE_BATCH", "200"))
+COMMIT_SECONDS = float(os.getenv("CRAWL_STATE_COMMIT_SECONDS", "10"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    is_product INTEGER NOT NULL DEFAULT 0,
+    visited INTEGER NOT NULL DEFAULT 0,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    last_status INTEGER,
+    content_hash TEXT,
+    lastmod TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS urls_is_product ON urls (is_product);
+CREATE TABLE IF NOT EXISTS cursors (
+    seed TEXT PRIMARY KEY,
+    page_url TEXT NOT NULL,
+    page_num INTEGER NOT NULL,
+    products INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS frontier (
+    url TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL,
+    max_depth INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class CrawlState:
+    def __init__(self, path=CRAWL_STATE_DB):
+        """
+        Open (or create) the state database.
+
+        Args:
+            path: SQLite file; ":memory:" gives a throwaway store.
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._committed_at = time.monotonic()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def _write(self, sql, params):
+        with self._lock:
+            self.conn.execute(sql, params)
+            self._pending += 1
+            if self._pending >= COMMIT_BATCH or time.monotonic() - self._committed_at >= COMMIT_SECONDS:
+                self.commit()
+
+    def commit(self):
+        """Commit buffered writes."""
+        with self._lock:
+            self.conn.commit()
+            self._pending = 0
+            self._committed_at = time.monotonic()
+
+    def close(self):
+        """Commit, fold the WAL back into the main file and close."""
+        with self._lock:
+            self.commit()
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+
+    def __contains__(self, url):
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM urls WHERE url = ? AND visited = 1", (url,)).fetchone() is not None
+
+    def is_product(self, url):
+        with self._lock:
+            row = self.conn.execute("SELECT is_product FROM urls WHERE url = ?", (url,)).fetchone()
+        return bool(row and row[0])
+
+    def see(self, url, is_product=False, lastmod=None, now=None):
+        """
+        Record that a URL was seen this run (first_seen is kept, last_seen
+        moves forward). Returns True if the URL was not known before.
+        """
+        now = now or datetime.utcnow().isoformat()
+        with self._lock:
+            is_new = url not in self
+            self._write(
+                """
+                INSERT INTO urls (url, is_product, visited, first_seen, last_seen, lastmod)
+                VALUES (?, ?, 1, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    is_product = MAX(is_product, excluded.is_product),
+                    visited = 1,
+                    last_seen = excluded.last_seen,
+                    lastmod = COALESCE(excluded.lastmod, lastmod)
+                """,
+                (url, int(is_product), now, now, lastmod or None)
+            )
+        return is_new
+
+    def record_fetch(self, url, status_code, content_hash=None, now=None):
+        """Store the outcome of fetching a URL (status and body hash)."""
+        now = now or datetime.utcnow().isoformat()
+        self._write(
+            """
+            INSERT INTO urls (url, first_seen, last_seen, last_status, content_hash)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                last_seen = excluded.last_seen,
+                last_status = excluded.last_status,
+                content_hash = COALESCE(excluded.content_hash, content_hash)
+            """,
+            (url, now, now, status_code, content_hash)
+        )
+
+    def get(self, url):
+        """Metadata dict for a URL, or None."""
+        with self._lock:
+            cursor = self.conn.execute("SELECT * FROM urls WHERE url = ?", (url,))
+            row = cursor.fetchone()
+            columns = [d[0] for d in cursor.description]
+        return dict(zip(columns, row)) if row else None
+
+    def count(self, products_only=False):
+        """Number of visited URLs, or of product URLs."""
+        with self._lock:
+            sql = "SELECT COUNT(*) FROM urls WHERE " + ("is_product = 1" if products_only else "visited = 1")
+            return self.conn.execute(sql).fetchone()[0]
+
+    def is_empty(self):
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM urls LIMIT 1").fetchone() is None
+
+    def products(self):
+        """(url, first_seen, lastmod) for every product URL, sorted by URL."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT url, first_seen, COALESCE(lastmod, '') FROM urls WHERE is_product = 1 ORDER BY url"
+            ).fetchall()
+
+    # ── Run checkpoints ──
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self._write("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def start_run(self, resume=False):
+        """
+        Mark a crawl as running. Returns True if it resumes an interrupted
+        run; otherwise the checkpoints of the previous run are cleared.
+        """
+        resuming = resume and self.get_meta("run_status") == "running"
+        with self._lock:
+            if not resuming:
+                self.conn.execute("DELETE FROM cursors")
+                self.conn.execute("DELETE FROM frontier")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('run_status', 'running')")
+            self.commit()
+        return resuming
+
+    def finish_run(self):
+        """Mark the crawl as complete so the next --resume starts fresh."""
+        with self._lock:
+            self.conn.execute("DELETE FROM frontier")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('run_status', 'complete')")
+            self.commit()
+
+    def save_cursor(self, seed, page_url, page_num, products, done=False):
+        """Checkpoint the next listing page to crawl for a seed."""
+        self._write(
+            "INSERT OR REPLACE INTO cursors (seed, page_url, page_num, products, done) VALUES (?, ?, ?, ?, ?)",
+            (seed, page_url, page_num, products, int(done))
+        )
+
+    def cursors(self):
+        """{seed: (page_url, page_num, products, done)} from the last checkpoint."""
+        with self._lock:
+            rows = self.conn.execute("SELECT seed, page_url, page_num, products, done FROM cursors").fetchall()
+        return {seed: (page_url, page_num, products, bool(done)) for seed, page_url, page_num, products, done in rows}
+
+    def push_frontier(self, url, depth, max_depth):
+        """Checkpoint a queued deep-crawl page."""
+        self._write("INSERT OR IGNORE INTO frontier (url, depth, max_depth) VALUES (?, ?, ?)", (url, depth, max_depth))
+
+    def pop_frontier(self, url):
+        """Drop a deep-crawl page from the checkpoint once it has been handled."""
+        self._write("DELETE FROM frontier WHERE url = ?", (url,))
+
+    def frontier(self):
+        """Queued deep-crawl pages as (url, depth, max_depth) rows."""
+        with self._lock:
+            return self.conn.execute("SELECT url, depth, max_depth FROM frontier ORDER BY depth").fetchall()
+
+    def migrate_json(self, path):
+        """
+        One-off import of a legacy seen_products.json into an empty store.
+        Returns the number of URLs imported.
+        """
+        if not self.is_empty() or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading legacy state {path}: {e}")
+            return 0
+
+        now = datetime.utcnow().isoformat()
+        products = set(data.get("product_urls", []))
+        rows = [(url, int(url in products), now, now) for url in set(data.get("visited_urls", [])) | products]
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO urls (url, is_product, visited, first_seen, last_seen) VALUES (?, ?, 1, ?, ?)",
+                rows
+            )
+            self.commit()
+        logger.info(f"📦 Migrated {len(rows)} URLs ({len(products)} products) from {path} into {self.path}")
+        return len(rows)
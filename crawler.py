@@ -1,17 +1,24 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import functools
 import os
 import sys
-import json
-import random
-import time
 import logging
-import requests
-from datetime import datetime
+import re
+from collections import Counter
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
+import soupsieve as sv
 import csv
-import xml.etree.ElementTree as ET
+from lxml import etree
+from concurrent.futures import ThreadPoolExecutor
+from crawl_state import CRAWL_STATE_DB, CrawlState
+from feed_writers import XmlFeedWriter, sub_element
+from http_cache import body_hash
+from http_client import build_headers, close_client, fetch as pooled_fetch
+from politeness import scheduler
+from sitemap_discovery import discover_sitemap_products, is_complete, json_ld_product_links
 
 # Configure detailed logging to stdout with timestamp and level
 logging.basicConfig(
@@ -28,32 +35,92 @@ BASE_URL = "https://joyandco.com"
 OUTPUT_CSV = "product_urls/product_links.csv"
 OUTPUT_XML = "product_urls/product_links.xml"
 
-# JSON file to persist visited and product URLs
+# Legacy JSON state, imported once into the SQLite crawl state
 SEEN_PRODUCTS_FILE = "seen_products.json"
 STATE_LINKS = "product_urls/product_links.csv"
 
-# Global sets to track visited URLs and identified product URLs
-visited_urls = set()
-product_urls = set()
-
-# User-Agent list for rotation to avoid bot detection
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-    "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 "
-    "(KHTML, like Gecko) Version/14.1.1 Safari/605.1.15",
-    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
-    "(KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-    "(KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0",
-    "Mozilla/5.0 (iPad; CPU OS 15_2 like Mac OS X) AppleWebKit/605.1.15 "
-    "(KHTML, like Gecko) CriOS/98.0.4758.85 Mobile/15E148 Safari/604.1"
+# Listing pages crawled with pagination support
+LISTING_PAGES = [
+    "https://joyandco.com/products",
+    "https://joyandco.com/flash-deals",
+    "https://joyandco.com/new-arrivals",
+    "https://joyandco.com/category/tableware",
+    "https://joyandco.com/category/home-decor",
+    "https://joyandco.com/category/furniture",
+    "https://joyandco.com/category/gift-accessories",
+    "https://joyandco.com/category/candles-candle-holders",
+    "https://joyandco.com/category/decorative-accents",
+    "https://joyandco.com/category/vases-centerpieces",
+    "https://joyandco.com/category/wall-art",
+    "https://joyandco.com/category/table-linens",
+    "https://joyandco.com/category/decorative-cushions",
+    "https://joyandco.com/category/home-fragrance",
+    "https://joyandco.com/category/side-tables",
+    "https://joyandco.com/category/special-occasion-accents"
 ]
 
-def get_random_user_agent():
-    """Return a random User-Agent string from the list."""
-    return random.choice(USER_AGENTS)
+# Starting points for the fallback deep crawl
+DEEP_CRAWL_START_POINTS = [
+    BASE_URL,
+    "https://joyandco.com/products",
+    "https://joyandco.com/flash-deals",
+    "https://joyandco.com/new-arrivals",
+    "https://joyandco.com/category/tableware",
+    "https://joyandco.com/category/home-decor",
+    "https://joyandco.com/category/furniture",
+    "https://joyandco.com/category/gift-accessories"
+]
+
+# ENHANCED SELECTORS - Multiple ways to find product links on listing pages
+PRODUCT_SELECTORS = [
+    # Original selectors
+    ".products a.btn-shopnow",
+    ".pro-detail a",
+
+    # Additional comprehensive selectors
+    "a[href*='/product/']",  # Any link containing /product/
+    ".product-item a",
+    ".product-card a",
+    ".product-link",
+    ".shop-now",
+    "a.product-url",
+    ".product-thumb a",
+    ".item-link",
+
+    # Grid/list view selectors
+    ".product-grid a",
+    ".product-list a",
+    ".products-grid a",
+    ".products-list a",
+
+    # E-commerce common patterns
+    ".woocommerce a[href*='product']",
+    ".product a[href]",
+    "[data-product-url]",
+
+    # JoyAndCo specific patterns
+    ".col-md-4 a",
+    ".col-sm-6 a",
+    ".product-wrapper a",
+    ".item-wrapper a"
+]
+
+# Catch-all that covers every selector whose subject is an <a> element: links
+# are only kept when their href contains /product/ anyway
+PRODUCT_LINK_CATCH_ALL = "a[href*='/product/']"
+
+# Safety limit on pages followed per listing seed
+MAX_LISTING_PAGES = 50
+
+# Number of requests the async crawl engine keeps in flight at once
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+
+# Visited and product URLs with their metadata (opened by load_existing_data)
+crawl_state = None
+
+# Optional callable(url, lastmod) told about every product URL found this run;
+# the streaming pipeline uses it to start extraction during discovery
+product_hook = None
 
 def is_valid_url(url):
     """
@@ -67,8 +134,8 @@ def is_valid_url(url):
     return False
 
 def purge_state_files():
-    """Delete the old CSV/JSON state files for a full-reset crawl."""
-    for fn in (STATE_LINKS, SEEN_PRODUCTS_FILE):
+    """Delete the old CSV/JSON/SQLite state files for a full-reset crawl."""
+    for fn in (STATE_LINKS, SEEN_PRODUCTS_FILE, CRAWL_STATE_DB, f"{CRAWL_STATE_DB}-wal", f"{CRAWL_STATE_DB}-shm"):
         try:
             os.remove(fn)
             logger.info(f"[force] removed state file: {fn}")
@@ -77,336 +144,534 @@ def purge_state_files():
 
 def load_existing_data():
     """
-    Load previously visited URLs and product URLs from CSV and seen_products.json, if exists,
-    to avoid duplicates in the current crawl.
+    Open the crawl state database so previously visited URLs and product URLs
+    are skipped in the current crawl. A new database is seeded once from the
+    legacy seen_products.json and product CSV if they exist.
     """
-    global visited_urls, product_urls
+    global crawl_state
     os.makedirs(os.path.dirname(OUTPUT_CSV), exist_ok=True)
 
-    # Load from CSV
-    if os.path.exists(OUTPUT_CSV):
-        try:
-            with open(OUTPUT_CSV, newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                count = 0
-                for row in reader:
-                    url = row.get("url")
-                    if url:
-                        visited_urls.add(url)
-                        if "/product/" in url:
-                            product_urls.add(url)
-                        count += 1
-            logger.info(f"Loaded {len(product_urls)} existing product URLs from CSV ({count} total URLs)")
-        except Exception as e:
-            logger.error(f"Error loading existing products CSV: {e}")
-    else:
-        logger.info("No existing product URLs file found. Starting fresh crawl.")
+    is_new_db = not os.path.exists(CRAWL_STATE_DB)
+    crawl_state = CrawlState(CRAWL_STATE_DB)
 
-    # Load from JSON cache file for speed and more accurate state
-    if os.path.exists(SEEN_PRODUCTS_FILE):
-        try:
-            with open(SEEN_PRODUCTS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                visited_urls.update(set(data.get("visited_urls", [])))
-                product_urls.update(set(data.get("product_urls", [])))
-            logger.info(f"Cache HIT: Loaded {len(product_urls)} product URLs and {len(visited_urls)} visited URLs from {SEEN_PRODUCTS_FILE}")
-        except Exception as e:
-            logger.error(f"Error loading {SEEN_PRODUCTS_FILE}: {e}")
+    if crawl_state.is_empty():
+        crawl_state.migrate_json(SEEN_PRODUCTS_FILE)
+        if os.path.exists(OUTPUT_CSV):
+            try:
+                with open(OUTPUT_CSV, newline='', encoding='utf-8') as file:
+                    count = 0
+                    for row in csv.DictReader(file):
+                        url = row.get("url")
+                        if url:
+                            crawl_state.see(url, is_product="/product/" in url, lastmod=row.get("lastmod"))
+                            count += 1
+                crawl_state.commit()
+                logger.info(f"Imported {count} existing URLs from {OUTPUT_CSV}")
+            except Exception as e:
+                logger.error(f"Error loading existing products CSV: {e}")
+
+    if is_new_db:
+        logger.info(f"Cache MISS: No {CRAWL_STATE_DB} found, created new crawl state.")
     else:
-        logger.info(f"Cache MISS: No {SEEN_PRODUCTS_FILE} found, will create new.")
+        logger.info(f"Cache HIT: Opened {CRAWL_STATE_DB}")
+    logger.info(f"Crawl state has {crawl_state.count(products_only=True)} product URLs and {crawl_state.count()} visited URLs")
 
-def save_seen_products():
-    """
-    Save visited and product URLs to JSON for persisting crawler state.
-    Includes detailed logging to confirm file creation.
-    """
-    logger.info("Attempting to save crawler state to seen_products.json...")
+def save_crawl_state():
+    """Commit and close the crawl state database."""
     try:
-        with open(SEEN_PRODUCTS_FILE, "w", encoding="utf-8") as f:
-            json.dump({
-                "visited_urls": list(visited_urls),
-                "product_urls": list(product_urls)
-            }, f, indent=2)
-        logger.info(f"✅ Successfully saved crawler state to {SEEN_PRODUCTS_FILE}")
-        size = os.path.getsize(SEEN_PRODUCTS_FILE)
-        logger.info(f"File {SEEN_PRODUCTS_FILE} exists after saving, size: {size} bytes")
+        crawl_state.close()
+        size = os.path.getsize(CRAWL_STATE_DB) if os.path.exists(CRAWL_STATE_DB) else 0
+        logger.info(f"✅ Saved crawler state to {CRAWL_STATE_DB} ({size} bytes)")
     except Exception as e:
         logger.error(f"❌ Failed to save crawler state: {e}")
 
+def record_product(url, lastmod=None):
+    """Record a product URL found this run; returns True if it was not known before."""
+    is_new = crawl_state.see(url, is_product=True, lastmod=lastmod)
+    if product_hook:
+        product_hook(url, lastmod)
+    return is_new
+
+def add_discovered_products(urls, lastmods=None):
+    """Record product URLs from a discovery source; returns how many were new."""
+    new = 0
+    for url in urls:
+        if record_product(url, (lastmods or {}).get(url)):
+            new += 1
+    crawl_state.commit()
+    return new
+
 def process_sitemap():
     """
-    Placeholder for sitemap processing if the site had a sitemap.xml.
-    Returns False since joyandco.com does not provide one.
+    Discover products from robots.txt/sitemap.xml sitemaps and from the
+    JSON-LD ItemList/Product data on the main listing page.
+    Returns True when one of those sources lists the whole catalogue, in which
+    case the paginated HTML crawl can be skipped.
     """
-    logger.info("Site doesn't have XML sitemap - skipping sitemap processing")
+    known = crawl_state.count(products_only=True)
+
+    sitemap_products = discover_sitemap_products(BASE_URL)
+    if sitemap_products:
+        new = add_discovered_products(sitemap_products, sitemap_products)
+        with_lastmod = sum(1 for lastmod in sitemap_products.values() if lastmod)
+        logger.info(f"🗺️ Sitemaps list {len(sitemap_products)} products ({new} new, {with_lastmod} with lastmod)")
+        if is_complete(len(sitemap_products), known):
+            logger.info(f"✅ Sitemap is complete ({len(sitemap_products)} products vs {known} known)")
+            return True
+        logger.info(f"Sitemap looks partial ({len(sitemap_products)} products vs {known} known)")
+    else:
+        logger.info("No product sitemap found")
+
+    listing_url = LISTING_PAGES[0]
+    try:
+        response = pooled_fetch(listing_url, headers=build_headers())
+    except Exception as e:
+        logger.warning(f"⚠️ Could not fetch {listing_url} for structured data: {e}")
+        return False
+    if response.status_code != 200:
+        return False
+
+    json_ld_urls, declared_total = json_ld_product_links(BeautifulSoup(response.text, 'html.parser'), BASE_URL)
+    if not json_ld_urls:
+        logger.info(f"No JSON-LD product data on {listing_url}")
+        return False
+
+    new = add_discovered_products(json_ld_urls)
+    logger.info(f"🧩 JSON-LD on {listing_url}: {len(json_ld_urls)} products ({new} new), "
+                f"list declares {declared_total if declared_total is not None else 'no'} total")
+    if declared_total and len(json_ld_urls) >= declared_total and is_complete(len(json_ld_urls), known):
+        logger.info("✅ JSON-LD item list covers the whole catalogue")
+        return True
     return False
 
-def crawl_product_listings():
+class AsyncCrawlEngine:
     """
-    ENHANCED: Crawl main product listing pages with pagination support.
-    Extract product links from listings and collect product URLs with improved discovery.
+    Bounded-concurrency crawl engine.
+    Workers share one frontier queue; each task is a coroutine handler plus its
+    arguments, and handlers may enqueue follow-up tasks (next pages, links).
+    Blocking requests calls run on a thread pool sized to the concurrency budget.
     """
-    logger.info("🔍 ENHANCED: Crawling product listing pages with improved discovery...")
 
-    product_pages = [
-        "https://joyandco.com/products",
-        "https://joyandco.com/flash-deals",
-        "https://joyandco.com/new-arrivals",
-        "https://joyandco.com/category/tableware",
-        "https://joyandco.com/category/home-decor",
-        "https://joyandco.com/category/furniture",
-        "https://joyandco.com/category/gift-accessories",
-        "https://joyandco.com/category/candles-candle-holders",
-        "https://joyandco.com/category/decorative-accents",
-        "https://joyandco.com/category/vases-centerpieces",
-        "https://joyandco.com/category/wall-art",
-        "https://joyandco.com/category/table-linens",
-        "https://joyandco.com/category/decorative-cushions",
-        "https://joyandco.com/category/home-fragrance",
-        "https://joyandco.com/category/side-tables",
-        "https://joyandco.com/category/special-occasion-accents"
-    ]
-
-    for start_page in product_pages:
-        page_url = start_page
-        page_num = 1
-        has_next_page = True
-        page_products = 0
-
-        while has_next_page and page_num <= 50:  # Safety limit
+    def __init__(self, concurrency=CRAWL_CONCURRENCY):
+        self.concurrency = max(1, int(concurrency))
+        self.queue = None
+        self._executor = None
+
+    def enqueue(self, handler, *args):
+        """Add a task to the shared frontier."""
+        self.queue.put_nowait((handler, args))
+
+    async def fetch(self, url, headers, method="GET", timeout=15):
+        """
+        Run a pooled HTTP request on the engine's thread pool once the
+        politeness scheduler grants a slot for the URL's host.
+        """
+        await scheduler.wait_async(url)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(pooled_fetch, url, method=method, headers=headers, timeout=timeout, wait=False)
+        )
+
+    async def _worker(self):
+        while True:
+            handler, args = await self.queue.get()
             try:
-                logger.info(f"📄 Processing listing page: {page_url} (Page {page_num})")
-                headers = {
-                    "User-Agent": get_random_user_agent(),
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                    "Accept-Language": "en-US,en;q=0.5",
-                    "Cache-Control": "no-cache",
-                    "Pragma": "no-cache"
-                }
-                
-                response = requests.get(page_url, headers=headers, timeout=15)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # ENHANCED SELECTORS - Multiple ways to find product links
-                    product_selectors = [
-                        # Original selectors
-                        ".products a.btn-shopnow",
-                        ".pro-detail a",
-                        
-                        # Additional comprehensive selectors
-                        "a[href*='/product/']",  # Any link containing /product/
-                        ".product-item a",
-                        ".product-card a", 
-                        ".product-link",
-                        ".shop-now",
-                        "a.product-url",
-                        ".product-thumb a",
-                        ".item-link",
-                        
-                        # Grid/list view selectors
-                        ".product-grid a",
-                        ".product-list a",
-                        ".products-grid a",
-                        ".products-list a",
-                        
-                        # E-commerce common patterns
-                        ".woocommerce a[href*='product']",
-                        ".product a[href]",
-                        "[data-product-url]",
-                        
-                        # JoyAndCo specific patterns
-                        ".col-md-4 a",
-                        ".col-sm-6 a",
-                        ".product-wrapper a",
-                        ".item-wrapper a"
-                    ]
-                    
-                    page_found = 0
-                    for selector in product_selectors:
-                        try:
-                            product_links = soup.select(selector)
-                            for link in product_links:
-                                href = link.get('href') or link.get('data-product-url')
-                                if href and "/product/" in href:
-                                    full_url = urljoin(BASE_URL, href)
-                                    # Clean URL (remove query params)
-                                    full_url = full_url.split("?")[0].split("#")[0]
-                                    
-                                    if full_url not in visited_urls and full_url.startswith(BASE_URL):
-                                        logger.info(f"✅ NEW PRODUCT: {full_url}")
-                                        visited_urls.add(full_url)
-                                        product_urls.add(full_url)
-                                        page_found += 1
-                        except Exception as e:
-                            logger.debug(f"Selector {selector} failed: {e}")
-                            continue
-                    
-                    page_products += page_found
-                    logger.info(f"📦 Found {page_found} products on this page (Total: {len(product_urls)})")
-                    
-                    # Enhanced pagination detection
-                    has_next_page = False
-                    
-                    # Method 1: Look for next page number
-                    pagination = soup.select(".page-item a, .pagination a, .pager a")
-                    for page_link in pagination:
-                        link_text = page_link.get_text().strip()
-                        if link_text == str(page_num + 1) or link_text.lower() in ['next', '→', '»']:
-                            next_href = page_link.get('href')
-                            if next_href:
-                                page_url = urljoin(BASE_URL, next_href)
-                                page_num += 1
-                                has_next_page = True
-                                logger.info(f"🔄 Found next page: {page_url}")
-                                break
-                    
-                    # Method 2: Look for "Next" or arrow links
-                    if not has_next_page:
-                        next_links = soup.select(
-                            "a[rel='next'], .next a, .page-next a"
-                        )
-                        for next_link in next_links:
-                            next_href = next_link.get('href')
-                            if next_href:
-                                page_url = urljoin(BASE_URL, next_href)
-                                page_num += 1
-                                has_next_page = True
-                                logger.info(f"🔄 Found next link: {page_url}")
-                                break
-                    
-                    # Method 3: URL pattern pagination (e.g., ?page=2)
-                    if not has_next_page and page_found > 0:
-                        if "?" in page_url:
-                            base_url = page_url.split("?")[0]
-                            next_page_url = f"{base_url}?page={page_num + 1}"
-                        else:
-                            next_page_url = f"{page_url}{'&' if '?' in page_url else '?'}page={page_num + 1}"
-                        
-                        # Test if next page exists
-                        try:
-                            test_response = requests.head(next_page_url, headers=headers, timeout=10)
-                            if test_response.status_code == 200:
-                                page_url = next_page_url
-                                page_num += 1
-                                has_next_page = True
-                                logger.info(f"🔄 Trying URL pattern pagination: {page_url}")
-                        except:
-                            pass
-                    
-                    if not has_next_page:
-                        logger.info(f"📄 No more pages found for {start_page}")
-                        
-                else:
-                    logger.warning(f"❌ Failed to access {page_url}: HTTP {response.status_code}")
-                    has_next_page = False
-                    
+                await handler(self, *args)
             except Exception as e:
-                logger.error(f"💥 Error processing {page_url}: {e}")
-                has_next_page = False
-                
-            # Respectful delay between requests
-            time.sleep(random.uniform(1.5, 3.0))
-        
-        logger.info(f"✅ Completed {start_page}: Found {page_products} products across {page_num-1} pages")
+                logger.error(f"💥 Crawl task {handler.__name__}{args} failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def run(self, tasks):
+        """Process the seed tasks and everything they enqueue until the frontier is empty."""
+        self.queue = asyncio.Queue()
+        for handler, *args in tasks:
+            self.enqueue(handler, *args)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            self._executor = executor
+            workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+            try:
+                await self.queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                self._executor = None
+
+def selector_subject_is_anchor(selector):
+    """True if the selector's rightmost compound selects <a> elements."""
+    subject = re.split(r'\s*[\s>+~]\s*', selector.strip())[-1]
+    return re.match(r'a(?![\w-])', subject) is not None
 
-    logger.info(f"🎯 TOTAL PRODUCTS DISCOVERED: {len(product_urls)}")
+def has_link_attribute(tag):
+    return tag.has_attr('href') or tag.has_attr('data-product-url')
 
-def enhanced_simple_crawl(url, max_depth=3, current_depth=0):
+class ListingSelectorPlan:
     """
-    Enhanced recursive crawler with depth control and better link discovery
+    PRODUCT_SELECTORS compiled once into the smallest set that finds the same
+    product links, applied in a single pass over link-bearing elements.
+
+    Selectors whose subject is an <a> are subsumed by PRODUCT_LINK_CATCH_ALL;
+    the plan keeps it plus the selectors that can match other elements.
+    Hits per selector are counted for the crawl report; a URL counts as a
+    unique hit for a selector when no other compiled selector found it. With
+    full_report=True every original selector is matched for attribution.
     """
-    if current_depth >= max_depth:
-        logger.debug(f"Max depth {max_depth} reached for {url}")
-        return
-        
+
+    def __init__(self, selectors=PRODUCT_SELECTORS, full_report=False):
+        self.selectors = list(dict.fromkeys(selectors))
+        if PRODUCT_LINK_CATCH_ALL in self.selectors:
+            self.plan = [PRODUCT_LINK_CATCH_ALL] + [
+                s for s in self.selectors if not selector_subject_is_anchor(s)
+            ]
+        else:
+            self.plan = list(self.selectors)
+        self.subsumed = [s for s in self.selectors if s not in self.plan]
+        self.full_report = full_report
+
+        self.compiled = {}
+        for selector in (self.selectors if full_report else self.plan):
+            try:
+                self.compiled[selector] = sv.compile(selector)
+            except Exception as e:
+                logger.warning(f"⚠️ Dropping invalid selector {selector}: {e}")
+
+        self.hits = Counter()
+        self.unique_hits = Counter()
+        self._cleaned = {}
+
+    def clean_product_url(self, href):
+        """Absolute product URL without query/fragment, or None if off-site."""
+        if href not in self._cleaned:
+            full_url = urljoin(BASE_URL, href)
+            # Clean URL (remove query params)
+            full_url = full_url.split("?")[0].split("#")[0]
+            self._cleaned[href] = full_url if full_url.startswith(BASE_URL) else None
+        return self._cleaned[href]
+
+    def extract(self, soup):
+        """Return the unique product URLs on a listing page in document order."""
+        matched_by = {}
+        for element in soup.find_all(has_link_attribute):
+            href = element.get('href') or element.get('data-product-url')
+            if not href or "/product/" not in href:
+                continue
+            selectors = [s for s, compiled in self.compiled.items() if compiled.match(element)]
+            if not selectors:
+                continue
+            full_url = self.clean_product_url(href)
+            if full_url:
+                matched_by.setdefault(full_url, set()).update(selectors)
+
+        for selectors in matched_by.values():
+            self.hits.update(selectors)
+            if len(selectors) == 1:
+                self.unique_hits.update(selectors)
+        return list(matched_by)
+
+    def log_report(self):
+        """Log how many links each selector found and which ones found links no other did."""
+        logger.info(f"🧭 Selector plan: {len(self.plan)} of {len(self.selectors)} selectors "
+                    f"({len(self.subsumed)} subsumed by {PRODUCT_LINK_CATCH_ALL})")
+        for selector in self.compiled:
+            label = "" if selector in self.plan else " [subsumed]"
+            logger.info(f"   {selector}{label}: {self.hits[selector]} hits, {self.unique_hits[selector]} unique")
+        if self.full_report:
+            redundant = [s for s in self.compiled if not self.unique_hits[s]]
+            logger.info(f"📊 {len(redundant)} selectors found no link that others missed: {', '.join(redundant)}")
+
+# Compiled once at startup and shared by every listing page
+LISTING_SELECTOR_PLAN = ListingSelectorPlan()
+
+def extract_listing_product_links(soup, plan=LISTING_SELECTOR_PLAN):
+    """Return cleaned product URLs found on a listing page by the selector plan."""
+    return plan.extract(soup)
+
+def find_next_listing_page(soup, page_num):
+    """
+    Look for the next listing page via pagination links.
+    Returns the absolute URL of the next page, or None.
+    """
+    # Method 1: Look for next page number
+    pagination = soup.select(".page-item a, .pagination a, .pager a")
+    for page_link in pagination:
+        link_text = page_link.get_text().strip()
+        if link_text == str(page_num + 1) or link_text.lower() in ['next', '→', '»']:
+            next_href = page_link.get('href')
+            if next_href:
+                return urljoin(BASE_URL, next_href)
+
+    # Method 2: Look for "Next" or arrow links
+    for next_link in soup.select("a[rel='next'], .next a, .page-next a"):
+        next_href = next_link.get('href')
+        if next_href:
+            return urljoin(BASE_URL, next_href)
+
+    return None
+
+def listing_page_pattern_url(page_url, page_num):
+    """Method 3: URL pattern pagination (e.g., ?page=2)."""
+    if "?" in page_url:
+        base_url = page_url.split("?")[0]
+        return f"{base_url}?page={page_num + 1}"
+    return f"{page_url}?page={page_num + 1}"
+
+async def crawl_listing_page(engine, start_page, page_url, page_num, progress, plan=LISTING_SELECTOR_PLAN):
+    """
+    Fetch one listing page, record its products and enqueue the next page.
+    The seed's cursor is checkpointed to the next page, or marked done once the
+    last page has been read; a failed page stays the cursor so --resume retries it.
+    """
+    has_next_page = False
     try:
-        if url in visited_urls:
+        logger.info(f"📄 Processing listing page: {page_url} (Page {page_num})")
+        headers = build_headers({
+            "Cache-Control": "no-cache",
+            "Pragma": "no-cache"
+        })
+
+        response = await engine.fetch(page_url, headers)
+        crawl_state.record_fetch(page_url, response.status_code,
+                                 body_hash(response.content) if response.status_code == 200 else None)
+        if response.status_code == 200:
+            soup = BeautifulSoup(response.text, 'html.parser')
+
+            page_links = extract_listing_product_links(soup, plan)
+            json_ld_urls, _ = json_ld_product_links(soup, BASE_URL)
+
+            page_found = 0
+            for full_url in dict.fromkeys(page_links + json_ld_urls):
+                if record_product(full_url):
+                    logger.info(f"✅ NEW PRODUCT: {full_url}")
+                    page_found += 1
+
+            progress[start_page]["products"] += page_found
+            logger.info(f"📦 Found {page_found} products on this page (Total: {crawl_state.count(products_only=True)})")
+
+            next_page_url = find_next_listing_page(soup, page_num)
+            if next_page_url:
+                logger.info(f"🔄 Found next page: {next_page_url}")
+            elif page_found > 0:
+                # Test if next page exists
+                candidate = listing_page_pattern_url(page_url, page_num)
+                try:
+                    test_response = await engine.fetch(candidate, headers, method="HEAD", timeout=10)
+                    if test_response.status_code == 200:
+                        next_page_url = candidate
+                        logger.info(f"🔄 Trying URL pattern pagination: {next_page_url}")
+                except Exception:
+                    pass
+
+            if next_page_url and page_num < MAX_LISTING_PAGES:
+                has_next_page = True
+                crawl_state.save_cursor(start_page, next_page_url, page_num + 1, progress[start_page]["products"])
+                engine.enqueue(crawl_listing_page, start_page, next_page_url, page_num + 1, progress, plan)
+            else:
+                crawl_state.save_cursor(start_page, page_url, page_num, progress[start_page]["products"], done=True)
+                logger.info(f"📄 No more pages found for {start_page}")
+        else:
+            logger.warning(f"❌ Failed to access {page_url}: HTTP {response.status_code}")
+
+    except Exception as e:
+        logger.error(f"💥 Error processing {page_url}: {e}")
+
+    finally:
+        progress[start_page]["pages"] = page_num
+        if not has_next_page:
+            logger.info(f"✅ Completed {start_page}: Found {progress[start_page]['products']} products across {page_num} pages")
+
+def crawl_product_listings(concurrency=CRAWL_CONCURRENCY, selector_report=False, resume=False):
+    """
+    ENHANCED: Crawl main product listing pages with pagination support.
+    All listing seeds share the async engine's frontier, so pages from
+    different seeds are fetched concurrently up to the concurrency budget.
+    With selector_report every PRODUCT_SELECTORS entry is matched so the
+    report attributes each discovered link to all selectors that found it.
+    With resume each seed restarts from its checkpointed cursor.
+    """
+    logger.info("🔍 ENHANCED: Crawling product listing pages with improved discovery...")
+    logger.info(f"⚙️ Crawl concurrency: {concurrency} in-flight requests")
+
+    plan = ListingSelectorPlan(full_report=True) if selector_report else LISTING_SELECTOR_PLAN
+    cursors = crawl_state.cursors() if resume else {}
+    progress = {}
+    tasks = []
+    for start_page in LISTING_PAGES:
+        page_url, page_num, products, done = cursors.get(start_page, (start_page, 1, 0, False))
+        progress[start_page] = {"products": products, "pages": page_num - 1}
+        if not done:
+            tasks.append((crawl_listing_page, start_page, page_url, page_num, progress, plan))
+    if resume:
+        logger.info(f"⏯️ Resuming listing crawl: {len(tasks)} seeds pending, {len(LISTING_PAGES) - len(tasks)} already complete")
+
+    engine = AsyncCrawlEngine(concurrency)
+    asyncio.run(engine.run(tasks))
+
+    plan.log_report()
+    logger.info(f"🎯 TOTAL PRODUCTS DISCOVERED: {crawl_state.count(products_only=True)}")
+
+async def crawl_deep_page(engine, url, current_depth, max_depth, resumed=False):
+    """
+    Enhanced link discovery on a single page; navigation links are enqueued
+    at the next depth level instead of being crawled recursively.
+    Queued pages are checkpointed in the crawl state until handled; resumed
+    pages are crawled again even though they were marked visited.
+    """
+    try:
+        if current_depth >= max_depth:
+            logger.debug(f"Max depth {max_depth} reached for {url}")
             return
-            
-        time.sleep(random.uniform(1, 2))
+
+        if not crawl_state.see(url) and not resumed:
+            return
+
+        await crawl_deep_page_links(engine, url, current_depth, max_depth)
+    finally:
+        crawl_state.pop_frontier(url)
+
+async def crawl_deep_page_links(engine, url, current_depth, max_depth):
+    """Fetch a deep-crawl page, record its products and enqueue navigation links."""
+    try:
         logger.info(f"🔍 Crawling: {url} (depth: {current_depth})")
-        visited_urls.add(url)
-        
-        headers = {
-            "User-Agent": get_random_user_agent(),
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Accept-Language": "en-US,en;q=0.5",
+
+        headers = build_headers({
             "Referer": BASE_URL,
             "DNT": "1"
-        }
-        
-        response = requests.get(url, headers=headers, timeout=15)
+        })
+
+        response = await engine.fetch(url, headers)
+        crawl_state.record_fetch(url, response.status_code,
+                                 body_hash(response.content) if response.status_code == 200 else None)
         if response.status_code != 200:
             logger.warning(f"❌ HTTP {response.status_code} for: {url}")
             return
-            
+
         soup = BeautifulSoup(response.text, 'html.parser')
-        
+
         # Find all links - enhanced discovery
         all_links = soup.find_all("a", href=True)
         product_links_found = 0
         navigation_links = []
-        
+
         for link_tag in all_links:
             href = link_tag['href']
-            
+
             # Skip javascript and fragment links
             if href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
                 continue
-                
+
             # Convert to absolute URL
             full_url = urljoin(BASE_URL, href.split("?")[0])
-            
+
             # Must be within our domain
             if not (is_valid_url(full_url) and full_url.startswith(BASE_URL)):
                 continue
-                
-            if full_url in visited_urls:
+
+            if full_url in crawl_state:
                 continue
-                
+
             # Product URL detection
             if "/product/" in full_url:
                 logger.info(f"🆕 DISCOVERED PRODUCT: {full_url}")
-                product_urls.add(full_url)
+                record_product(full_url)
                 product_links_found += 1
             else:
                 # Collect navigation links for further crawling
                 # Prioritize category and listing pages
-                if any(keyword in full_url.lower() for keyword in 
+                if any(keyword in full_url.lower() for keyword in
                        ['category', 'products', 'collections', 'shop', 'browse', 'new-arrivals', 'flash-deals']):
                     navigation_links.append(full_url)
-        
+
         logger.info(f"📦 Found {product_links_found} products on {url}")
-        
-        # Recursively crawl navigation links (with depth limit)
+
+        # Crawl navigation links at the next depth (with depth limit)
         for nav_link in navigation_links[:5]:  # Limit to prevent explosion
-            enhanced_simple_crawl(nav_link, max_depth, current_depth + 1)
-            
+            crawl_state.push_frontier(nav_link, current_depth + 1, max_depth)
+            engine.enqueue(crawl_deep_page, nav_link, current_depth + 1, max_depth)
+
     except Exception as e:
         logger.error(f"💥 Error crawling {url}: {e}")
 
-def save_to_csv(urls, filename=OUTPUT_CSV):
-    """Save discovered product URLs to CSV with timestamps."""
+def enhanced_deep_crawl(start_urls, max_depth=3, concurrency=CRAWL_CONCURRENCY, resume=False):
+    """
+    Enhanced breadth-first crawler with depth control and better link discovery,
+    driven by the async engine from every start URL at once. With resume the
+    checkpointed frontier of an interrupted run is crawled instead, if any.
+    """
+    pending = crawl_state.frontier() if resume else []
+    if pending:
+        logger.info(f"⏯️ Resuming deep crawl with {len(pending)} queued pages")
+        tasks = [(crawl_deep_page, url, depth, depth_limit, True) for url, depth, depth_limit in pending]
+    else:
+        for url in start_urls:
+            crawl_state.push_frontier(url, 0, max_depth)
+        tasks = [(crawl_deep_page, url, 0, max_depth) for url in start_urls]
+
+    engine = AsyncCrawlEngine(concurrency)
+    asyncio.run(engine.run(tasks))
+
+def save_to_csv(products, filename=OUTPUT_CSV):
+    """
+    Save discovered product URLs to CSV with first-seen timestamps and sitemap lastmod.
+    products is a list of (url, first_seen, lastmod) rows sorted by URL.
+    """
     os.makedirs(os.path.dirname(filename), exist_ok=True)
     with open(filename, mode='w', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
-        writer.writerow(["url", "timestamp"])
-        for url in sorted(urls):
-            writer.writerow([url, datetime.utcnow().isoformat()])
-    logger.info(f"Saved {len(urls)} URLs to CSV: {filename}")
+        writer.writerow(["url", "timestamp", "lastmod"])
+        # first_seen rather than the current time, so unchanged URLs give
+        # unchanged rows from run to run
+        for url, first_seen, lastmod in products:
+            writer.writerow([url, first_seen, lastmod])
+    logger.info(f"Saved {len(products)} URLs to CSV: {filename}")
 
-def save_to_xml(urls, filename=OUTPUT_XML):
-    """Save discovered product URLs to XML format."""
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    root = ET.Element("products")
-    for url in sorted(urls):
-        product = ET.SubElement(root, "product")
-        ET.SubElement(product, "url").text = url
-        ET.SubElement(product, "timestamp").text = datetime.utcnow().isoformat()
-    tree = ET.ElementTree(root)
-    tree.write(filename, encoding='utf-8', xml_declaration=True)
-    logger.info(f"Saved {len(urls)} URLs to XML: {filename}")
+def save_to_xml(products, filename=OUTPUT_XML):
+    """Save discovered product URLs to XML format, streamed one <product> at a time."""
+    with XmlFeedWriter(filename, "products") as writer:
+        for url, first_seen, lastmod in products:
+            product = etree.Element("product")
+            sub_element(product, "url", url)
+            sub_element(product, "timestamp", first_seen)
+            if lastmod:
+                sub_element(product, "lastmod", lastmod)
+            writer.write(product)
+    logger.info(f"Saved {writer.count} URLs to XML: {filename}")
+
+def discover_products(concurrency=CRAWL_CONCURRENCY, selector_report=False, full_crawl=False, resume=False):
+    """
+    Run product discovery: sitemaps and JSON-LD, the paginated listing crawl
+    (unless those cover the catalogue) and the fallback deep crawl.
+    Expects load_existing_data() to have opened the crawl state.
+
+    Returns:
+        (url, first_seen, lastmod) rows for every known product, sorted by URL.
+    """
+    resuming = crawl_state.start_run(resume=resume)
+    if resume and not resuming:
+        logger.info("⏯️ No interrupted crawl to resume, starting a new one")
+    catalogue_complete = process_sitemap()
+    
+    # Run enhanced product listings crawl unless a sitemap/JSON-LD source covered it
+    if catalogue_complete and not full_crawl:
+        logger.info("⏭️ Skipping paginated listing crawl: discovery sources list the full catalogue")
+    else:
+        crawl_product_listings(concurrency, selector_report, resume=resuming)
+
+    # Enhanced fallback deep crawl if too few products found
+    if crawl_state.count(products_only=True) < 100:
+        logger.info(f"🔄 Only found {crawl_state.count(products_only=True)} products. Running enhanced deep crawl...")
+        enhanced_deep_crawl(DEEP_CRAWL_START_POINTS, max_depth=2, concurrency=concurrency, resume=resuming)
+
+    logger.info("=" * 80)
+    logger.info(f"✅ CRAWLING COMPLETE")
+    logger.info(f"🎯 Found {crawl_state.count(products_only=True)} products out of {crawl_state.count()} URLs visited.")
+    logger.info("=" * 80)
+
+    products = crawl_state.products()
+    crawl_state.finish_run()
+    return products
 
 def main():
     parser = argparse.ArgumentParser(
@@ -417,6 +682,27 @@ def main():
         action="store_true",
         help="Purge previous state files and do a full crawl."
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=CRAWL_CONCURRENCY,
+        help=f"Maximum number of in-flight requests (default: {CRAWL_CONCURRENCY})."
+    )
+    parser.add_argument(
+        "--selector-report",
+        action="store_true",
+        help="Match every product selector (not just the compiled plan) and report unique hits per selector."
+    )
+    parser.add_argument(
+        "--full-crawl",
+        action="store_true",
+        help="Run the paginated HTML crawl even when a sitemap or JSON-LD list covers the catalogue."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted crawl from its checkpointed listing cursors and deep-crawl frontier."
+    )
     args = parser.parse_args()
 
     if args.force:
@@ -425,49 +711,26 @@ def main():
     logger.info(f"🚀 Starting ENHANCED crawler{' [FORCE]' if args.force else ''}")
     logger.info("=" * 80)
     logger.info("🔧 ENHANCEMENTS:")
-    logger.info("   • Multiple comprehensive product selectors")
+    logger.info("   • Multiple comprehensive product selectors, compiled into a deduplicated plan")
     logger.info("   • Enhanced pagination detection")
     logger.info("   • More category pages covered")
     logger.info("   • Better error handling and logging")
+    logger.info("   • Async crawl engine with a shared, bounded frontier")
+    logger.info("   • Sitemap and JSON-LD discovery fast path")
     logger.info("=" * 80)
     
     load_existing_data()
-    process_sitemap()
-    
-    # Run enhanced product listings crawl
-    crawl_product_listings()
-
-    # Enhanced fallback deep crawl if too few products found
-    if len(product_urls) < 100:
-        logger.info(f"🔄 Only found {len(product_urls)} products. Running enhanced deep crawl...")
-        starting_points = [
-            BASE_URL,
-            "https://joyandco.com/products",
-            "https://joyandco.com/flash-deals",
-            "https://joyandco.com/new-arrivals",
-            "https://joyandco.com/category/tableware",
-            "https://joyandco.com/category/home-decor",
-            "https://joyandco.com/category/furniture",
-            "https://joyandco.com/category/gift-accessories"
-        ]
-        
-        for start_url in starting_points:
-            if start_url not in visited_urls:
-                enhanced_simple_crawl(start_url, max_depth=2)
-
-    logger.info("=" * 80)
-    logger.info(f"✅ CRAWLING COMPLETE")
-    logger.info(f"🎯 Found {len(product_urls)} products out of {len(visited_urls)} URLs visited.")
-    logger.info("=" * 80)
-
+    products = discover_products(args.concurrency, args.selector_report, args.full_crawl, args.resume)
+    close_client()
+    save_crawl_state()
+    product_urls = [url for url, _, _ in products]
     if product_urls:
-        save_to_csv(product_urls)
-        save_to_xml(product_urls)
-        save_seen_products()
+        save_to_csv(products)
+        save_to_xml(products)
         logger.info(f"✅ Saved {len(product_urls)} product URLs to {os.path.dirname(OUTPUT_CSV)}/")
         
         # Show some sample URLs for verification
-        sample_urls = list(product_urls)[:10]
+        sample_urls = product_urls[:10]
         logger.info("📝 Sample discovered URLs:")
         for i, url in enumerate(sample_urls, 1):
             logger.info(f"   {i}. {url}")
@@ -479,7 +742,7 @@ def main():
         logger.info("🔍 Troubleshooting suggestions:")
         logger.info("   1. Check if the website structure has changed")
         logger.info("   2. Verify the BASE_URL is accessible")
-        logger.info("   3. Review the product selectors in crawl_product_listings()")
+        logger.info("   3. Review PRODUCT_SELECTORS (run with --selector-report for per-selector hits)")
         logger.info("   4. Run with --force to clear cache and retry")
 
 if __name__ == "__main__":
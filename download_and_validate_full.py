@@ -1,9 +1,11 @@
 import os
 import sys
 import pandas as pd
-import requests
 import logging
 
+from download_taxonomy import ensure_taxonomy
+from taxonomy import load_taxonomy
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -12,14 +14,9 @@ TAXONOMY_FILE = os.getenv('TAXONOMY_FILE', 'google_product_taxonomy.txt')
 VALIDATION_REPORT = 'category_validation_full_report.csv'
 
 def download_taxonomy(taxonomy_file):
-    url = "https://www.google.com/basepages/producttype/taxonomy-with-ids.en-US.txt"
+    """Use the local taxonomy when it is verified and fresh, else download it."""
     try:
-        logger.info("Downloading Google product taxonomy...")
-        r = requests.get(url)
-        r.raise_for_status()
-        with open(taxonomy_file, 'w', encoding='utf-8') as f:
-            f.write(r.text)
-        logger.info(f"✅ Taxonomy saved to {taxonomy_file}")
+        ensure_taxonomy(taxonomy_file)
     except Exception as e:
         logger.error(f"❌ Error downloading taxonomy: {e}")
         sys.exit(1)
@@ -28,8 +25,7 @@ def load_taxonomy_ids(taxonomy_file):
     if not os.path.isfile(taxonomy_file):
         logger.error(f"❌ Taxonomy file not found: {taxonomy_file}")
         sys.exit(1)
-    df = pd.read_csv(taxonomy_file, sep='\t', header=None, names=['category_id', 'category_name'])
-    taxonomy_ids = set(df['category_id'].astype(str).str.strip())
+    taxonomy_ids = load_taxonomy(taxonomy_file).id_strings()
     logger.info(f"✅ Loaded {len(taxonomy_ids)} taxonomy categories")
     return taxonomy_ids
 
@@ -1,12 +1,195 @@
-import requests
+"""
+Google product taxonomy download.
 
-def download_google_taxonomy(save_path='google_product_taxonomy.txt'):
-    url = 'https://www.google.com/basepages/producttype/taxonomy-with-ids.en-US.txt'
-    response = requests.get(url)
+ensure_taxonomy() returns a verified local copy of the taxonomy, touching the
+network only when it has to:
+
+- a local copy whose SHA-256 matches its sidecar metadata, and that was
+  checked within TAXONOMY_MAX_AGE, is used as is (no request at all)
+- an older copy is revalidated with If-None-Match / If-Modified-Since; a 304
+  just refreshes the check time
+- a new body is checked (taxonomy lines, optional TAXONOMY_SHA256 pin) and
+  written atomically together with its validators and checksum
+- when the server cannot be reached, a verified local copy is still used
+
+TAXONOMY_URL may be a local file (or file:// URL), and TAXONOMY_OFFLINE=1
+never touches the network, so validation runs fully offline against a
+fixture.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from http_cache import body_hash, conditional_headers
+from http_client import FETCH_ERRORS, build_headers, fetch
+from taxonomy import TAXONOMY_FILE, file_sha256
+
+logger = logging.getLogger(__name__)
+
+TAXONOMY_URL = os.getenv("TAXONOMY_URL", "https://www.google.com/basepages/producttype/taxonomy-with-ids.en-US.txt")
+# Seconds a verified local copy is trusted before it is revalidated
+TAXONOMY_MAX_AGE = int(os.getenv("TAXONOMY_MAX_AGE", str(7 * 24 * 3600)))
+TAXONOMY_TIMEOUT = float(os.getenv("TAXONOMY_TIMEOUT", "30"))
+TAXONOMY_OFFLINE = os.getenv("TAXONOMY_OFFLINE", "0") == "1"
+# Expected SHA-256 of the taxonomy file; empty accepts any valid taxonomy
+TAXONOMY_SHA256 = os.getenv("TAXONOMY_SHA256", "").lower()
+
+def metadata_path(path):
+    """Sidecar JSON holding the validators and checksum of a taxonomy file."""
+    return f"{os.path.splitext(path)[0]}.meta.json"
+
+def load_metadata(path):
+    try:
+        with open(metadata_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"⚠️ Ignoring unreadable taxonomy metadata {metadata_path(path)}: {e}")
+        return {}
+
+def save_metadata(path, metadata):
+    meta_path = metadata_path(path)
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, meta_path)
+
+def verify_local_copy(path, metadata, expected_sha256=TAXONOMY_SHA256):
+    """
+    SHA-256 of the local taxonomy when it is intact, else None. A copy without
+    metadata (e.g. restored from the workflow cache) is accepted when it
+    looks like a taxonomy and matches the pinned checksum, if any.
+    """
+    if not os.path.isfile(path):
+        return None
+    digest = file_sha256(path)
+    if metadata.get("sha256"):
+        if digest != metadata["sha256"]:
+            logger.warning(f"⚠️ {path} does not match its recorded checksum; downloading it again")
+            return None
+    else:
+        with open(path, "rb") as f:
+            if not looks_like_taxonomy(f.read(1 << 16)):
+                return None
+    if expected_sha256 and digest != expected_sha256:
+        logger.warning(f"⚠️ {path} does not match TAXONOMY_SHA256; downloading it again")
+        return None
+    return digest
+
+def looks_like_taxonomy(content):
+    """Whether a body has "<id> - <path>" lines (not an error page)."""
+    for line in content.decode("utf-8", errors="replace").splitlines():
+        if line.strip() and not line.startswith("#"):
+            id_text, separator, _ = line.partition(" - ")
+            return bool(separator) and id_text.strip().isdigit()
+    return False
+
+def local_source(url):
+    """Filesystem path of a local TAXONOMY_URL, or None for http(s)."""
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return url2pathname(parsed.path)
+    if parsed.scheme in ("http", "https"):
+        return None
+    return url
+
+def fetch_taxonomy(url, metadata, timeout):
+    """
+    (status, body, validators) for the taxonomy at url; status is 304 when
+    the copy described by metadata is still current.
+    """
+    source = local_source(url)
+    if source is not None:
+        with open(source, "rb") as f:
+            content = f.read()
+        if metadata.get("sha256") == body_hash(content):
+            return 304, None, {}
+        return 200, content, {}
+
+    headers = build_headers()
+    headers.update(conditional_headers(metadata))
+    response = fetch(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return 304, None, {}
     response.raise_for_status()
-    with open(save_path, 'w', encoding='utf-8') as f:
-        f.write(response.text)
-    print(f"✅ Google product taxonomy downloaded and saved to {save_path}")
+    return response.status_code, response.content, {
+        "etag": response.headers.get("ETag", ""),
+        "last_modified": response.headers.get("Last-Modified", ""),
+    }
+
+def ensure_taxonomy(path=TAXONOMY_FILE, url=TAXONOMY_URL, max_age=TAXONOMY_MAX_AGE, timeout=TAXONOMY_TIMEOUT,
+                    offline=TAXONOMY_OFFLINE, expected_sha256=TAXONOMY_SHA256):
+    """
+    Make sure path holds a verified copy of the taxonomy and return path.
+
+    Args:
+        path: Local taxonomy file.
+        url: Taxonomy URL, local file path or file:// URL.
+        max_age: Seconds since the last check before revalidating; 0 always
+            revalidates.
+        timeout: Request timeout in seconds.
+        offline: Never touch the network; a verified local copy is required.
+        expected_sha256: Pinned checksum of the file, or empty.
+
+    Raises:
+        FileNotFoundError: offline and no verified local copy.
+        ValueError: the downloaded body is not a taxonomy or fails the pin.
+        Request errors when the download fails and no local copy exists.
+    """
+    metadata = load_metadata(path)
+    local_sha = verify_local_copy(path, metadata, expected_sha256)
+    if local_sha is None:
+        metadata = {}
+    elif offline or time.time() - metadata.get("checked_at", 0) < max_age:
+        logger.info(f"✅ Using local taxonomy {path}")
+        return path
+
+    if offline:
+        raise FileNotFoundError(f"No verified taxonomy at {path} and TAXONOMY_OFFLINE is set")
+
+    try:
+        status, content, validators = fetch_taxonomy(url, metadata, timeout)
+    except (OSError, *FETCH_ERRORS) as e:
+        if local_sha is None:
+            raise
+        logger.warning(f"⚠️ Could not revalidate taxonomy ({e}); using local copy {path}")
+        return path
+
+    if status == 304:
+        metadata.setdefault("sha256", local_sha)
+        metadata["checked_at"] = time.time()
+        save_metadata(path, metadata)
+        logger.info(f"✅ Taxonomy {path} is up to date")
+        return path
+
+    if not looks_like_taxonomy(content):
+        raise ValueError(f"Downloaded taxonomy from {url} is not in '<id> - <path>' format")
+    digest = body_hash(content)
+    if expected_sha256 and digest != expected_sha256:
+        raise ValueError(f"Downloaded taxonomy checksum {digest} does not match TAXONOMY_SHA256")
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    save_metadata(path, {"url": url, "sha256": digest, "checked_at": time.time(), **validators})
+    logger.info(f"✅ Google product taxonomy downloaded and saved to {path} ({len(content)} bytes)")
+    return path
+
+def download_google_taxonomy(save_path=TAXONOMY_FILE):
+    try:
+        ensure_taxonomy(save_path)
+    except Exception as e:
+        logger.error(f"❌ Error downloading taxonomy: {e}")
+        sys.exit(1)
+    print(f"✅ Google product taxonomy ready at {save_path}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     download_google_taxonomy()
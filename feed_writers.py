@@ -0,0 +1,510 @@
+"""
+Streaming feed writers.
+
+- CsvFeedWriter: rows are written to "<path>.partial" as soon as each product
+  is ready, so a long run has usable output on disk early. close() then sorts
+  the partial file by product link through an ExternalSorter and swaps the
+  result in atomically: completion order varies between runs and must not
+  show up as a change in the committed feeds.
+- XmlFeedWriter: incremental XML on lxml.etree.xmlfile. The document root
+  is opened once and every record element is serialized and flushed as it
+  is written. With a sort_key, records go through an ExternalSorter instead
+  and are written in key order on close(); memory is bounded by
+  SORT_BUFFER_RECORDS, the rest waits in temporary files.
+- ExternalSorter: bounded-memory sort of (key, payload) records that spills
+  sorted runs to temporary files and merges them.
+- DeltaFeedWriter: a CsvFeedWriter with the schema of a full feed that only
+  receives products that are new or whose price, availability, title or
+  images (the whole additional image list) changed since the previous run,
+  for supplemental feeds.
+- FeedEmitter: fans each product out to every registered feed in a single
+  pass, converting it once per view (e.g. Google or Meta fields).
+"""
+
+import csv
+import hashlib
+import heapq
+import json
+import logging
+import os
+import pickle
+import re
+import tempfile
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+def feed_row(product, fields):
+    """A product as a CSV row of strings (None becomes "")."""
+    row = {}
+    for field in fields:
+        value = product.get(field, "")
+        row[field] = str(value) if value is not None else ""
+    return row
+
+# Records a sorting writer keeps in memory; beyond that, sorted runs are
+# spilled to temporary files and merged when the feed is closed
+SORT_BUFFER_RECORDS = int(os.getenv("FEED_SORT_BUFFER", "1000"))
+
+class ExternalSorter:
+    def __init__(self, buffer_size=None, spill_dir=None):
+        """
+        Sort (key, payload) records with bounded memory.
+
+        Args:
+            buffer_size: Records held in memory before a sorted run is
+                written to a temporary file (default: SORT_BUFFER_RECORDS).
+            spill_dir: Directory of the temporary run files (default: the
+                system temp directory).
+        """
+        self.buffer_size = max(1, buffer_size or SORT_BUFFER_RECORDS)
+        self.spill_dir = spill_dir
+        self.count = 0
+        self._buffer = []
+        self._runs = []
+
+    def add(self, key, payload):
+        """Add a picklable payload under a sort key; equal keys keep insertion order."""
+        self._buffer.append((key, self.count, payload))
+        self.count += 1
+        if len(self._buffer) >= self.buffer_size:
+            self._spill()
+
+    def _spill(self):
+        self._buffer.sort(key=lambda record: record[:2])
+        run = tempfile.TemporaryFile(dir=self.spill_dir)
+        for record in self._buffer:
+            pickle.dump(record, run, protocol=pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+        self._runs.append(run)
+        self._buffer = []
+
+    @staticmethod
+    def _read_run(run):
+        while True:
+            try:
+                yield pickle.load(run)
+            except EOFError:
+                return
+
+    def sorted(self):
+        """Yield every payload in key order, merging the spilled runs."""
+        self._buffer.sort(key=lambda record: record[:2])
+        streams = [self._read_run(run) for run in self._runs] + [iter(self._buffer)]
+        for _, _, payload in heapq.merge(*streams, key=lambda record: record[:2]):
+            yield payload
+
+    def close(self):
+        """Delete the temporary run files."""
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._buffer = []
+
+class CsvFeedWriter:
+    def __init__(self, path, fields, sort_key="link", warn_empty=True):
+        """
+        Open a streaming CSV feed.
+
+        Args:
+            path: Final feed file.
+            fields: Column names, read from each product dict.
+            sort_key: Column the final file is ordered by; must be one of fields.
+            warn_empty: Log a warning when the feed ends up without products.
+        """
+        if sort_key not in fields:
+            raise ValueError(f"Sort column {sort_key!r} is not a field of {path}")
+        self.path = path
+        self.fields = fields
+        self.sort_key = sort_key
+        self.warn_empty = warn_empty
+        self.partial_path = f"{path}.partial"
+        self.count = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(self.partial_path, mode="w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=fields)
+        self._writer.writeheader()
+
+    def write(self, product):
+        """Append a product to the partial file."""
+        self._writer.writerow(feed_row(product, self.fields))
+        self._file.flush()
+        self.count += 1
+
+    def close(self):
+        """
+        Write the final feed sorted from the partial file (through an
+        ExternalSorter, so memory stays bounded) and remove the partial file.
+        Returns the row count.
+        """
+        self._file.close()
+        if not self.count and self.warn_empty:
+            logger.warning(f"No products to write to {self.path}")
+
+        sorter = ExternalSorter(spill_dir=os.path.dirname(self.path) or ".")
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(self.partial_path, newline="", encoding="utf-8") as partial:
+                for row in csv.DictReader(partial):
+                    sorter.add(row[self.sort_key], row)
+            with open(tmp_path, mode="w", newline="", encoding="utf-8") as file:
+                writer = csv.DictWriter(file, fieldnames=self.fields)
+                writer.writeheader()
+                writer.writerows(sorter.sorted())
+        finally:
+            sorter.close()
+        os.replace(tmp_path, self.path)
+        os.remove(self.partial_path)
+
+        logger.info(f"Feed written to {self.path}: {self.count} products, {os.path.getsize(self.path)} bytes")
+        return self.count
+
+    def abort(self):
+        """Stop without replacing the previous feed; the partial file shows how far the run got."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+# Fields whose change puts a product in a delta feed. additional_images is
+# the full list of extra images; the additional_image_link column only
+# holds the first of them.
+DELTA_FIELDS = ("title", "price", "sale_price", "availability", "image_link", "additional_images")
+
+def tracked_digest(product, fields):
+    """SHA-256 of a product's values of the given fields; list values count in full."""
+    digest = hashlib.sha256()
+    for field in fields:
+        value = product.get(field)
+        if isinstance(value, (list, tuple)):
+            value = "\n".join(str(item) for item in value)
+        digest.update(field.encode("utf-8"))
+        digest.update(b"\x1f")
+        digest.update(("" if value is None else str(value)).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+def delta_state_path(path):
+    """Sidecar JSON with the tracked-value digests behind a delta feed."""
+    return f"{os.path.splitext(path)[0]}.state.json"
+
+def load_delta_state(path, fields):
+    """{id: digest} recorded for the same tracked fields, or None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as file:
+            state = json.load(file)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable delta state {path}: {e}")
+        return None
+    if state.get("fields") != list(fields):
+        return None
+    return state.get("products", {})
+
+def load_feed_baseline(path, fields, key="id"):
+    """{id: {field: value}} of the given fields in an existing CSV feed; {} when there is none."""
+    baseline = {}
+    if not os.path.exists(path):
+        return baseline
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            if row.get(key):
+                baseline[row[key]] = {field: row.get(field) or "" for field in fields}
+    return baseline
+
+class DeltaFeedWriter:
+    def __init__(self, path, fields, baseline_path, key="id", tracked_fields=DELTA_FIELDS, full_snapshot=False):
+        """
+        Open a delta CSV feed.
+
+        Products are compared with the digests of their tracked fields saved
+        by the previous run next to the delta feed (delta_state_path()).
+        Without them, the previous full feed is the baseline for the tracked
+        fields that are among its columns.
+
+        Args:
+            path: Delta feed file.
+            fields: Column names, the same as the full feed's.
+            baseline_path: The full feed of the previous run. It is read here,
+                before this run's full feed replaces it.
+            key: Product id column.
+            tracked_fields: Product fields compared with the previous run;
+                they need not be feed columns.
+            full_snapshot: Write every product, e.g. to reset a supplemental
+                feed, instead of only the changed ones.
+        """
+        self.path = path
+        self.key = key
+        self.tracked_fields = list(tracked_fields)
+        self.full_snapshot = full_snapshot
+        self.state_path = delta_state_path(path)
+        self.digests = {}
+        self.seen = 0
+        self.state = None
+        self.baseline = {}
+        self.baseline_fields = [field for field in self.tracked_fields if field in fields]
+        if not full_snapshot:
+            self.state = load_delta_state(self.state_path, self.tracked_fields)
+            if self.state is None:
+                self.baseline = load_feed_baseline(baseline_path, self.baseline_fields, key)
+                if not self.baseline:
+                    logger.warning(f"No previous feed at {baseline_path}; {path} will hold every product")
+        # An empty delta just means nothing changed
+        self.writer = CsvFeedWriter(path, fields, warn_empty=False)
+
+    def changed(self, product):
+        """Whether a product is new or a tracked field differs from the previous run."""
+        product_key = str(product.get(self.key, ""))
+        digest = tracked_digest(product, self.tracked_fields)
+        self.digests[product_key] = digest
+        if self.full_snapshot:
+            return True
+        if self.state is not None:
+            return self.state.get(product_key) != digest
+        previous = self.baseline.get(product_key)
+        return previous is None or feed_row(product, self.baseline_fields) != previous
+
+    def write(self, product):
+        self.seen += 1
+        if self.changed(product):
+            self.writer.write(product)
+
+    def close(self):
+        """Write the delta feed and the digests for the next run. Returns the number of products in it."""
+        count = self.writer.close()
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"fields": self.tracked_fields, "products": self.digests}, file, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+        mode = "full snapshot" if self.full_snapshot else "changed"
+        logger.info(f"Delta feed {self.path}: {count} of {self.seen} products ({mode})")
+        return count
+
+    def abort(self):
+        self.writer.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+# Characters XML 1.0 cannot represent (control characters other than tab/CR/LF)
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+def xml_text(value):
+    """Element text for a value: str() with XML-invalid characters removed, None as ""."""
+    if value is None:
+        return ""
+    return _XML_INVALID.sub("", str(value))
+
+def sub_element(parent, tag, value):
+    """Append a child element holding a text value."""
+    child = etree.SubElement(parent, tag)
+    child.text = xml_text(value)
+    return child
+
+class XmlFeedWriter:
+    def __init__(self, path, root_tag, attrib=None, nsmap=None, container=None, header=(), indent=None,
+                 sort_key=None):
+        """
+        Open an XML document for incremental writing.
+
+        Args:
+            path: Output file; written to "<path>.tmp" and moved into place on close().
+            root_tag: Document element, e.g. "products" or "rss".
+            attrib: Attributes of the document element.
+            nsmap: Namespace prefixes declared on the document element.
+            container: Optional element every record is nested in, e.g. RSS "channel".
+            header: Elements written before the records, e.g. the RSS channel title.
+            indent: Indentation string for pretty output, or None for compact XML.
+            sort_key: Optional function of a record element. When given, records
+                are serialized into an ExternalSorter (at most SORT_BUFFER_RECORDS
+                in memory, the rest in sorted temporary runs) and written in key
+                order on close(), for callers whose input order varies between
+                runs; otherwise each is written at once.
+        """
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.indent = indent
+        self.sort_key = sort_key
+        self.count = 0
+        self._sorter = ExternalSorter() if sort_key else None
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._xmlfile = etree.xmlfile(self.tmp_path, encoding="utf-8")
+        self._xf = self._xmlfile.__enter__()
+        self._xf.write_declaration()
+        self._open = []
+        self._enter(self._xf.element(root_tag, attrib or {}, nsmap=nsmap))
+        if container:
+            self._newline()
+            self._enter(self._xf.element(container))
+        for element in header:
+            self._write_element(element)
+
+    def _enter(self, context):
+        context.__enter__()
+        self._open.append(context)
+
+    def _newline(self, depth=None):
+        if self.indent is not None:
+            depth = len(self._open) if depth is None else depth
+            self._xf.write("\n" + self.indent * depth)
+
+    def _write_tree(self, element):
+        # Written through xmlfile contexts rather than xf.write(element) so
+        # namespace prefixes declared on the document element are reused
+        # instead of being redeclared on every record
+        with self._xf.element(element.tag, dict(element.attrib)):
+            if element.text:
+                self._xf.write(element.text)
+            for child in element:
+                self._write_tree(child)
+        if element.tail:
+            self._xf.write(element.tail)
+
+    def _write_element(self, element):
+        if self.indent is not None:
+            etree.indent(element, space=self.indent, level=len(self._open))
+        self._newline()
+        self._write_tree(element)
+        self._xf.flush()
+
+    def write(self, element):
+        """Write one record element (or pass it to the sorter until close() when sorting)."""
+        self.count += 1
+        if self._sorter:
+            self._sorter.add(self.sort_key(element), etree.tostring(element, encoding="utf-8"))
+        else:
+            self._write_element(element)
+
+    def close(self):
+        """Close every open element, finish the file and move it into place. Returns the record count."""
+        if self._sorter:
+            for serialized in self._sorter.sorted():
+                self._write_element(etree.fromstring(serialized))
+            self._sorter.close()
+        while self._open:
+            self._newline(len(self._open) - 1)
+            self._open.pop().__exit__(None, None, None)
+        self._xmlfile.__exit__(None, None, None)
+        os.replace(self.tmp_path, self.path)
+
+        logger.info(f"Feed written to {self.path}: {self.count} records, {os.path.getsize(self.path)} bytes")
+        return self.count
+
+    def abort(self):
+        """Discard the output, keeping any previous file at path."""
+        if self._sorter:
+            self._sorter.close()
+        try:
+            self._xmlfile.__exit__(None, None, None)
+        except Exception:
+            pass
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+class FeedEmitter:
+    """
+    Single-pass fan-out of products to feed writers.
+
+    Each sink is a writer (CsvFeedWriter, XmlFeedWriter or anything with
+    write/close/abort) reading one view of the product: the product itself
+    ("product") or a mapping registered with add_view(), such as Meta fields.
+    A view is computed once per product however many sinks read it.
+    """
+
+    def __init__(self):
+        self.views = {"product": None}
+        self.sinks = []
+        self.count = 0
+
+    def add_view(self, name, mapper):
+        """Register mapper(product) -> record under a view name."""
+        self.views[name] = mapper
+
+    def add_sink(self, name, writer, view="product", to_record=None):
+        """
+        Register a feed.
+
+        Args:
+            name: Label used in logs and in the counts returned by close().
+            writer: The feed writer.
+            view: Which view of the product the sink reads.
+            to_record: Optional conversion of the view before writing, e.g. to an XML element.
+        """
+        if view not in self.views:
+            raise ValueError(f"Unknown feed view: {view}")
+        self.sinks.append((name, writer, view, to_record))
+
+    def emit(self, product):
+        """Write one product to every sink."""
+        records = {"product": product}
+        for _, writer, view, to_record in self.sinks:
+            if view not in records:
+                records[view] = self.views[view](product)
+            record = records[view]
+            writer.write(to_record(record) if to_record else record)
+        self.count += 1
+
+    def emit_all(self, products):
+        for product in products:
+            self.emit(product)
+        return self.count
+
+    def close(self):
+        """Finish every feed. Returns {sink name: record count}."""
+        counts = {}
+        for i, (name, writer, _, _) in enumerate(self.sinks):
+            try:
+                counts[name] = writer.close()
+            except Exception:
+                for _, pending, _, _ in self.sinks[i + 1:]:
+                    pending.abort()
+                raise
+        logger.info(f"📤 Emitted {self.count} products to {len(self.sinks)} feeds in one pass")
+        return counts
+
+    def abort(self):
+        """Stop every feed, keeping the previously published files."""
+        for name, writer, _, _ in self.sinks:
+            try:
+                writer.abort()
+            except Exception as e:
+                logger.error(f"Error aborting feed {name}: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -1,7 +1,13 @@
 import csv
 import logging
+import os
 import sys
-from rapidfuzz import process, fuzz
+from collections import Counter, OrderedDict
+
+import numpy as np
+from rapidfuzz import process, fuzz, utils
+
+from taxonomy import load_taxonomy as load_shared_taxonomy
 
 # Setup logging
 logging.basicConfig(
@@ -21,6 +27,17 @@ UNMATCHED_FILE = "unmatched_invalid_categories.csv"
 # Fallback category ID (use sparingly)
 FALLBACK_CAT_ID = 6543
 
+# Minimum token_sort_ratio for a fuzzy category match
+FUZZY_MIN_SCORE = 70
+# Invalid categories whose fuzzy match is remembered
+FUZZY_CACHE_SIZE = int(os.getenv("FUZZY_CACHE_SIZE", "4096"))
+# Categories scored per process.cdist call
+FUZZY_BATCH_SIZE = int(os.getenv("FUZZY_BATCH_SIZE", "256"))
+# A batch is scored with one cdist call when its category x candidate-union
+# matrix is at most this many times the candidate pairs actually needed;
+# sparser batches are scored category by category
+FUZZY_CDIST_MAX_SPARSITY = 4
+
 # Keyword to Google category ID mapping for quick title-based matching
 KEYWORD_CATEGORY_MAP = {
     "vase": 644,            # Home & Garden > Decor > Vases
@@ -42,20 +59,8 @@ KEYWORD_CATEGORY_MAP = {
 }
 
 def load_taxonomy(filepath):
-    taxonomy = {}
-    with open(filepath, encoding='utf-8') as f:
-        for line in f:
-            if not line.strip():
-                continue
-            parts = line.split(' - ', 1)
-            if len(parts) != 2:
-                continue
-            cat_id_str, cat_name = parts
-            try:
-                cat_id = int(cat_id_str.strip())
-                taxonomy[cat_id] = cat_name.strip().lower()
-            except ValueError:
-                continue
+    """{category_id: lowercased path} from the shared taxonomy index, in file order."""
+    taxonomy = {category_id: path.lower() for category_id, path in load_shared_taxonomy(filepath).paths.items()}
     logger.info(f"✅ Loaded {len(taxonomy)} taxonomy categories from {filepath}")
     return taxonomy
 
@@ -79,15 +84,137 @@ def load_mappings(filepath):
     logger.info(f"✅ Loaded {count} category mappings from {filepath}")
     return mapping
 
-def fuzzy_match_category_name(invalid_cat, taxonomy_names):
-    invalid_cat_norm = invalid_cat.lower().strip()
-    match, score, idx = process.extractOne(
-        invalid_cat_norm,
-        taxonomy_names,
-        scorer=fuzz.token_sort_ratio
-    )
-    logger.debug(f"Fuzzy match for '{invalid_cat}' -> '{match}' with score {score}")
-    return match, score, idx
+class FuzzyCategoryIndex:
+    def __init__(self, names, min_score=FUZZY_MIN_SCORE, cache_size=FUZZY_CACHE_SIZE):
+        """
+        Fuzzy matcher over taxonomy category names.
+
+        Gives the same answers as process.extractOne(name, names,
+        scorer=fuzz.token_sort_ratio) with a score >= min_score, but names
+        are normalised and token-sorted once, a character-count prefilter
+        skips names that cannot reach min_score, and results are memoised.
+
+        Args:
+            names: Category names, indexed like the taxonomy IDs.
+            min_score: Lowest score accepted as a match.
+            cache_size: Number of memoised category -> match results.
+        """
+        self.names = list(names)
+        self.min_score = min_score
+        self.cache_size = cache_size
+        self._memo = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self._prepared = [self._prepare(name) for name in self.names]
+        self._lengths = np.array([len(name) for name in self._prepared], dtype=np.int32)
+        # Character counts of every name, one row per character
+        self._columns = {}
+        for name in self._prepared:
+            for char in name:
+                self._columns.setdefault(char, len(self._columns))
+        self._char_counts = np.zeros((len(self._columns), len(self._prepared)), dtype=np.int16)
+        for index, name in enumerate(self._prepared):
+            for char, count in Counter(name).items():
+                self._char_counts[self._columns[char], index] = count
+
+    @staticmethod
+    def _prepare(text):
+        """extractOne's default processing, then token_sort_ratio's token sort."""
+        return " ".join(sorted(utils.default_process(text).split()))
+
+    def _candidates(self, query):
+        """
+        Indexes of the names that can score >= min_score against a prepared
+        query. fuzz.ratio is 200 * LCS / (len1 + len2) and the LCS is at most
+        the shared character counts, so no name that could match is dropped.
+        """
+        shared = np.zeros(len(self._prepared), dtype=np.int16)
+        for char, count in Counter(query).items():
+            column = self._columns.get(char)
+            if column is not None:
+                shared += np.minimum(self._char_counts[column], count)
+        bound = 200.0 * shared / (self._lengths + len(query))
+        return np.flatnonzero(bound >= self.min_score - 1e-9)
+
+    def _best(self, query, candidates):
+        result = process.extractOne(query, [self._prepared[i] for i in candidates], scorer=fuzz.ratio,
+                                    processor=None, score_cutoff=self.min_score)
+        if result is None:
+            return None
+        _, score, position = result
+        index = int(candidates[position])
+        return self.names[index], score, index
+
+    def _score(self, category):
+        query = self._prepare(category)
+        if not query:
+            return None
+        candidates = self._candidates(query)
+        return self._best(query, candidates) if candidates.size else None
+
+    def _remember(self, category, result):
+        self._memo[category] = result
+        self._memo.move_to_end(category)
+        while len(self._memo) > self.cache_size:
+            self._memo.popitem(last=False)
+
+    def match(self, category):
+        """(name, score, index) of the best match for a category, or None below min_score."""
+        if category in self._memo:
+            self.hits += 1
+            self._memo.move_to_end(category)
+            return self._memo[category]
+        self.misses += 1
+        result = self._score(category)
+        self._remember(category, result)
+        logger.debug(f"Fuzzy match for '{category}' -> {result}")
+        return result
+
+    def match_many(self, categories):
+        """
+        {category: match or None} for many categories. Categories not yet
+        memoised are prefiltered and scored FUZZY_BATCH_SIZE at a time, with
+        one process.cdist call against the union of their candidate names
+        when the candidates overlap enough for that to pay off.
+        """
+        results = {}
+        pending = []
+        for category in dict.fromkeys(categories):
+            if category in self._memo:
+                results[category] = self.match(category)
+            else:
+                pending.append(category)
+
+        for start in range(0, len(pending), FUZZY_BATCH_SIZE):
+            batch = pending[start:start + FUZZY_BATCH_SIZE]
+            queries = [self._prepare(category) for category in batch]
+            candidates = [self._candidates(query) if query else np.empty(0, dtype=np.int64) for query in queries]
+            columns = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+            scored = [row for row, found in enumerate(candidates) if found.size]
+
+            best = {}
+            needed = sum(candidates[row].size for row in scored)
+            if scored and len(scored) * columns.size <= FUZZY_CDIST_MAX_SPARSITY * needed:
+                scores = process.cdist([queries[row] for row in scored], [self._prepared[i] for i in columns],
+                                       scorer=fuzz.ratio, processor=None, score_cutoff=self.min_score,
+                                       dtype=np.float64, workers=-1)
+                # argmax takes the first of equal scores, i.e. the lowest
+                # taxonomy index, as extractOne does
+                for position, column in enumerate(scores.argmax(axis=1)):
+                    score = float(scores[position, column])
+                    if score >= self.min_score:
+                        index = int(columns[column])
+                        best[scored[position]] = (self.names[index], score, index)
+            else:
+                for row in scored:
+                    best[row] = self._best(queries[row], candidates[row])
+
+            for row, category in enumerate(batch):
+                self.misses += 1
+                results[category] = best.get(row)
+                self._remember(category, results[category])
+        return results
 
 def keyword_category_match(product_title):
     title_lower = product_title.lower()
@@ -96,12 +223,23 @@ def keyword_category_match(product_title):
             return cat_id
     return None
 
+def needs_fuzzy_match(orig_cat, product_title, mapping, taxonomy):
+    """Whether fix_categories falls through to fuzzy matching for a row."""
+    if orig_cat in mapping:
+        return False
+    if product_title and keyword_category_match(product_title):
+        return False
+    try:
+        return int(orig_cat) not in taxonomy
+    except ValueError:
+        return True
+
 def fix_categories():
     taxonomy = load_taxonomy(TAXONOMY_FILE)
     mapping = load_mappings(MAPPING_FILE)
 
-    taxonomy_names = list(taxonomy.values())
     taxonomy_ids = list(taxonomy.keys())
+    fuzzy_index = FuzzyCategoryIndex(taxonomy.values())
 
     unmatched_categories = set()
     total_products = 0
@@ -124,7 +262,15 @@ def fix_categories():
         writer = csv.DictWriter(outfile, fieldnames=fieldnames)
         writer.writeheader()
 
-        for row in reader:
+        # Fuzzy-match every distinct category that needs it in one batch up
+        # front; the per-row lookups below are then memo hits
+        rows = list(reader)
+        fuzzy_index.match_many(
+            row["google_product_category"].strip() for row in rows
+            if needs_fuzzy_match(row["google_product_category"].strip(), row.get("title", ""), mapping, taxonomy)
+        )
+
+        for row in rows:
             total_products += 1
             orig_cat = row["google_product_category"].strip()
             product_title = row.get("title", "")
@@ -155,8 +301,9 @@ def fix_categories():
                         pass
                     else:
                         # Step 3: Fuzzy match on category names
-                        match, score, idx = fuzzy_match_category_name(orig_cat, taxonomy_names)
-                        if score >= 70:
+                        fuzzy_match = fuzzy_index.match(orig_cat)
+                        if fuzzy_match:
+                            _, score, idx = fuzzy_match
                             matched_id = taxonomy_ids[idx]
                             row["google_product_category"] = str(matched_id)
                             fixed_count += 1
@@ -167,8 +314,9 @@ def fix_categories():
                             logger.warning(f"No good fuzzy match for '{orig_cat}'. Assigned fallback category {FALLBACK_CAT_ID}.")
                 except ValueError:
                     # Non-numeric invalid category - fuzzy match by name directly
-                    match, score, idx = fuzzy_match_category_name(orig_cat, taxonomy_names)
-                    if score >= 70:
+                    fuzzy_match = fuzzy_index.match(orig_cat)
+                    if fuzzy_match:
+                        _, score, idx = fuzzy_match
                         matched_id = taxonomy_ids[idx]
                         row["google_product_category"] = str(matched_id)
                         fixed_count += 1
@@ -182,6 +330,7 @@ def fix_categories():
 
     logger.info(f"✅ Fixed categories for {fixed_count} out of {total_products} products.")
     logger.info(f"⚠️ Total unmatched invalid categories after fix: {len(unmatched_categories)}")
+    logger.info(f"🔍 Fuzzy matching scored {fuzzy_index.misses} distinct categories ({fuzzy_index.hits} memo hits)")
 
     # Save unmatched categories for manual review
     with open(UNMATCHED_FILE, 'w', encoding='utf-8', newline='') as f:
@@ -0,0 +1,99 @@
+"""
+On-disk conditional GET cache for product pages.
+
+Entries are keyed by URL and hold the response validators (ETag,
+Last-Modified), a SHA-256 of the body and the product record extracted from
+it. On the next run the validators are sent as If-None-Match /
+If-Modified-Since; a 304, or a 200 whose body hash is unchanged, lets the
+caller reuse the stored record without parsing the page again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_FILE = os.getenv("HTTP_CACHE_FILE", "http_cache.json")
+
+def body_hash(content):
+    """SHA-256 hex digest of a response body (bytes or str)."""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since headers for a cache entry (or None)."""
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+class HttpCache:
+    def __init__(self, path=HTTP_CACHE_FILE):
+        """
+        Load the cache from disk.
+
+        Args:
+            path: JSON file holding the cache entries; missing or unreadable
+                  files start an empty cache.
+        """
+        self.path = path
+        self.entries = {}
+        self.stats = {"not_modified": 0, "unchanged_body": 0, "parsed": 0}
+        self._dirty = False
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+                logger.info(f"Cache HIT: Loaded {len(self.entries)} HTTP cache entries from {path}")
+            except Exception as e:
+                logger.error(f"Error loading HTTP cache {path}: {e}")
+        else:
+            logger.info(f"Cache MISS: No {path} found, will create new.")
+
+    def get(self, url):
+        """Return the cache entry for a URL, or None."""
+        return self.entries.get(url)
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since headers for a cached URL."""
+        return conditional_headers(self.entries.get(url))
+
+    def store(self, url, response, digest, record):
+        """Save validators, body hash and extracted record for a 200 response."""
+        self.entries[url] = {
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+            "body_hash": digest,
+            "checked_at": datetime.utcnow().isoformat(),
+            "record": record,
+        }
+        self._dirty = True
+
+    def touch(self, url):
+        """Mark a cached URL as revalidated (304 Not Modified)."""
+        entry = self.entries.get(url)
+        if entry:
+            entry["checked_at"] = datetime.utcnow().isoformat()
+            self._dirty = True
+
+    def save(self):
+        """Write the cache atomically if anything changed."""
+        if not self._dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            logger.info(f"✅ Saved {len(self.entries)} HTTP cache entries to {self.path}")
+        except Exception as e:
+            logger.error(f"❌ Failed to save HTTP cache: {e}")
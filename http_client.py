@@ -0,0 +1,161 @@
+"""
+Shared HTTP fetch layer for the crawler and the feed generator.
+
+All requests go through one pooled client so connections to joyandco.com are
+kept alive and reused instead of paying a new TCP+TLS handshake per page.
+
+- requests.Session with a sized HTTPAdapter pool and urllib3 retries (default)
+- HTTP/2 via httpx when httpx and h2 are installed (optional, HTTP2=0 disables)
+- gzip/deflate negotiation, plus brotli when a brotli decoder is installed
+- User-Agent rotation and default browser headers
+- every request waits on, and reports back to, the politeness scheduler
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+
+from politeness import scheduler, THROTTLE_STATUSES
+
+try:
+    import httpx
+    import h2  # noqa: F401 - httpx needs h2 for HTTP/2
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+# httpx logs every request at INFO, which would flood the crawl logs
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Connection pool size per host and retry budget for transient failures
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))
+
+# Extra attempts after a 429/503, spaced out by the politeness scheduler
+THROTTLE_RETRIES = int(os.getenv("HTTP_THROTTLE_RETRIES", "2"))
+
+USE_HTTP2 = httpx is not None and os.getenv("HTTP2", "1") != "0"
+
+# User-Agent list for rotation to avoid bot detection
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/14.1.1 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0",
+    "Mozilla/5.0 (iPad; CPU OS 15_2 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) CriOS/98.0.4758.85 Mobile/15E148 Safari/604.1"
+]
+
+# "gzip,deflate" plus ",br" when urllib3 can decode brotli
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+
+# Errors raised for requests that never produced a response
+FETCH_ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_random_user_agent():
+    """Return a random User-Agent string from the list."""
+    return random.choice(USER_AGENTS)
+
+def build_headers(extra=None):
+    """Default browser-like request headers with a rotated User-Agent."""
+    headers = {
+        "User-Agent": get_random_user_agent(),
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.5",
+        "Accept-Encoding": ACCEPT_ENCODING,
+    }
+    if extra:
+        headers.update(extra)
+    return headers
+
+def _create_client():
+    if USE_HTTP2:
+        logger.info(f"🌐 HTTP client: httpx with HTTP/2, pool size {POOL_SIZE}")
+        return httpx.Client(
+            http2=True,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            transport=httpx.HTTPTransport(http2=True, retries=MAX_RETRIES),
+        )
+
+    logger.info(f"🌐 HTTP client: requests keep-alive session, pool size {POOL_SIZE}, {MAX_RETRIES} retries")
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        # 429/503 are left to the politeness scheduler so it can back off
+        status_forcelist=(500, 502, 504),
+        allowed_methods=("GET", "HEAD"),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_client():
+    """Return the process-wide pooled client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+def close_client():
+    """Close pooled connections (safe to call when no client exists)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+def fetch(url, method="GET", headers=None, timeout=15, wait=True):
+    """
+    Perform a polite HTTP request through the shared pool.
+
+    Args:
+        url: Absolute URL to request.
+        method: HTTP method, "GET" or "HEAD".
+        headers: Request headers; build_headers() is used when None.
+        timeout: Per-request timeout in seconds.
+        wait: Wait on the politeness scheduler first. Pass False when the
+              caller already waited (e.g. via scheduler.wait_async()).
+
+    Returns:
+        The response object. Throttled responses (429/503) are retried up to
+        THROTTLE_RETRIES times before being returned.
+    """
+    if headers is None:
+        headers = build_headers()
+    client = get_client()
+
+    for attempt in range(THROTTLE_RETRIES + 1):
+        if wait or attempt:
+            scheduler.wait(url)
+        started = time.monotonic()
+        try:
+            response = client.request(method, url, headers=headers, timeout=timeout)
+        except FETCH_ERRORS:
+            scheduler.record(url, None, time.monotonic() - started)
+            raise
+        scheduler.record_response(url, response)
+        if response.status_code not in THROTTLE_STATUSES:
+            break
+        logger.warning(f"⏳ HTTP {response.status_code} for {url} (attempt {attempt + 1}/{THROTTLE_RETRIES + 1})")
+    return response
@@ -0,0 +1,86 @@
+"""
+Aho-Corasick keyword automaton.
+
+Compiles a set of keywords once so every occurrence of every keyword in a
+text is found in a single left-to-right scan, instead of one substring test
+per keyword. Keywords are matched exactly as given; callers lowercase both
+keywords and text for case-insensitive matching.
+"""
+
+from collections import deque
+
+class KeywordAutomaton:
+    def __init__(self, keywords=()):
+        """
+        Build the automaton.
+
+        Args:
+            keywords: (keyword, value) pairs. A keyword may be added more than
+                once with different values; every value is reported.
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        self._lengths = {}
+        for keyword, value in keywords:
+            self._add(keyword, value)
+        self._link()
+
+    def _add(self, keyword, value):
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] = self._out[state] + ((len(keyword), value),)
+
+    def _link(self):
+        # Breadth-first failure links; each state's outputs include those of
+        # its failure state so a scan never has to walk the suffix chain
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """Yield (start, end, value) for every keyword occurrence in text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in out[state]:
+                yield index + 1 - length, index + 1, value
+
+    def values(self, text):
+        """Set of values of the keywords occurring in text."""
+        return {value for _, _, value in self.iter_matches(text)}
+
+    def first(self, text):
+        """Smallest value among the keywords occurring in text, or None."""
+        goto, fail, out = self._goto, self._fail, self._out
+        best = None
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for _, value in out[state]:
+                if best is None or value < best:
+                    best = value
+        return best
@@ -1,12 +1,13 @@
-import csv
 import json
 import logging
 import os
 import sys
-import xml.etree.ElementTree as ET
-import xml.dom.minidom as minidom
 from datetime import datetime
 
+from lxml import etree
+
+from feed_writers import CsvFeedWriter, DeltaFeedWriter, FeedEmitter, XmlFeedWriter, sub_element
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,308 +17,221 @@ logging.basicConfig(
     ]
 )
 
-# Generate Meta Shopping feed in CSV format
-def generate_meta_csv_feed(products, output_file="meta_feed/facebook_product_feed.csv"):
-    """
-    Generate a Facebook/Meta product feed CSV file from product data
-    """
-    logging.info(f"Generating Meta Shopping CSV feed at {output_file} with {len(products)} products")
-    
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+# Standalone input (the Google XML feed) and Meta outputs
+XML_INPUT = "google_feed/product_feed.xml"
+META_CSV_OUTPUT = "meta_feed/facebook_product_feed.csv"
+META_XML_OUTPUT = "meta_feed/facebook_product_feed.xml"
+# Products whose price, availability, title or images changed since the
+# previous META_CSV_OUTPUT, for a Meta supplemental feed
+META_DELTA_CSV_OUTPUT = "meta_feed/facebook_product_feed_delta.csv"
+
+G_NS = "http://base.google.com/ns/1.0"
+
+# Meta Shopping Feed fields
+# Reference: https://www.facebook.com/business/help/120325381656392
+META_FIELDS = [
+    "id",                      # Required: A unique identifier for the item
+    "title",                   # Required: The name of the item
+    "description",             # Required: Description of the item
+    "availability",            # Required: In stock, out of stock, preorder, available for order
+    "condition",               # Required: new, refurbished, used
+    "price",                   # Required: The price of the item
+    "link",                    # Required: The URL to the product page
+    "image_link",              # Required: The URL for the product's main image
+    "brand",                   # Required: The brand name of the product
+    "additional_image_link",   # Optional: Additional product images
+    "google_product_category", # Optional: Google product taxonomy
+    "fb_product_category",     # Optional: Facebook product category
+    "sale_price",              # Optional: Sale price
+    "inventory",               # Optional: Number of items in stock
+    "item_group_id"            # Optional: Group variants of the same product
+]
+
+# <item> children of the RSS feed, in order
+META_ITEM_FIELDS = [
+    "id", "title", "description", "link", "price", "sale_price", "image_link", "additional_image_link",
+    "brand", "availability", "condition", "google_product_category", "fb_product_category",
+    "inventory", "item_group_id"
+]
+META_OPTIONAL_ITEM_FIELDS = {
+    "sale_price", "additional_image_link", "google_product_category", "fb_product_category",
+    "inventory", "item_group_id"
+}
+
+# Map availability to Meta format
+AVAILABILITY_MAPPING = {
+    "in stock": "in stock",
+    "out of stock": "out of stock",
+    "limited availability": "in stock"
+}
+
+# Map Google categories to Facebook categories (simplified)
+# For a complete mapping, see: https://www.facebook.com/business/help/1244435349304218
+FB_CATEGORY_MAPPING = {
+    # Home & Garden
+    "166": "home_goods", # Home & Garden > Decor
+    "632": "home_goods", # Decorative Accents
+    "635": "home_goods", # Throw Pillows
+    "639": "home_goods", # Artwork
+    "644": "home_goods", # Vases
+    "3654": "home_goods", # Candles & Home Fragrances
+    "3655": "home_goods", # Candles
+    "3309": "home_goods", # Candleholders
+    "7097": "home_goods", # Decorative Trays
+    "3617": "seasonal_holiday_supplies", # Seasonal & Holiday Decorations
+    "5506": "seasonal_holiday_supplies", # Christmas Decorations
     
-    # Define Meta Shopping Feed fields
-    # Reference: https://www.facebook.com/business/help/120325381656392
-    meta_fields = [
-        "id",                      # Required: A unique identifier for the item
-        "title",                   # Required: The name of the item
-        "description",             # Required: Description of the item
-        "availability",            # Required: In stock, out of stock, preorder, available for order
-        "condition",               # Required: new, refurbished, used
-        "price",                   # Required: The price of the item
-        "link",                    # Required: The URL to the product page
-        "image_link",              # Required: The URL for the product's main image
-        "brand",                   # Required: The brand name of the product
-        "additional_image_link",   # Optional: Additional product images
-        "google_product_category", # Optional: Google product taxonomy
-        "fb_product_category",     # Optional: Facebook product category
-        "sale_price",              # Optional: Sale price
-        "inventory",               # Optional: Number of items in stock
-        "item_group_id"            # Optional: Group variants of the same product
-    ]
+    # Kitchen & Dining
+    "6208": "household_supplies", # Tableware
+    "6209": "household_supplies", # Bowls
+    "6210": "household_supplies", # Plates
+    "728": "household_supplies",  # Cutlery
+    "6228": "household_supplies", # Glasses & Tumblers
+    "6231": "household_supplies", # Cups & Mugs
+    "734": "household_supplies",  # Serving Trays & Platters
+    "672": "household_supplies",  # Cookware
+    "673": "household_supplies",  # Bakeware
+    "7458": "household_supplies", # Table Linens
+    "7491": "household_supplies", # Placemats
+    "7492": "household_supplies", # Napkins
+    "7493": "household_supplies", # Tablecloths
+    "7494": "household_supplies", # Table Runners
     
-    # Map Google categories to Facebook categories
-    meta_products = map_products_for_meta(products)
+    # Furniture
+    "6320": "furniture", # Coffee Tables
+    "6321": "furniture", # Console Tables
+    "6357": "furniture", # Side Tables
     
-    try:
-        with open(output_file, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=meta_fields)
-            writer.writeheader()
-            
-            for product in meta_products:
-                writer.writerow(product)
-        
-        # Verify file was created
-        if os.path.exists(output_file):
-            file_size = os.path.getsize(output_file)
-            logging.info(f"Meta Shopping CSV feed successfully created at {output_file}, size: {file_size} bytes")
-            return True
-        else:
-            logging.error(f"Meta Shopping CSV feed was not created at {output_file}")
-            return False
-            
-    except Exception as e:
-        logging.error(f"Error generating Meta Shopping CSV feed: {e}")
-        return False
+    # Gifts
+    "5394": "gift_giving", # Gift Giving
+    "5424": "gift_giving"  # Gift Sets
+}
 
-# Generate Meta Shopping feed in XML/RSS format
-def generate_meta_xml_feed(products, output_file="meta_feed/facebook_product_feed.xml"):
+# Map a product to Meta format
+def map_product_for_meta(product):
     """
-    Generate a Facebook/Meta product feed XML file from product data
+    Map one product record to Meta Shopping format
     """
-    logging.info(f"Generating Meta Shopping XML feed at {output_file} with {len(products)} products")
+    meta_product = {
+        "id": product.get("id", ""),
+        "title": product.get("title", ""),
+        "description": product.get("description", ""),
+        "availability": AVAILABILITY_MAPPING.get(product.get("availability", ""), "in stock"),
+        "condition": product.get("condition", "new"),
+        "price": product.get("price", ""),
+        "link": product.get("link", ""),
+        "image_link": product.get("image_link", ""),
+        "brand": product.get("brand", ""),
+        "additional_image_link": product.get("additional_image_link", ""),
+        # Not a Meta column; the delta feed compares the whole image list
+        "additional_images": product.get("additional_images", []),
+        "google_product_category": product.get("google_product_category", ""),
+        "fb_product_category": FB_CATEGORY_MAPPING.get(product.get("google_product_category", ""), ""),
+        "item_group_id": product.get("item_group_id", "")
+    }
     
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    # Add sale price if available
+    if product.get("has_sale") and product.get("sale_price"):
+        meta_product["sale_price"] = product.get("sale_price", "")
+    else:
+        meta_product["sale_price"] = ""
     
-    # Map Google categories to Facebook categories
-    meta_products = map_products_for_meta(products)
+    # Add inventory field (not available in current data)
+    meta_product["inventory"] = ""
     
-    try:
-        # Create XML structure using RSS 2.0 format
-        rss = ET.Element("rss")
-        rss.set("version", "2.0")
-        rss.set("xmlns:g", "http://base.google.com/ns/1.0")
-        
-        channel = ET.SubElement(rss, "channel")
-        
-        # Add feed metadata
-        title = ET.SubElement(channel, "title")
-        title.text = "Joy&Co Product Feed for Meta Shopping"
-        
-        description = ET.SubElement(channel, "description")
-        description.text = "Product feed for Joy&Co products compatible with Meta Shopping"
-        
-        link = ET.SubElement(channel, "link")
-        link.text = "https://joyandco.com"
-        
-        # Add current date and time
-        pubDate = ET.SubElement(channel, "pubDate")
-        pubDate.text = datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S GMT")
-        
-        # Add products
-        for product in meta_products:
-            item = ET.SubElement(channel, "item")
-            
-            # Add required fields
-            for field in ["id", "title", "description", "link"]:
-                element = ET.SubElement(item, "g:" + field)
-                element.text = product.get(field, "")
-            
-            # Add price
-            price_elem = ET.SubElement(item, "g:price")
-            price_elem.text = product.get("price", "")
-            
-            # Add sale price if available
-            if product.get("sale_price"):
-                sale_price_elem = ET.SubElement(item, "g:sale_price")
-                sale_price_elem.text = product.get("sale_price", "")
-            
-            # Add image link
-            image_link = ET.SubElement(item, "g:image_link")
-            image_link.text = product.get("image_link", "")
-            
-            # Add additional image link if available
-            if product.get("additional_image_link"):
-                additional_image = ET.SubElement(item, "g:additional_image_link")
-                additional_image.text = product.get("additional_image_link", "")
-            
-            # Add brand
-            brand = ET.SubElement(item, "g:brand")
-            brand.text = product.get("brand", "")
-            
-            # Add availability
-            availability = ET.SubElement(item, "g:availability")
-            availability.text = product.get("availability", "")
-            
-            # Add condition
-            condition = ET.SubElement(item, "g:condition")
-            condition.text = product.get("condition", "")
-            
-            # Add Google product category if available
-            if product.get("google_product_category"):
-                g_category = ET.SubElement(item, "g:google_product_category")
-                g_category.text = product.get("google_product_category", "")
-                
-            # Add Facebook product category if available
-            if product.get("fb_product_category"):
-                fb_category = ET.SubElement(item, "g:fb_product_category")
-                fb_category.text = product.get("fb_product_category", "")
-                
-            # Add inventory if available
-            if product.get("inventory"):
-                inventory = ET.SubElement(item, "g:inventory")
-                inventory.text = product.get("inventory", "")
-                
-            # Add item_group_id if available
-            if product.get("item_group_id"):
-                item_group = ET.SubElement(item, "g:item_group_id")
-                item_group.text = product.get("item_group_id", "")
-        
-        # Convert to string with pretty formatting
-        rough_string = ET.tostring(rss, 'utf-8')
-        reparsed = minidom.parseString(rough_string)
-        pretty_xml = reparsed.toprettyxml(indent="  ")
-        
-        # Write to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(pretty_xml)
-        
-        # Verify file was created
-        if os.path.exists(output_file):
-            file_size = os.path.getsize(output_file)
-            logging.info(f"Meta Shopping XML feed successfully created at {output_file}, size: {file_size} bytes")
-            return True
-        else:
-            logging.error(f"Meta Shopping XML feed was not created at {output_file}")
-            return False
-            
-    except Exception as e:
-        logging.error(f"Error generating Meta Shopping XML feed: {e}")
-        return False
+    return meta_product
 
-# Map products to Meta format
 def map_products_for_meta(products):
     """
     Map product data to Meta Shopping format
     """
-    # Map availability to Meta format
-    availability_mapping = {
-        "in stock": "in stock",
-        "out of stock": "out of stock",
-        "limited availability": "in stock"
-    }
-    
-    # Map Google categories to Facebook categories (simplified)
-    # For a complete mapping, see: https://www.facebook.com/business/help/1244435349304218
-    fb_category_mapping = {
-        # Home & Garden
-        "166": "home_goods", # Home & Garden > Decor
-        "632": "home_goods", # Decorative Accents
-        "635": "home_goods", # Throw Pillows
-        "639": "home_goods", # Artwork
-        "644": "home_goods", # Vases
-        "3654": "home_goods", # Candles & Home Fragrances
-        "3655": "home_goods", # Candles
-        "3309": "home_goods", # Candleholders
-        "7097": "home_goods", # Decorative Trays
-        "3617": "seasonal_holiday_supplies", # Seasonal & Holiday Decorations
-        "5506": "seasonal_holiday_supplies", # Christmas Decorations
-        
-        # Kitchen & Dining
-        "6208": "household_supplies", # Tableware
-        "6209": "household_supplies", # Bowls
-        "6210": "household_supplies", # Plates
-        "728": "household_supplies",  # Cutlery
-        "6228": "household_supplies", # Glasses & Tumblers
-        "6231": "household_supplies", # Cups & Mugs
-        "734": "household_supplies",  # Serving Trays & Platters
-        "672": "household_supplies",  # Cookware
-        "673": "household_supplies",  # Bakeware
-        "7458": "household_supplies", # Table Linens
-        "7491": "household_supplies", # Placemats
-        "7492": "household_supplies", # Napkins
-        "7493": "household_supplies", # Tablecloths
-        "7494": "household_supplies", # Table Runners
-        
-        # Furniture
-        "6320": "furniture", # Coffee Tables
-        "6321": "furniture", # Console Tables
-        "6357": "furniture", # Side Tables
-        
-        # Gifts
-        "5394": "gift_giving", # Gift Giving
-        "5424": "gift_giving"  # Gift Sets
-    }
-    
-    meta_products = []
+    return [map_product_for_meta(product) for product in products]
+
+def meta_item_element(product):
+    """A Meta-mapped product as an RSS <item> of g: fields."""
+    item = etree.Element("item")
     
-    for product in products:
-        # Map product data to Meta Shopping format
-        meta_product = {
-            "id": product.get("id", ""),
-            "title": product.get("title", ""),
-            "description": product.get("description", ""),
-            "availability": availability_mapping.get(product.get("availability", ""), "in stock"),
-            "condition": product.get("condition", "new"),
-            "price": product.get("price", ""),
-            "link": product.get("link", ""),
-            "image_link": product.get("image_link", ""),
-            "brand": product.get("brand", ""),
-            "additional_image_link": product.get("additional_image_link", ""),
-            "google_product_category": product.get("google_product_category", ""),
-            "fb_product_category": fb_category_mapping.get(product.get("google_product_category", ""), ""),
-            "item_group_id": product.get("item_group_id", "")
-        }
-        
-        # Add sale price if available
-        if product.get("has_sale") and product.get("sale_price"):
-            meta_product["sale_price"] = product.get("sale_price", "")
-        else:
-            meta_product["sale_price"] = ""
-        
-        # Add inventory field (not available in current data)
-        meta_product["inventory"] = ""
-        
-        meta_products.append(meta_product)
-        
-    return meta_products
+    # Required fields, price, image, brand, availability and condition are
+    # always written; the others only when the product has a value
+    for field in META_ITEM_FIELDS:
+        if field in META_OPTIONAL_ITEM_FIELDS and not product.get(field):
+            continue
+        sub_element(item, f"{{{G_NS}}}{field}", product.get(field, ""))
+    return item
+
+def meta_channel_header():
+    """Feed metadata elements at the top of the RSS <channel>."""
+    header = []
+    for tag, text in [
+        ("title", "Joy&Co Product Feed for Meta Shopping"),
+        ("description", "Product feed for Joy&Co products compatible with Meta Shopping"),
+        ("link", "https://joyandco.com"),
+        ("pubDate", datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S GMT")),
+    ]:
+        element = etree.Element(tag)
+        element.text = text
+        header.append(element)
+    return header
+
+def add_meta_sinks(emitter, csv_output=META_CSV_OUTPUT, xml_output=META_XML_OUTPUT, sort_xml=False,
+                   delta_output=META_DELTA_CSV_OUTPUT, full_snapshot=False):
+    """
+    Register the Meta CSV, delta CSV and RSS feeds on a FeedEmitter. All
+    read the "meta" view, so each product is mapped once for the files.
+    sort_xml orders RSS items by link for input whose order varies;
+    full_snapshot writes every product to the delta feed.
+    """
+    emitter.add_view("meta", map_product_for_meta)
+    # Reads the previous Meta CSV as its baseline now, before the Meta CSV
+    # sink replaces it on close
+    if delta_output:
+        emitter.add_sink("Meta delta CSV", DeltaFeedWriter(delta_output, META_FIELDS, csv_output,
+                                                           full_snapshot=full_snapshot), view="meta")
+    emitter.add_sink("Meta CSV", CsvFeedWriter(csv_output, META_FIELDS), view="meta")
+    # RSS 2.0 with the Google namespace declared once on <rss>
+    rss = XmlFeedWriter(xml_output, "rss", attrib={"version": "2.0"}, nsmap={"g": G_NS},
+                        container="channel", header=meta_channel_header(), indent="  ",
+                        sort_key=(lambda item: item.findtext(f"{{{G_NS}}}link") or "") if sort_xml else None)
+    emitter.add_sink("Meta RSS", rss, view="meta", to_record=meta_item_element)
 
-# Main function to generate both CSV and XML feeds
+def load_products_from_xml(path=XML_INPUT):
+    """Yield product dicts from the Google XML feed, one <product> at a time."""
+    for _, product_elem in etree.iterparse(path, tag="product"):
+        product = {}
+        for elem in product_elem:
+            if elem.tag == 'additional_images':
+                product['additional_images'] = [image.text or "" for image in elem]
+            elif elem.tag != 'variants':
+                product[elem.tag] = elem.text or ""
+        yield product
+        product_elem.clear()
+        while product_elem.getprevious() is not None:
+            del product_elem.getparent()[0]
+
+# Regenerate both Meta feeds from an existing Google XML feed.
+# The crawl pipeline and product_feed_generator.py write the Meta feeds
+# themselves; this is only needed to rebuild them on their own.
 def main():
     logging.info("Starting Meta Shopping feed generator")
     
-    # Path to existing XML product feed
-    XML_INPUT = "google_feed/product_feed.xml"
-    META_CSV_OUTPUT = "meta_feed/facebook_product_feed.csv"
-    META_XML_OUTPUT = "meta_feed/facebook_product_feed.xml"
-    
     try:
         if not os.path.exists(XML_INPUT):
             logging.error(f"Input XML file does not exist: {XML_INPUT}")
             sys.exit(1)
-            
-        # Load products from XML feed
-        tree = ET.parse(XML_INPUT)
-        root = tree.getroot()
-        
-        products = []
-        for product_elem in root.findall('product'):
-            product = {}
-            for elem in product_elem:
-                if elem.tag not in ['additional_images', 'variants']:
-                    product[elem.tag] = elem.text or ""
-            products.append(product)
-            
-        logging.info(f"Loaded {len(products)} products from XML feed")
         
-        # Generate Meta Shopping feeds
-        csv_success = generate_meta_csv_feed(products, META_CSV_OUTPUT)
-        xml_success = generate_meta_xml_feed(products, META_XML_OUTPUT)
+        # Single pass: each product is read, mapped once and written to both feeds
+        with FeedEmitter() as emitter:
+            add_meta_sinks(emitter)
+            emitter.emit_all(load_products_from_xml(XML_INPUT))
         
-        if csv_success and xml_success:
-            print(f"✅ Successfully generated Meta Shopping feeds with {len(products)} products")
-            print(f"   - CSV feed: {META_CSV_OUTPUT}")
-            print(f"   - XML feed: {META_XML_OUTPUT}")
-        else:
-            if not csv_success:
-                print(f"❌ Failed to generate Meta Shopping CSV feed")
-            if not xml_success:
-                print(f"❌ Failed to generate Meta Shopping XML feed")
+        print(f"✅ Successfully generated Meta Shopping feeds with {emitter.count} products")
+        print(f"   - CSV feed: {META_CSV_OUTPUT}")
+        print(f"   - XML feed: {META_XML_OUTPUT}")
+        print(f"   - Delta CSV feed: {META_DELTA_CSV_OUTPUT}")
             
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
-        print(f"❌ Error: {e}")
+        print(f"❌ Failed to generate Meta Shopping feeds: {e}")
 
 if __name__ == "__main__":
     main()
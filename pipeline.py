@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Streaming crawl-to-feed pipeline.
+
+Runs crawler discovery and product extraction in one process instead of
+`crawler.py` followed by `product_feed_generator.py`:
+
+- the crawler runs on a background thread and reports every product URL it
+  finds through crawler.product_hook into an in-process queue
+- URLs are planned as they arrive (new/modified/stale/flagged are extracted,
+  the rest reuse the product store) and fed straight into the fetch/parse
+  pools of product_feed_generator.stream_products()
+- finished products are fanned out to every Google and Meta feed as soon
+  as they are ready (feed_writers.FeedEmitter)
+
+Known products the crawl did not report again are planned once discovery
+ends. The same output files as the two-step run are written at the end.
+When discovery fails, the feeds from the previous run are kept and the
+pipeline exits non-zero, so a partial catalogue is never published.
+"""
+
+import argparse
+import logging
+import queue
+import sys
+import threading
+import time
+
+import crawler
+from http_cache import HttpCache
+from http_client import close_client
+from product_feed_generator import (
+    CHECKPOINT_EVERY, FETCH_WORKERS, PARSE_WORKERS, extraction_reason, load_manual_overrides, open_feed_emitter,
+    reuse_cached_product, stream_products
+)
+from product_store import ProductStore
+
+logger = logging.getLogger(__name__)
+
+class Pipeline:
+    """Discovery thread → extraction stream → feed writers."""
+
+    def __init__(self, args):
+        self.args = args
+        self.manual_overrides = load_manual_overrides()
+        self.store = ProductStore()
+        self.http_cache = HttpCache()
+        self.discovered = queue.Queue()
+        self.discovery_result = {"products": [], "complete": False}
+        self.seen = set()
+        self.lock = threading.Lock()
+        self.stats = {"extracted": 0, "reused": 0, "failed": 0, "changed": 0}
+        self.started = time.monotonic()
+        self.first_product_at = None
+        self.emitter = None
+
+    def discover(self):
+        """Crawler thread: run discovery, reporting product URLs as they are found."""
+        try:
+            self.discovery_result["products"] = crawler.discover_products(
+                self.args.concurrency, full_crawl=self.args.full_crawl, resume=self.args.resume
+            )
+            self.discovery_result["complete"] = True
+        except Exception as e:
+            logger.error(f"💥 Discovery failed: {e}")
+        finally:
+            self.discovered.put(None)
+
+    def plan(self, url, lastmod):
+        """Return True if the URL must be extracted; reused products are emitted directly."""
+        with self.lock:
+            if url in self.seen:
+                return False
+            self.seen.add(url)
+            reason = extraction_reason(url, self.store, self.args.full, lastmod=lastmod)
+            if not reason:
+                record = self.store.get(url)
+                self.stats["reused"] += 1
+        if reason:
+            return True
+        self.emit(url, reuse_cached_product(record, self.manual_overrides))
+        return False
+
+    def urls_to_extract(self):
+        """Blocking iterator over URLs to extract, fed by the discovery thread."""
+        while True:
+            item = self.discovered.get()
+            if item is None:
+                break
+            if self.plan(*item):
+                yield item[0]
+
+        # Products known from earlier runs that this crawl did not report again
+        for url, _, lastmod in self.discovery_result["products"]:
+            if self.plan(url, lastmod or None):
+                yield url
+
+    def emit(self, url, product):
+        """Hand a finished product to every feed."""
+        with self.lock:
+            self.emitter.emit(product)
+            if self.first_product_at is None:
+                self.first_product_at = time.monotonic() - self.started
+                logger.info(f"⏱️ First product ready after {self.first_product_at:.1f}s")
+
+    def record(self, url, data):
+        """Store an extraction result and checkpoint periodically."""
+        with self.lock:
+            if data:
+                if self.store.update(url, data):
+                    self.stats["changed"] += 1
+                self.stats["extracted"] += 1
+            else:
+                self.store.flag(url)
+                self.stats["failed"] += 1
+            processed = self.stats["extracted"] + self.stats["failed"]
+            if processed % CHECKPOINT_EVERY == 0:
+                logger.info(f"🔄 Progress: {processed} extracted ({self.stats['failed']} failed), "
+                            f"{self.stats['reused']} reused, discovery {'running' if self.discovering() else 'done'}")
+                self.store.save()
+                self.http_cache.save()
+        if data:
+            self.emit(url, data)
+
+    def discovering(self):
+        return self.discovery_thread.is_alive()
+
+    def run(self):
+        """
+        Run discovery and extraction. Returns the number of products in the
+        feeds, or None when discovery failed: the previous feeds are then kept, since
+        the products this run saw are not the whole catalogue.
+        """
+        crawler.load_existing_data()
+        crawler.product_hook = lambda url, lastmod: self.discovered.put((url, lastmod))
+
+        # Completion order varies between runs, so the XML feeds are written sorted
+        self.emitter = open_feed_emitter(sort_xml=True, full_snapshot=self.args.full_snapshot or None)
+        try:
+            self.discovery_thread = threading.Thread(target=self.discover, name="discovery", daemon=True)
+            self.discovery_thread.start()
+
+            for url, data in stream_products(self.urls_to_extract(), self.manual_overrides, self.http_cache,
+                                             self.args.fetch_workers, self.args.parse_workers):
+                self.record(url, data)
+            self.discovery_thread.join()
+        except BaseException:
+            self.emitter.abort()
+            raise
+        else:
+            if self.discovery_result["complete"]:
+                self.emitter.close()
+            else:
+                # A partial catalogue would truncate the feeds and fill the deltas
+                self.emitter.abort()
+        finally:
+            self.finish()
+
+        if not self.discovery_result["complete"]:
+            logger.error(f"❌ Discovery failed; kept the previous feeds ({self.emitter.count} products were "
+                         f"processed, {self.stats['extracted']} extracted and saved to the product store)")
+            return None
+
+        elapsed = time.monotonic() - self.started
+        logger.info("=" * 80)
+        logger.info(f"✅ PIPELINE COMPLETE in {elapsed:.1f}s: {self.emitter.count} products in feeds "
+                    f"({self.stats['extracted']} extracted, {self.stats['changed']} new or changed, "
+                    f"{self.stats['reused']} reused, {self.stats['failed']} failed)")
+        if self.first_product_at is not None:
+            logger.info(f"⏱️ First product was ready {self.first_product_at:.1f}s into the run")
+        logger.info("=" * 80)
+        return self.emitter.count
+
+    def finish(self):
+        """Save crawl state, product store and HTTP cache, also after a failed run."""
+        crawler.product_hook = None
+        known = self.discovery_result["products"]
+        crawler.save_crawl_state()
+        if self.discovery_result["complete"] and known:
+            crawler.save_to_csv(known)
+            crawler.save_to_xml(known)
+
+        close_client()
+        if self.discovery_result["complete"]:
+            self.store.prune([url for url, _, _ in known])
+        self.store.save()
+        self.http_cache.save()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Crawl for product URLs and extract them into feeds as they are discovered."
+    )
+    parser.add_argument("--force", action="store_true",
+                        help="Purge crawler state files and do a full crawl.")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-extract every product instead of reusing stored records.")
+    parser.add_argument("--full-crawl", action="store_true",
+                        help="Run the paginated HTML crawl even when a sitemap covers the catalogue.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted crawl from its checkpoint.")
+    parser.add_argument("--concurrency", type=int, default=crawler.CRAWL_CONCURRENCY,
+                        help=f"Crawler in-flight requests (default: {crawler.CRAWL_CONCURRENCY}).")
+    parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS,
+                        help=f"Concurrent product page fetches (default: {FETCH_WORKERS}).")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS,
+                        help=f"Processes used for HTML parsing (default: {PARSE_WORKERS}).")
+    parser.add_argument("--full-snapshot", action="store_true",
+                        help="Write every product to the delta feeds, not only changed ones.")
+    args = parser.parse_args()
+
+    if args.force:
+        crawler.purge_state_files()
+
+    logger.info(f"🚀 Starting streaming pipeline{' [FORCE]' if args.force else ''}")
+    if Pipeline(args).run() is None:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
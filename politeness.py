@@ -0,0 +1,166 @@
+"""
+Per-host politeness scheduler shared by the crawler and the feed generator.
+
+Every request waits on a token bucket for its host instead of sleeping for a
+fixed random interval. The bucket's refill rate adapts to how the origin
+responds (AIMD):
+
+- fast, successful responses raise the rate additively up to MAX_RATE
+- 429/503 responses halve the rate and honour Retry-After
+- latency rising well above the host's moving average slows the rate down
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Request rate bounds per host (requests/second)
+INITIAL_RATE = float(os.getenv("POLITE_INITIAL_RATE", "1.0"))
+MIN_RATE = float(os.getenv("POLITE_MIN_RATE", "0.2"))
+MAX_RATE = float(os.getenv("POLITE_MAX_RATE", "8.0"))
+
+# Requests a host may receive back-to-back before the rate applies
+BURST = float(os.getenv("POLITE_BURST", "2"))
+
+# AIMD tuning
+RATE_INCREASE = 0.25        # added to the rate after each healthy response
+BACKOFF_FACTOR = 0.5        # rate multiplier on 429/503
+SLOWDOWN_FACTOR = 0.8       # rate multiplier on rising latency, errors and other 5xx
+LATENCY_ALPHA = 0.2         # weight of the newest sample in the latency average
+LATENCY_RISE = 2.0          # latency above average * LATENCY_RISE counts as rising
+
+THROTTLE_STATUSES = {429, 503}
+
+def parse_retry_after(value):
+    """Return the Retry-After header as seconds, or None if absent/invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class HostBucket:
+    """Token bucket with an adaptive refill rate for a single host."""
+
+    def __init__(self, rate=INITIAL_RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.latency_avg = None
+
+    def reserve(self, now):
+        """Take a token and return how long the caller must wait before using it."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def record(self, now, status_code, latency, retry_after=None):
+        """Adjust the refill rate from the outcome of a request."""
+        if status_code in THROTTLE_STATUSES:
+            self.rate = max(MIN_RATE, self.rate * BACKOFF_FACTOR)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self.blocked_until = max(self.blocked_until, now + pause)
+            self.tokens = min(self.tokens, 0.0)
+            return "backoff"
+
+        rising = (
+            latency is not None
+            and self.latency_avg is not None
+            and latency > self.latency_avg * LATENCY_RISE
+        )
+        if latency is not None:
+            if self.latency_avg is None:
+                self.latency_avg = latency
+            else:
+                self.latency_avg += LATENCY_ALPHA * (latency - self.latency_avg)
+
+        if status_code is None or status_code >= 500 or rising:
+            self.rate = max(MIN_RATE, self.rate * SLOWDOWN_FACTOR)
+            return "slowdown"
+
+        self.rate = min(MAX_RATE, self.rate + RATE_INCREASE)
+        return "speedup"
+
+class PolitenessScheduler:
+    """
+    Thread-safe registry of per-host buckets.
+    Call wait()/wait_async() before a request and record() after it.
+    """
+
+    def __init__(self, initial_rate=INITIAL_RATE, burst=BURST):
+        self.initial_rate = initial_rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, url):
+        host = urlparse(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = HostBucket(self.initial_rate, self.burst)
+        return bucket
+
+    def reserve(self, url):
+        """Reserve a request slot for the URL's host; returns the delay in seconds."""
+        with self._lock:
+            return self._bucket(url).reserve(time.monotonic())
+
+    def wait(self, url):
+        """Block until the URL's host may receive another request."""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def wait_async(self, url):
+        """Asyncio variant of wait()."""
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def record(self, url, status_code, latency, retry_after=None):
+        """
+        Feed a request outcome back into the host's bucket.
+        Pass status_code=None for requests that failed without a response.
+        """
+        with self._lock:
+            bucket = self._bucket(url)
+            outcome = bucket.record(time.monotonic(), status_code, latency, retry_after)
+            rate = bucket.rate
+        if outcome == "backoff":
+            logger.warning(f"🐢 {urlparse(url).netloc} answered {status_code}; backing off to {rate:.2f} req/s")
+        elif outcome == "slowdown":
+            logger.debug(f"{urlparse(url).netloc} slowing down to {rate:.2f} req/s")
+        return rate
+
+    def record_response(self, url, response):
+        """record() using a requests.Response for status, latency and Retry-After."""
+        return self.record(
+            url,
+            response.status_code,
+            response.elapsed.total_seconds(),
+            parse_retry_after(response.headers.get("Retry-After"))
+        )
+
+    def current_rate(self, url):
+        with self._lock:
+            return self._bucket(url).rate
+
+# Shared scheduler: every fetch in the process goes through this instance
+scheduler = PolitenessScheduler()
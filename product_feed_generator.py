@@ -1,16 +1,24 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
 import csv
-import xml.etree.ElementTree as ET
 from urllib.parse import urlparse
 from datetime import datetime
 import os
 import logging
 import re
-import random
 import json
+import multiprocessing
+import queue
 import sys
-import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from lxml import etree
+from feed_writers import CsvFeedWriter, DeltaFeedWriter, FeedEmitter, XmlFeedWriter, sub_element
+from http_cache import HttpCache, body_hash, conditional_headers
+from http_client import build_headers, close_client, fetch
+from keyword_automaton import KeywordAutomaton
+from meta_feed_generator import META_CSV_OUTPUT, META_DELTA_CSV_OUTPUT, META_XML_OUTPUT, add_meta_sinks
+from product_parsers import PARSER_BACKEND, extract_page_fields
+from product_store import ProductStore
 
 # Set up logging
 logging.basicConfig(
@@ -26,6 +34,41 @@ INPUT_CSV = "product_urls/product_links.csv"
 CSV_OUTPUT = "google_feed/product_feed.csv"
 XML_OUTPUT = "google_feed/product_feed.xml"
 GOOGLE_MERCHANT_CSV = "google_feed/google_merchant_feed.csv"
+# Products whose price, availability, title or images changed since the
+# previous GOOGLE_MERCHANT_CSV, for a Merchant Center supplemental feed
+GOOGLE_MERCHANT_DELTA_CSV = "google_feed/google_merchant_feed_delta.csv"
+
+# "delta" writes only changed products to the delta feeds; "full" writes a
+# full snapshot to them (e.g. to reset the supplemental feeds)
+FEED_DELTA_MODE = os.getenv("FEED_DELTA_MODE", "delta")
+
+# Columns of product_feed.csv and google_merchant_feed.csv
+CSV_FIELDS = ["id", "title", "description", "link", "image_link", "additional_image_link",
+              "availability", "price", "brand", "condition", "category"]
+GOOGLE_MERCHANT_FIELDS = [
+    "id", "title", "description", "link", "image_link", "additional_image_link",
+    "availability", "price", "brand", "condition", "google_product_category", 
+    "mpn", "gtin"
+]
+
+# Extraction pools: concurrent page fetches (I/O) and HTML parsing processes (CPU)
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+# URLs between submission and result; bounds queued fetches and the
+# fetched pages waiting for a parse worker (0: four per worker)
+MAX_IN_FLIGHT = int(os.getenv("EXTRACT_MAX_IN_FLIGHT", "0"))
+# Parse workers are not forked from this process: in the pipeline the
+# discovery and fetch threads are already running (and may hold locks) when
+# the first worker starts. A forkserver starts them from a clean process.
+PARSE_START_METHOD = os.getenv(
+    "PARSE_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# Checkpoint of an in-progress run, removed once the feeds are written
+FEED_CHECKPOINT_FILE = os.getenv("FEED_CHECKPOINT_FILE", "feed_checkpoint.json")
+
+# Extracted products between saves of the product store and HTTP cache
+CHECKPOINT_EVERY = int(os.getenv("FEED_CHECKPOINT_EVERY", "25"))
 
 # Manual override file - this will preserve your exact assignments
 MANUAL_OVERRIDES_FILE = "manual_category_overrides.json"
@@ -559,18 +602,21 @@ CATEGORY_MAPPING = {
 # Default Google category
 DEFAULT_GOOGLE_CATEGORY = "602"
 
-# User-Agent rotation for avoiding bot detection
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.1 Safari/605.1.15",
-    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0",
-    "Mozilla/5.0 (iPad; CPU OS 15_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/98.0.4758.85 Mobile/15E148 Safari/604.1"
+# Title patterns checked before any other mapping (those with a CATEGORY_MAPPING entry apply)
+SPECIFIC_TITLE_PATTERNS = [
+    "David Bust Black Side Table",
+    "David Bust White Side Table", 
+    "Abracadabra Coffee Cups Set",
+    "Fancy Tea Cup Set with Saucer",
+    "Good Morning Mug",
+    "Cozy Cappuccino Mug Set",
+    "Set of 6 Colored Goblets",
+    "Che Bello Dessert Plate",
+    "Pearl Parade Bowl"
 ]
 
-def get_random_user_agent():
-    return random.choice(USER_AGENTS)
+# Keywords too generic to decide a category from a title
+GENERIC_TITLE_WORDS = ['table', 'black', 'white', 'side', 'set', 'large', 'small', 'medium']
 
 def load_manual_overrides():
     """
@@ -610,293 +656,262 @@ def save_manual_overrides_template():
         except Exception as e:
             logging.error(f"Error creating manual overrides template: {e}")
 
+class CategoryMatcher:
+    """
+    CATEGORY_MAPPING compiled once for map_to_google_category.
+
+    Keywords are lowercased up front into two Aho-Corasick automata, one for
+    category names and one for titles, so every tier is resolved from a
+    single scan of each string. Within a tier the winner is the same as the
+    original linear passes: the first specific pattern in list order, or the
+    first keyword in CATEGORY_MAPPING order, regardless of where it occurs.
+    """
+
+    def __init__(self, mapping, specific_patterns, generic_words, default):
+        self.mapping = mapping
+        self.default = default
+        self.keywords = list(mapping)
+        # Only patterns with a mapping entry can decide a category
+        self.patterns = [pattern for pattern in specific_patterns if pattern in mapping]
+        generic_words = {word.lower() for word in generic_words}
+
+        self.category_automaton = KeywordAutomaton(
+            (keyword.lower(), index) for index, keyword in enumerate(self.keywords) if len(keyword) > 2
+        )
+        # Title ranks: (0, i) specific patterns before (1, i) title keywords
+        title_entries = [(pattern.lower(), (0, index)) for index, pattern in enumerate(self.patterns)]
+        title_entries.extend(
+            (keyword.lower(), (1, index)) for index, keyword in enumerate(self.keywords)
+            if len(keyword) > 3 and keyword.lower() not in generic_words
+        )
+        self.title_automaton = KeywordAutomaton(title_entries)
+
+    def match(self, product_id, category_name, title, brand, manual_overrides):
+        """
+        Resolve the category tier cascade for a product.
+
+        Returns:
+            (google_id, tier, matched): tier is one of "manual", "pattern",
+            "category", "category_keyword", "title_keyword", "brand" or
+            "default", and matched the override, pattern or keyword that decided it.
+        """
+        if product_id in manual_overrides:
+            return manual_overrides[product_id], "manual", product_id
+
+        title_hit = self.title_automaton.first(title.lower())
+        if title_hit is not None and title_hit[0] == 0:
+            pattern = self.patterns[title_hit[1]]
+            return self.mapping[pattern], "pattern", pattern
+
+        if category_name in self.mapping:
+            return self.mapping[category_name], "category", category_name
+
+        category_hit = self.category_automaton.first(category_name.lower())
+        if category_hit is not None:
+            keyword = self.keywords[category_hit]
+            return self.mapping[keyword], "category_keyword", keyword
+
+        if title_hit is not None:
+            keyword = self.keywords[title_hit[1]]
+            return self.mapping[keyword], "title_keyword", keyword
+
+        if brand in self.mapping:
+            return self.mapping[brand], "brand", brand
+
+        return self.default, "default", None
+
+CATEGORY_MATCHER = CategoryMatcher(CATEGORY_MAPPING, SPECIFIC_TITLE_PATTERNS, GENERIC_TITLE_WORDS,
+                                   DEFAULT_GOOGLE_CATEGORY)
+
+# Debug log line per tier, formatted with the matched value and the product
+MATCH_LOG_MESSAGES = {
+    "manual": "🎯 MANUAL OVERRIDE: '{matched}' -> {google_id}",
+    "pattern": "📝 Specific pattern match: '{matched}' -> {google_id}",
+    "category": "📂 Category match: '{matched}' -> {google_id}",
+    "category_keyword": "🔍 Category keyword match: '{matched}' in '{category_name}' -> {google_id}",
+    "title_keyword": "📄 Title keyword match: '{matched}' in '{title}' -> {google_id}",
+    "brand": "🏷️ Brand match: '{matched}' -> {google_id}",
+    "default": "⚡ Default category for: '{title}' ({brand}) -> {google_id}",
+}
+
 def map_to_google_category(product_id, category_name, title, brand, manual_overrides):
     """
     Map to Google category with manual overrides taking highest priority
     """
-    # HIGHEST PRIORITY: Check manual overrides first
-    if product_id in manual_overrides:
-        category_id = manual_overrides[product_id]
-        logging.info(f"🎯 MANUAL OVERRIDE: '{product_id}' -> {category_id}")
-        return category_id
-    
-    # SECOND PRIORITY: Specific product name patterns
-    title_lower = title.lower()
-    specific_patterns = [
-        "David Bust Black Side Table",
-        "David Bust White Side Table", 
-        "Abracadabra Coffee Cups Set",
-        "Fancy Tea Cup Set with Saucer",
-        "Good Morning Mug",
-        "Cozy Cappuccino Mug Set",
-        "Set of 6 Colored Goblets",
-        "Che Bello Dessert Plate",
-        "Pearl Parade Bowl"
+    google_id, tier, matched = CATEGORY_MATCHER.match(product_id, category_name, title, brand, manual_overrides)
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(MATCH_LOG_MESSAGES[tier].format(
+            matched=matched, google_id=google_id, category_name=category_name, title=title, brand=brand
+        ))
+    return google_id
+
+def parse_product_html(html, url, manual_overrides, backend=PARSER_BACKEND):
+    """Build the product record from a product page's HTML."""
+    fields = extract_page_fields(html, backend, url)
+
+    # Extract product ID from URL
+    product_id = url.split("/")[-1]
+
+    title = fields["title"] if fields["title"] is not None else "No Title"
+    logging.info(f"Title extracted: {title}")
+
+    description = fields["description"] if fields["description"] is not None else "No Description"
+    logging.info(f"Description extracted: {len(description)} characters")
+
+    image_link = fields["image_link"]
+    logging.info(f"Primary image extracted: {image_link}")
+
+    # Create rich description
+    rich_description = description
+    if fields["editor_notes"]:
+        rich_description += f"\n\nEDITOR'S NOTE:\n{fields['editor_notes']}"
+    if fields["brand_info"]:
+        rich_description += f"\n\nABOUT THE BRAND:\n{fields['brand_info']}"
+
+    additional_images = [img for img in fields["images"] if img != image_link]
+
+    price = fields["price"] or "0.00"
+    logging.info(f"Price extracted: {price}")
+
+    brand = fields["brand"] if fields["brand"] is not None else "Joy & Co"
+    logging.info(f"Brand extracted: {brand}")
+
+    breadcrumbs = fields["breadcrumbs"]
+    category = " > ".join(breadcrumbs) if breadcrumbs else "Uncategorized"
+
+    # Map to Google category
+    google_product_category = map_to_google_category(product_id, category, title, brand, manual_overrides)
+    logging.info(f"Final Google category assignment: {google_product_category} for '{title}'")
+
+    stock_status = "out of stock" if fields["out_of_stock"] else "in stock"
+
+    # Low inventory check
+    last_items_text = fields["price_note"]
+    if last_items_text:
+        if "last" in last_items_text.lower() and "left" in last_items_text.lower():
+            num_match = re.search(r'(\d+)', last_items_text)
+            if num_match and int(num_match.group(1)) <= 3:
+                stock_status = "limited availability"
+
+    # Variants
+    variants = [
+        {"name": variant_name, "value": variant_value}
+        for variant_name, variant_value in fields["variant_options"]
+        if variant_name and variant_value
     ]
+
+    # MPN
+    mpn = product_id
+    if fields["code_info"] is not None:
+        code_match = re.search(r'Product code - (\w+)', fields["code_info"])
+        if code_match:
+            mpn = code_match.group(1)
+
+    product_data = {
+        "id": product_id,
+        "title": title,
+        "description": description,
+        "rich_description": rich_description,
+        "link": url,
+        "image_link": image_link,
+        "additional_image_link": additional_images[0] if additional_images else "",
+        "additional_images": additional_images,
+        "availability": stock_status,
+        "price": f"{price} AED",
+        "brand": brand,
+        "condition": "new",
+        "category": category,
+        "google_product_category": google_product_category,
+        "mpn": mpn,
+        "gtin": "",
+        "variants": json.dumps(variants) if variants else ""
+    }
+    return product_data
+
+def reuse_cached_product(record, manual_overrides):
+    """
+    Return a previously extracted record, re-mapping its Google category so
+    edits to the overrides or CATEGORY_MAPPING still apply.
+    """
+    product_data = dict(record)
+    product_data["google_product_category"] = map_to_google_category(
+        product_data["id"], product_data["category"], product_data["title"], product_data["brand"], manual_overrides
+    )
+    return product_data
+
+def fetch_product_page(url, cached=None):
+    """
+    Fetch a product page, sending the validators of a cached entry.
+    Returns the response for 200 (or 304 when cached), None otherwise.
+    """
+    headers = build_headers({
+        "Referer": "https://joyandco.com/",
+        "DNT": "1"
+    })
     
-    for pattern in specific_patterns:
-        if pattern.lower() in title_lower:
-            if pattern in CATEGORY_MAPPING:
-                logging.info(f"📝 Specific pattern match: '{pattern}' -> {CATEGORY_MAPPING[pattern]}")
-                return CATEGORY_MAPPING[pattern]
+    # Conditional GET: send validators from the previous run
+    headers.update(conditional_headers(cached))
     
-    # THIRD PRIORITY: Category name matching
-    if category_name in CATEGORY_MAPPING:
-        logging.info(f"📂 Category match: '{category_name}' -> {CATEGORY_MAPPING[category_name]}")
-        return CATEGORY_MAPPING[category_name]
-        
-    # FOURTH PRIORITY: Category keyword matching
-    for keyword, google_id in CATEGORY_MAPPING.items():
-        if len(keyword) > 2 and keyword.lower() in category_name.lower():
-            logging.info(f"🔍 Category keyword match: '{keyword}' in '{category_name}' -> {google_id}")
-            return google_id
+    # Pooled keep-alive request, paced by the politeness scheduler
+    response = fetch(url, headers=headers, timeout=15)
     
-    # FIFTH PRIORITY: Title keyword matching (filtered)
-    for keyword, google_id in CATEGORY_MAPPING.items():
-        if len(keyword) > 3 and keyword.lower() in title_lower:
-            generic_words = ['table', 'black', 'white', 'side', 'set', 'large', 'small', 'medium']
-            if keyword.lower() not in generic_words:
-                logging.info(f"📄 Title keyword match: '{keyword}' in '{title}' -> {google_id}")
-                return google_id
-            
-    # SIXTH PRIORITY: Brand matching
-    if brand in CATEGORY_MAPPING:
-        logging.info(f"🏷️ Brand match: '{brand}' -> {CATEGORY_MAPPING[brand]}")
-        return CATEGORY_MAPPING[brand]
+    if response.status_code == 304 and cached:
+        return response
+    if response.status_code == 404:
+        logging.error(f"Product not found (404): {url}")
+        return None
+    elif response.status_code == 403:
+        logging.error(f"Access forbidden (403): {url}")
+        return None
+    elif response.status_code != 200:
+        logging.error(f"HTTP error {response.status_code}: {url}")
+        return None
+    return response
+
+def resolve_cached_product(url, response, http_cache):
+    """
+    Return the cached record when the response shows the page is unchanged
+    (304, or a 200 with the same body hash), else None.
+    """
+    cached = http_cache.get(url) if http_cache else None
+    if not cached:
+        return None
     
-    # DEFAULT FALLBACK
-    logging.info(f"⚡ Default category for: '{title}' ({brand}) -> {DEFAULT_GOOGLE_CATEGORY}")
-    return DEFAULT_GOOGLE_CATEGORY
+    if response.status_code == 304:
+        logging.info(f"♻️ Not modified (304), reusing cached record: {url}")
+        http_cache.touch(url)
+        http_cache.stats["not_modified"] += 1
+        return cached["record"]
+    
+    digest = body_hash(response.content)
+    if cached.get("body_hash") == digest:
+        logging.info(f"♻️ Page body unchanged, reusing cached record: {url}")
+        http_cache.store(url, response, digest, cached["record"])
+        http_cache.stats["unchanged_body"] += 1
+        return cached["record"]
+    return None
+
+def remember_product(url, response, product_data, http_cache):
+    """Cache a freshly parsed record with the response's validators."""
+    if http_cache:
+        http_cache.store(url, response, body_hash(response.content), product_data)
+        http_cache.stats["parsed"] += 1
 
-def extract_product_data(url, manual_overrides):
+def extract_product_data(url, manual_overrides, http_cache=None):
     try:
         logging.info(f"Extracting data from: {url}")
         
-        time.sleep(random.uniform(1, 2))
-        
-        headers = {
-            "User-Agent": get_random_user_agent(),
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Accept-Language": "en-US,en;q=0.5",
-            "Referer": "https://joyandco.com/",
-            "DNT": "1"
-        }
-        
-        response = requests.get(url, headers=headers, timeout=15)
-        
-        if response.status_code == 404:
-            logging.error(f"Product not found (404): {url}")
-            return None
-        elif response.status_code == 403:
-            logging.error(f"Access forbidden (403): {url}")
+        cached = http_cache.get(url) if http_cache else None
+        response = fetch_product_page(url, cached)
+        if response is None:
             return None
-        elif response.status_code != 200:
-            logging.error(f"HTTP error {response.status_code}: {url}")
-            return None
-            
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Extract product ID from URL
-        product_id = url.split("/")[-1]
-        
-        # Get title - Enhanced selectors
-        title_selectors = [
-            ".col-md-6 h2",
-            "h1",
-            ".product-title",
-            ".product-name",
-            "h2.product-title",
-            ".page-title"
-        ]
-        
-        title = "No Title"
-        for selector in title_selectors:
-            title_tag = soup.select_one(selector)
-            if title_tag:
-                title = title_tag.get_text(strip=True)
-                break
-                
-        logging.info(f"Title extracted: {title}")
-        
-        # Get description - Enhanced extraction
-        description_selectors = [
-            "#description .text-body",
-            ".product-description",
-            ".description",
-            ".product-content"
-        ]
-        
-        description = "No Description"
-        for selector in description_selectors:
-            description_div = soup.select_one(selector)
-            if description_div:
-                description = description_div.get_text(strip=True)
-                break
-                
-        logging.info(f"Description extracted: {len(description)} characters")
-        
-        # Get image - Enhanced image extraction
-        image_selectors = [
-            ".cz-preview-item.active img.cz-image-zoom",
-            ".cz-preview-item img.cz-image-zoom",
-            ".product-image img",
-            ".main-image img",
-            "img.product-photo"
-        ]
-        
-        image_link = ""
-        for selector in image_selectors:
-            img_element = soup.select_one(selector)
-            if img_element and 'src' in img_element.attrs:
-                image_link = img_element['src']
-                break
-        
-        logging.info(f"Primary image extracted: {image_link}")
-        
-        # Get editor notes and brand info
-        editor_notes_div = soup.select_one("#editor_notes .text-body")
-        brand_info_div = soup.select_one("#about_the_brand .text-body")
-        
-        editor_notes = editor_notes_div.get_text(strip=True) if editor_notes_div else ""
-        brand_info = brand_info_div.get_text(strip=True) if brand_info_div else ""
-        
-        # Create rich description
-        rich_description = description
-        if editor_notes:
-            rich_description += f"\n\nEDITOR'S NOTE:\n{editor_notes}"
-        if brand_info:
-            rich_description += f"\n\nABOUT THE BRAND:\n{brand_info}"
-        
-        # Get all images
-        image_elements = soup.select(".cz-preview-item img.cz-image-zoom")
-        all_images = []
-        for img in image_elements:
-            if 'src' in img.attrs and img['src'] not in all_images:
-                all_images.append(img['src'])
         
-        additional_images = [img for img in all_images if img != image_link]
+        record = resolve_cached_product(url, response, http_cache)
+        if record:
+            return reuse_cached_product(record, manual_overrides)
         
-        # Get price - Enhanced price extraction
-        price_selectors = [
-            ".price",
-            ".product-price",
-            ".price-current",
-            ".current-price"
-        ]
-        
-        price = "0.00"
-        for selector in price_selectors:
-            price_div = soup.select_one(selector)
-            if price_div:
-                price_text = price_div.get_text(strip=True)
-                price_match = re.search(r'(\d+(?:\.\d+)?)', price_text)
-                if price_match:
-                    price = price_match.group(1)
-                    if '.' not in price:
-                        price = f"{price}.00"
-                    elif len(price.split('.')[1]) == 1:
-                        price = f"{price}0"
-                    break
-                    
-        logging.info(f"Price extracted: {price}")
-        
-        # Get brand - Enhanced brand extraction
-        brand_selectors = [
-            "p.pic-info",
-            ".brand-name",
-            ".product-brand",
-            ".brand"
-        ]
-        
-        brand = "Joy & Co"
-        for selector in brand_selectors:
-            brand_tag = soup.select_one(selector)
-            if brand_tag:
-                brand = brand_tag.get_text(strip=True)
-                break
-                
-        logging.info(f"Brand extracted: {brand}")
-        
-        # Get category - Enhanced breadcrumb extraction
-        breadcrumbs = []
-        breadcrumb_selectors = [
-            ".breadcrumbs a",
-            ".breadcrumb a",
-            ".navigation a"
-        ]
-        
-        for selector in breadcrumb_selectors:
-            breadcrumb_elements = soup.select(selector)
-            if breadcrumb_elements:
-                for crumb in breadcrumb_elements[1:-1]:  # Skip home and current page
-                    breadcrumbs.append(crumb.get_text(strip=True))
-                break
-        
-        category = " > ".join(breadcrumbs) if breadcrumbs else "Uncategorized"
-        
-        # Map to Google category
-        google_product_category = map_to_google_category(product_id, category, title, brand, manual_overrides)
-        logging.info(f"Final Google category assignment: {google_product_category} for '{title}'")
-        
-        # Stock status - Enhanced availability detection
-        stock_status = "in stock"
-        out_of_stock_selectors = [
-            ".out-of-stock-label",
-            ".sold-out",
-            ".unavailable"
-        ]
-        
-        for selector in out_of_stock_selectors:
-            if soup.select_one(selector):
-                stock_status = "out of stock"
-                break
-        
-        # Low inventory check
-        price_span = price_div.select_one("span.d-block") if 'price_div' in locals() and price_div else None
-        if price_span:
-            last_items_text = price_span.get_text(strip=True)
-            if "last" in last_items_text.lower() and "left" in last_items_text.lower():
-                num_match = re.search(r'(\d+)', last_items_text)
-                if num_match and int(num_match.group(1)) <= 3:
-                    stock_status = "limited availability"
-            
-        # Variants
-        variants = []
-        variant_elements = soup.select(".quantity-cart select option")
-        if variant_elements:
-            for variant_el in variant_elements[1:]:
-                variant_name = variant_el.get_text(strip=True)
-                variant_value = variant_el.get('value', '')
-                if variant_name and variant_value:
-                    variants.append({"name": variant_name, "value": variant_value})
-
-        # MPN
-        mpn = product_id
-        code_info = soup.select_one(".code-info")
-        if code_info:
-            code_match = re.search(r'Product code - (\w+)', code_info.get_text(strip=True))
-            if code_match:
-                mpn = code_match.group(1)
-
-        product_data = {
-            "id": product_id,
-            "title": title,
-            "description": description,
-            "rich_description": rich_description,
-            "link": url,
-            "image_link": image_link,
-            "additional_image_link": additional_images[0] if additional_images else "",
-            "additional_images": additional_images,
-            "availability": stock_status,
-            "price": f"{price} AED",
-            "brand": brand,
-            "condition": "new",
-            "category": category,
-            "google_product_category": google_product_category,
-            "mpn": mpn,
-            "gtin": "",
-            "variants": json.dumps(variants) if variants else ""
-        }
+        product_data = parse_product_html(response.text, url, manual_overrides)
+        remember_product(url, response, product_data, http_cache)
         
         logging.info(f"✅ Successfully extracted data for product: {product_data['id']}")
         return product_data
@@ -905,133 +920,242 @@ def extract_product_data(url, manual_overrides):
         logging.error(f"Failed to extract data from {url}: {e}")
         return None
 
-def generate_csv(products):
-    try:
-        logging.info(f"Generating CSV at {CSV_OUTPUT} with {len(products)} products")
-        
-        csv_fields = ["id", "title", "description", "link", "image_link", "additional_image_link",
-                      "availability", "price", "brand", "condition", "category"]
-        
-        string_products = []
-        for product in products:
-            string_product = {}
-            for field in csv_fields:
-                value = product.get(field, "")
-                string_product[field] = str(value) if value is not None else ""
-            string_products.append(string_product)
-        
-        with open(CSV_OUTPUT, mode='w', newline='', encoding='utf-8') as file:
-            if not products:
-                logging.warning("No products to write to CSV")
-                return False
-                
-            writer = csv.DictWriter(file, fieldnames=csv_fields)
-            writer.writeheader()
-            for product in string_products:
-                writer.writerow(product)
-        
-        if os.path.exists(CSV_OUTPUT):
-            file_size = os.path.getsize(CSV_OUTPUT)
-            logging.info(f"CSV file successfully created at {CSV_OUTPUT}, size: {file_size} bytes")
-            return True
-        else:
-            logging.error(f"CSV file was not created at {CSV_OUTPUT}")
-            return False
-            
-    except Exception as e:
-        logging.error(f"Error generating CSV file: {e}")
-        return False
-
-def generate_google_merchant_feed(products):
-    try:
-        logging.info(f"Generating Google Merchant feed at {GOOGLE_MERCHANT_CSV} with {len(products)} products")
-        
-        google_fields = [
-            "id", "title", "description", "link", "image_link", "additional_image_link",
-            "availability", "price", "brand", "condition", "google_product_category", 
-            "mpn", "gtin"
-        ]
+def stream_products(urls, manual_overrides, http_cache=None, fetch_workers=FETCH_WORKERS,
+                    parse_workers=PARSE_WORKERS, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Extract products from an iterable of URLs, yielding (url, data) as each
+    one finishes (data is None for failures).
+    Fetches (I/O bound) run on a thread pool and HTML parsing (CPU bound) on a
+    process pool, so parsing can use every core. urls may be a blocking
+    iterator (e.g. fed by the crawler while it is still discovering); it is
+    drained on a feeder thread so finished products are yielded meanwhile.
+    The feeder waits while max_in_flight URLs are unfinished, and an error
+    raised by urls is re-raised here once the submitted URLs are done.
+    """
+    if fetch_workers <= 1:
+        for url in urls:
+            yield url, extract_product_data(url, manual_overrides, http_cache)
+        return
+    
+    events = queue.Queue()
+    slots = threading.BoundedSemaphore(max_in_flight or 4 * (fetch_workers + max(1, parse_workers)))
+    stopped = threading.Event()
+    
+    def notify(stage, url, response=None):
+        return lambda future: events.put((stage, url, response, future))
+    
+    mp_context = multiprocessing.get_context(PARSE_START_METHOD)
+    if PARSE_START_METHOD == "forkserver":
+        # Workers fork from a server that has imported the parser once
+        mp_context.set_forkserver_preload(["product_feed_generator"])
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=max(1, parse_workers), mp_context=mp_context) as parse_pool:
         
-        google_products = []
-        for product in products:
-            google_product = {}
-            for field in google_fields:
-                value = product.get(field, "")
-                google_product[field] = str(value) if value is not None else ""
-            google_products.append(google_product)
+        def feed():
+            submitted = 0
+            try:
+                for url in urls:
+                    # Polled so the feeder ends if the consumer stops early
+                    while not slots.acquire(timeout=1):
+                        if stopped.is_set():
+                            return
+                    logging.info(f"Extracting data from: {url}")
+                    cached = http_cache.get(url) if http_cache else None
+                    fetch_pool.submit(fetch_product_page, url, cached).add_done_callback(notify("fetch", url))
+                    submitted += 1
+            except Exception as e:
+                events.put(("error", e, None, None))
+            finally:
+                events.put(("fed", submitted, None, None))
         
-        with open(GOOGLE_MERCHANT_CSV, mode='w', newline='', encoding='utf-8') as file:
-            if not products:
-                logging.warning("No products to write to Google Merchant feed")
-                return False
-                
-            writer = csv.DictWriter(file, fieldnames=google_fields)
-            writer.writeheader()
-            for product in google_products:
-                writer.writerow(product)
+        threading.Thread(target=feed, name="extract-feeder", daemon=True).start()
         
-        if os.path.exists(GOOGLE_MERCHANT_CSV):
-            file_size = os.path.getsize(GOOGLE_MERCHANT_CSV)
-            logging.info(f"Google Merchant feed successfully created at {GOOGLE_MERCHANT_CSV}, size: {file_size} bytes")
-            return True
-        else:
-            logging.error(f"Google Merchant feed was not created at {GOOGLE_MERCHANT_CSV}")
-            return False
-            
-    except Exception as e:
-        logging.error(f"Error generating Google Merchant feed: {e}")
-        return False
-
-def generate_xml(products):
-    try:
-        logging.info(f"Generating XML at {XML_OUTPUT} with {len(products)} products")
-        
-        root = ET.Element("products")
-        for p in products:
-            product = ET.SubElement(root, "product")
-            
-            for k, v in p.items():
-                if k in ["additional_images", "variants"]:
+        outstanding = 0
+        fed = None
+        feed_error = None
+        try:
+            while fed is None or outstanding:
+                stage, url, response, future = events.get()
+                if stage == "error":
+                    feed_error = url
+                    continue
+                if stage == "fed":
+                    fed = url
+                    outstanding += fed
                     continue
-                    
-                el = ET.SubElement(product, k)
-                el.text = str(v) if v is not None else ""
-            
-            if p.get("additional_images"):
-                images_el = ET.SubElement(product, "additional_images")
-                for img_url in p["additional_images"]:
-                    img_el = ET.SubElement(images_el, "image")
-                    img_el.text = img_url
-            
-            if p.get("variants") and p["variants"]:
                 try:
-                    variants_data = json.loads(p["variants"])
-                    if variants_data:
-                        variants_el = ET.SubElement(product, "variants")
-                        for variant in variants_data:
-                            variant_el = ET.SubElement(variants_el, "variant")
-                            for k, v in variant.items():
-                                var_attr = ET.SubElement(variant_el, k)
-                                var_attr.text = str(v)
+                    if stage == "fetch":
+                        response = future.result()
+                        if response is None:
+                            product_data = None
+                        else:
+                            record = resolve_cached_product(url, response, http_cache)
+                            if not record:
+                                parse_pool.submit(parse_product_html, response.text, url, manual_overrides) \
+                                    .add_done_callback(notify("parse", url, response))
+                                continue
+                            product_data = reuse_cached_product(record, manual_overrides)
+                    else:
+                        product_data = future.result()
+                        remember_product(url, response, product_data, http_cache)
+                        logging.info(f"✅ Successfully extracted data for product: {product_data['id']}")
                 except Exception as e:
-                    logging.error(f"Error processing variants for product {p.get('id')}: {e}")
-        
-        tree = ET.ElementTree(root)
-        tree.write(XML_OUTPUT, encoding='utf-8', xml_declaration=True)
-        
-        if os.path.exists(XML_OUTPUT):
-            file_size = os.path.getsize(XML_OUTPUT)
-            logging.info(f"XML file successfully created at {XML_OUTPUT}, size: {file_size} bytes")
-            return True
-        else:
-            logging.error(f"XML file was not created at {XML_OUTPUT}")
-            return False
-            
+                    logging.error(f"Failed to extract data from {url}: {e}")
+                    product_data = None
+                outstanding -= 1
+                slots.release()
+                yield url, product_data
+        finally:
+            stopped.set()
+        if feed_error:
+            raise feed_error
+
+def extract_products(urls, manual_overrides, http_cache=None, fetch_workers=FETCH_WORKERS,
+                     parse_workers=PARSE_WORKERS, on_result=None):
+    """
+    Extract a list of products through stream_products(). Returns records
+    aligned with urls (None for failures); on_result(index, url, data) is
+    called in the main thread as each product finishes. A URL listed more
+    than once is extracted once: its record fills every position and
+    on_result gets the first.
+    """
+    results = [None] * len(urls)
+    positions = {}
+    for i, url in enumerate(urls):
+        positions.setdefault(url, []).append(i)
+    for url, data in stream_products(list(positions), manual_overrides, http_cache, fetch_workers, parse_workers):
+        for i in positions[url]:
+            results[i] = data
+        if on_result:
+            on_result(positions[url][0], url, data)
+    return results
+
+def product_xml_element(p):
+    """A product record as a <product> element."""
+    product = etree.Element("product")
+    for k, v in p.items():
+        if k in ["additional_images", "variants"]:
+            continue
+        sub_element(product, k, v)
+
+    if p.get("additional_images"):
+        images_el = etree.SubElement(product, "additional_images")
+        for img_url in p["additional_images"]:
+            sub_element(images_el, "image", img_url)
+
+    if p.get("variants") and p["variants"]:
+        try:
+            variants_data = json.loads(p["variants"])
+            if variants_data:
+                variants_el = etree.SubElement(product, "variants")
+                for variant in variants_data:
+                    variant_el = etree.SubElement(variants_el, "variant")
+                    for k, v in variant.items():
+                        sub_element(variant_el, k, v)
+        except Exception as e:
+            logging.error(f"Error processing variants for product {p.get('id')}: {e}")
+    return product
+
+def open_feed_emitter(sort_xml=False, meta=True, full_snapshot=None):
+    """
+    A FeedEmitter writing every feed in one pass over the products: the
+    product CSV and XML, the Google Merchant CSV and its delta and (with
+    meta) the Meta CSV, delta and RSS feeds. sort_xml orders the XML feeds
+    by link, for callers whose product order varies between runs (CSV feeds
+    are always sorted). full_snapshot writes every product to the delta
+    feeds; it defaults to FEED_DELTA_MODE == "full".
+    """
+    if full_snapshot is None:
+        full_snapshot = FEED_DELTA_MODE == "full"
+    emitter = FeedEmitter()
+    emitter.add_sink("Product CSV", CsvFeedWriter(CSV_OUTPUT, CSV_FIELDS))
+    emitter.add_sink("Product XML", XmlFeedWriter(
+        XML_OUTPUT, "products", sort_key=(lambda product: product.findtext("link") or "") if sort_xml else None
+    ), to_record=product_xml_element)
+    emitter.add_sink("Google Merchant delta CSV", DeltaFeedWriter(
+        GOOGLE_MERCHANT_DELTA_CSV, GOOGLE_MERCHANT_FIELDS, GOOGLE_MERCHANT_CSV, full_snapshot=full_snapshot
+    ))
+    emitter.add_sink("Google Merchant CSV", CsvFeedWriter(GOOGLE_MERCHANT_CSV, GOOGLE_MERCHANT_FIELDS))
+    if meta:
+        add_meta_sinks(emitter, META_CSV_OUTPUT, META_XML_OUTPUT, sort_xml=sort_xml,
+                       delta_output=META_DELTA_CSV_OUTPUT, full_snapshot=full_snapshot)
+    return emitter
+
+def extraction_reason(url, store, full=False, refresh=(), lastmod=None, resumed_since=None):
+    """
+    Why a URL is extracted this run ("full", "refresh" or the store's reason),
+    or None when its stored record is reused.
+    """
+    if resumed_since and store.extracted_since(url, resumed_since):
+        return None
+    if full:
+        return "full"
+    if url in refresh or url.split("/")[-1] in refresh:
+        return "refresh"
+    return store.extraction_reason(url, lastmod=lastmod)
+
+def load_feed_checkpoint():
+    """Return the checkpoint of an interrupted run, or None."""
+    if not os.path.exists(FEED_CHECKPOINT_FILE):
+        return None
+    try:
+        with open(FEED_CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
     except Exception as e:
-        logging.error(f"Error generating XML file: {e}")
-        return False
+        logging.error(f"Error loading {FEED_CHECKPOINT_FILE}: {e}")
+        return None
+
+def save_feed_checkpoint(checkpoint):
+    """Write the run checkpoint atomically."""
+    tmp_path = f"{FEED_CHECKPOINT_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, FEED_CHECKPOINT_FILE)
+
+def clear_feed_checkpoint():
+    """Forget the checkpoint once a run has written its feeds."""
+    if os.path.exists(FEED_CHECKPOINT_FILE):
+        os.remove(FEED_CHECKPOINT_FILE)
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Generate product feeds, extracting only new, modified, stale or flagged products."
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-extract every product instead of reusing stored records."
+    )
+    parser.add_argument(
+        "--refresh",
+        nargs="*",
+        metavar="URL_OR_ID",
+        help="Product URLs or IDs to re-extract even if their stored record is fresh."
+    )
+    parser.add_argument(
+        "--fetch-workers",
+        type=int,
+        default=FETCH_WORKERS,
+        help=f"Concurrent page fetches; 1 extracts sequentially (default: {FETCH_WORKERS})."
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=PARSE_WORKERS,
+        help=f"Processes used for HTML parsing (default: {PARSE_WORKERS})."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run: products it already extracted are reused."
+    )
+    parser.add_argument(
+        "--full-snapshot",
+        action="store_true",
+        help="Write every product to the delta feeds, not only changed ones (same as FEED_DELTA_MODE=full)."
+    )
+    args = parser.parse_args()
+
     logging.info("🚀 Starting COMPLETE Enhanced Product Feed Generator with Manual Override System")
     logging.info("=" * 100)
     logging.info("🛡️ PROTECTION SYSTEM: ALL 242+ of your manual Google Sheet assignments are preserved!")
@@ -1055,34 +1179,106 @@ def main():
             return
             
         urls = []
+        lastmods = {}
         with open(INPUT_CSV, newline='', encoding='utf-8') as file:
             reader = csv.DictReader(file)
-            urls = [row["url"] for row in reader if row.get("url")]
+            for row in reader:
+                if row.get("url"):
+                    urls.append(row["url"])
+                    if row.get("lastmod"):
+                        lastmods[row["url"]] = row["lastmod"]
         
         logging.info(f"📄 Read {len(urls)} URLs from {INPUT_CSV}")
         logging.info(f"🛡️ Using {len(manual_overrides)} manual category overrides")
         logging.info(f"📊 Manual overrides cover 26+ different categories from your Google Sheet")
 
-        products = []
+        store = ProductStore()
+        store.prune(urls)
+
+        # A resumed run keeps the interrupted run's options and start time;
+        # products extracted since then are not extracted again
+        checkpoint = load_feed_checkpoint() if args.resume else None
+        if checkpoint:
+            logging.info(f"⏯️ Resuming run started at {checkpoint['started_at']}")
+            args.full = checkpoint.get("full", args.full)
+            args.refresh = checkpoint.get("refresh", args.refresh)
+        else:
+            if args.resume:
+                logging.info("⏯️ No interrupted run to resume, starting a new one")
+            checkpoint = {
+                "started_at": datetime.utcnow().isoformat(),
+                "full": args.full,
+                "refresh": args.refresh or [],
+            }
+            save_feed_checkpoint(checkpoint)
+        refresh = set(args.refresh or [])
+        
+        # Incremental plan: only new, stale or flagged URLs are extracted
+        to_extract = []
+        reasons = {}
+        for url in urls:
+            reason = extraction_reason(url, store, args.full, refresh, lastmods.get(url),
+                                       checkpoint["started_at"] if args.resume else None)
+            if reason:
+                to_extract.append(url)
+                reasons[reason] = reasons.get(reason, 0) + 1
+        
+        plan = ", ".join(f"{count} {reason}" for reason, count in sorted(reasons.items())) or "nothing"
+        logging.info(f"🧮 Incremental plan: extracting {len(to_extract)} URLs ({plan}), "
+                     f"reusing {len(urls) - len(to_extract)} stored products")
+
+        http_cache = HttpCache()
+        extracted = {}
         successful_extractions = 0
         failed_extractions = 0
+        changed_products = 0
         
-        for i, url in enumerate(urls, 1):
-            logging.info(f"📦 Processing product {i}/{len(urls)}: {url}")
-            data = extract_product_data(url, manual_overrides)
+        def on_result(i, url, data):
+            nonlocal successful_extractions, failed_extractions, changed_products
+            extracted[url] = data
             if data:
-                products.append(data)
+                if store.update(url, data):
+                    changed_products += 1
                 successful_extractions += 1
             else:
+                store.flag(url)
                 failed_extractions += 1
-                
+            
             # Progress update every 25 products
-            if i % 25 == 0:
-                logging.info(f"🔄 Progress: {i}/{len(urls)} processed, {successful_extractions} successful, {failed_extractions} failed")
+            processed = successful_extractions + failed_extractions
+            if processed % 25 == 0:
+                logging.info(f"🔄 Progress: {processed}/{len(to_extract)} processed, {successful_extractions} successful, {failed_extractions} failed")
+            
+            # Checkpoint so an interrupted run can be resumed with --resume
+            if processed % CHECKPOINT_EVERY == 0:
+                store.save()
+                http_cache.save()
+        
+        logging.info(f"⚙️ Extraction pools: {args.fetch_workers} fetch workers, {args.parse_workers} parse processes")
+        extract_products(to_extract, manual_overrides, http_cache,
+                         fetch_workers=args.fetch_workers, parse_workers=args.parse_workers,
+                         on_result=on_result)
+
+        close_client()
+        http_cache.save()
+        store.save()
+        logging.info(f"♻️ HTTP cache: {http_cache.stats['not_modified']} not modified, "
+                     f"{http_cache.stats['unchanged_body']} unchanged bodies, {http_cache.stats['parsed']} parsed")
+
+        # Merge fresh extractions with stored records, in crawler order
+        products = []
+        for url in urls:
+            if url in extracted:
+                if extracted[url]:
+                    products.append(extracted[url])
+            elif store.get(url):
+                products.append(reuse_cached_product(store.get(url), manual_overrides))
 
         logging.info("=" * 100)
-        logging.info(f"✅ EXTRACTION COMPLETE: Processed {len(products)} products out of {len(urls)} URLs")
-        logging.info(f"📊 Success rate: {(successful_extractions/len(urls)*100):.1f}%")
+        logging.info(f"✅ EXTRACTION COMPLETE: Extracted {successful_extractions} of {len(to_extract)} URLs "
+                     f"({changed_products} new or changed), feed has {len(products)} products out of {len(urls)} URLs")
+        if to_extract:
+            logging.info(f"📊 Success rate: {(successful_extractions/len(to_extract)*100):.1f}%")
         logging.info("=" * 100)
 
         if products:
@@ -1100,29 +1296,30 @@ def main():
             if len(products) > 5:
                 logging.info(f"   ... and {len(products) - 5} more products")
             
-            xml_success = generate_xml(products)
-            csv_success = generate_csv(products)
-            google_success = generate_google_merchant_feed(products)
+            # One pass writes every Google and Meta feed
+            try:
+                with open_feed_emitter(full_snapshot=args.full_snapshot or None) as emitter:
+                    emitter.emit_all(products)
+                feeds_success = True
+            except Exception as e:
+                logging.error(f"Error generating feeds: {e}")
+                feeds_success = False
             
-            if csv_success and xml_success and google_success:
+            if feeds_success:
+                clear_feed_checkpoint()
                 print("=" * 80)
                 print(f"✅ Successfully generated feeds for {len(products)} products.")
                 print(f"🎯 Manual overrides preserved: {override_count} products")
                 print(f"📝 Pattern matching applied: {pattern_count} products")
                 print(f"📁 Files created:")
-                print(f"   - {CSV_OUTPUT}")
-                print(f"   - {XML_OUTPUT}") 
-                print(f"   - {GOOGLE_MERCHANT_CSV}")
+                for path in [CSV_OUTPUT, XML_OUTPUT, GOOGLE_MERCHANT_CSV, GOOGLE_MERCHANT_DELTA_CSV,
+                             META_CSV_OUTPUT, META_DELTA_CSV_OUTPUT, META_XML_OUTPUT]:
+                    print(f"   - {path}")
                 print(f"🛡️ Your manual category assignments are 100% PROTECTED!")
                 print(f"🔄 Future crawls will maintain your preferred categorization")
                 print("=" * 80)
             else:
-                if not csv_success:
-                    print(f"⚠️ Failed to generate standard CSV feed.")
-                if not xml_success:
-                    print(f"⚠️ Failed to generate XML feed.")
-                if not google_success:
-                    print(f"⚠️ Failed to generate Google Merchant feed.")
+                print(f"⚠️ Failed to generate feeds; the previous feed files were kept.")
         else:
             logging.warning("No products were processed.")
             print("⚠️ No products were processed.")
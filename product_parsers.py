@@ -0,0 +1,363 @@
+"""
+Pluggable HTML extraction backends for product pages.
+
+Both backends read the same selector lists and return the same raw field
+dict, which product_feed_generator turns into a product record:
+
+- "lxml" (default): lxml.html tree with XPath expressions compiled once at
+  import from the CSS selectors below
+- "bs4": the original BeautifulSoup/html.parser implementation
+
+Set PARSER_BACKEND to choose, and PARSER_PARITY_CHECK=1 to run both on every
+page and log any field that differs. `python product_parsers.py page.html ...`
+runs the same parity check on saved pages.
+"""
+
+import logging
+import os
+import re
+import sys
+
+import lxml.html
+from lxml import etree
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "lxml")
+PARSER_PARITY_CHECK = os.getenv("PARSER_PARITY_CHECK", "0") == "1"
+
+# Get title - Enhanced selectors
+TITLE_SELECTORS = [
+    ".col-md-6 h2",
+    "h1",
+    ".product-title",
+    ".product-name",
+    "h2.product-title",
+    ".page-title"
+]
+
+# Get description - Enhanced extraction
+DESCRIPTION_SELECTORS = [
+    "#description .text-body",
+    ".product-description",
+    ".description",
+    ".product-content"
+]
+
+# Get image - Enhanced image extraction
+IMAGE_SELECTORS = [
+    ".cz-preview-item.active img.cz-image-zoom",
+    ".cz-preview-item img.cz-image-zoom",
+    ".product-image img",
+    ".main-image img",
+    "img.product-photo"
+]
+GALLERY_SELECTOR = ".cz-preview-item img.cz-image-zoom"
+
+EDITOR_NOTES_SELECTOR = "#editor_notes .text-body"
+BRAND_INFO_SELECTOR = "#about_the_brand .text-body"
+
+# Get price - Enhanced price extraction
+PRICE_SELECTORS = [
+    ".price",
+    ".product-price",
+    ".price-current",
+    ".current-price"
+]
+PRICE_NOTE_SELECTOR = "span.d-block"
+
+# Get brand - Enhanced brand extraction
+BRAND_SELECTORS = [
+    "p.pic-info",
+    ".brand-name",
+    ".product-brand",
+    ".brand"
+]
+
+# Get category - Enhanced breadcrumb extraction
+BREADCRUMB_SELECTORS = [
+    ".breadcrumbs a",
+    ".breadcrumb a",
+    ".navigation a"
+]
+
+# Stock status - Enhanced availability detection
+OUT_OF_STOCK_SELECTORS = [
+    ".out-of-stock-label",
+    ".sold-out",
+    ".unavailable"
+]
+
+VARIANT_SELECTOR = ".quantity-cart select option"
+CODE_INFO_SELECTOR = ".code-info"
+
+# Strings inside these tags are not part of BeautifulSoup's get_text()
+NON_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+
+def normalize_price(price_text):
+    """Return the first number in a price string as e.g. "120.00", or None."""
+    price_match = re.search(r'(\d+(?:\.\d+)?)', price_text)
+    if not price_match:
+        return None
+    price = price_match.group(1)
+    if '.' not in price:
+        price = f"{price}.00"
+    elif len(price.split('.')[1]) == 1:
+        price = f"{price}0"
+    return price
+
+def empty_fields():
+    """Raw fields for a page on which no selector matched."""
+    return {
+        "title": None,
+        "description": None,
+        "image_link": "",
+        "editor_notes": "",
+        "brand_info": "",
+        "images": [],
+        "price": None,
+        "price_note": None,
+        "brand": None,
+        "breadcrumbs": [],
+        "out_of_stock": False,
+        "variant_options": [],
+        "code_info": None,
+    }
+
+# ─────────────────────────── BeautifulSoup backend ───────────────────────────
+
+def extract_fields_bs4(html):
+    """Raw product fields using BeautifulSoup with html.parser."""
+    soup = BeautifulSoup(html, 'html.parser')
+    fields = empty_fields()
+
+    def first_text(selectors):
+        for selector in selectors:
+            tag = soup.select_one(selector)
+            if tag:
+                return tag.get_text(strip=True)
+        return None
+
+    fields["title"] = first_text(TITLE_SELECTORS)
+    fields["description"] = first_text(DESCRIPTION_SELECTORS)
+
+    for selector in IMAGE_SELECTORS:
+        img_element = soup.select_one(selector)
+        if img_element and 'src' in img_element.attrs:
+            fields["image_link"] = img_element['src']
+            break
+
+    editor_notes_div = soup.select_one(EDITOR_NOTES_SELECTOR)
+    brand_info_div = soup.select_one(BRAND_INFO_SELECTOR)
+    fields["editor_notes"] = editor_notes_div.get_text(strip=True) if editor_notes_div else ""
+    fields["brand_info"] = brand_info_div.get_text(strip=True) if brand_info_div else ""
+
+    for img in soup.select(GALLERY_SELECTOR):
+        if 'src' in img.attrs and img['src'] not in fields["images"]:
+            fields["images"].append(img['src'])
+
+    # The low-stock note is read from the last price element looked at
+    price_div = None
+    for selector in PRICE_SELECTORS:
+        price_div = soup.select_one(selector)
+        if price_div:
+            price = normalize_price(price_div.get_text(strip=True))
+            if price:
+                fields["price"] = price
+                break
+    price_span = price_div.select_one(PRICE_NOTE_SELECTOR) if price_div else None
+    if price_span:
+        fields["price_note"] = price_span.get_text(strip=True)
+
+    fields["brand"] = first_text(BRAND_SELECTORS)
+
+    for selector in BREADCRUMB_SELECTORS:
+        breadcrumb_elements = soup.select(selector)
+        if breadcrumb_elements:
+            fields["breadcrumbs"] = [crumb.get_text(strip=True) for crumb in breadcrumb_elements[1:-1]]
+            break
+
+    fields["out_of_stock"] = any(soup.select_one(selector) for selector in OUT_OF_STOCK_SELECTORS)
+
+    fields["variant_options"] = [
+        (variant_el.get_text(strip=True), variant_el.get('value', ''))
+        for variant_el in soup.select(VARIANT_SELECTOR)[1:]
+    ]
+
+    code_info = soup.select_one(CODE_INFO_SELECTOR)
+    if code_info:
+        fields["code_info"] = code_info.get_text(strip=True)
+
+    return fields
+
+# ─────────────────────────────── lxml backend ────────────────────────────────
+
+_COMPOUND_SELECTOR = re.compile(r'^(?P<tag>[a-zA-Z][\w-]*)?(?P<rest>(?:[.#][\w-]+)*)$')
+
+def css_to_xpath(selector, relative=False):
+    """
+    Translate the descendant-combinator CSS subset used by this module
+    (tag, .class, #id) to XPath.
+    """
+    steps = []
+    for compound in selector.split():
+        match = _COMPOUND_SELECTOR.match(compound)
+        if not match or not compound:
+            raise ValueError(f"Unsupported selector: {selector}")
+        predicates = []
+        for kind, name in re.findall(r'([.#])([\w-]+)', match.group("rest")):
+            if kind == "#":
+                predicates.append(f"@id='{name}'")
+            else:
+                predicates.append(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')")
+        steps.append((match.group("tag") or "*") + "".join(f"[{p}]" for p in predicates))
+    return (".//" if relative else "//") + "//".join(steps)
+
+def _compile(selectors, relative=False):
+    return [etree.XPath(css_to_xpath(selector, relative)) for selector in selectors]
+
+# Precompiled once at import
+_TITLE_XPATHS = _compile(TITLE_SELECTORS)
+_DESCRIPTION_XPATHS = _compile(DESCRIPTION_SELECTORS)
+_IMAGE_XPATHS = _compile(IMAGE_SELECTORS)
+_GALLERY_XPATH = etree.XPath(css_to_xpath(GALLERY_SELECTOR))
+_EDITOR_NOTES_XPATH = etree.XPath(css_to_xpath(EDITOR_NOTES_SELECTOR))
+_BRAND_INFO_XPATH = etree.XPath(css_to_xpath(BRAND_INFO_SELECTOR))
+_PRICE_XPATHS = _compile(PRICE_SELECTORS)
+_PRICE_NOTE_XPATH = etree.XPath(css_to_xpath(PRICE_NOTE_SELECTOR, relative=True))
+_BRAND_XPATHS = _compile(BRAND_SELECTORS)
+_BREADCRUMB_XPATHS = _compile(BREADCRUMB_SELECTORS)
+_OUT_OF_STOCK_XPATHS = _compile(OUT_OF_STOCK_SELECTORS)
+_VARIANT_XPATH = etree.XPath(css_to_xpath(VARIANT_SELECTOR))
+_CODE_INFO_XPATH = etree.XPath(css_to_xpath(CODE_INFO_SELECTOR))
+
+_UTF8_HTML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
+def _strings(element):
+    """Text nodes under an element in document order, like BeautifulSoup."""
+    if element.text:
+        yield element.text
+    for child in element:
+        if isinstance(child.tag, str) and child.tag not in NON_TEXT_TAGS:
+            yield from _strings(child)
+        if child.tail:
+            yield child.tail
+
+def _text(element):
+    """Equivalent of BeautifulSoup's get_text(strip=True)."""
+    return "".join(s.strip() for s in _strings(element) if s.strip())
+
+def _first(xpath, root):
+    found = xpath(root)
+    return found[0] if found else None
+
+def extract_fields_lxml(html):
+    """Raw product fields using lxml and the precompiled XPath selectors."""
+    fields = empty_fields()
+    try:
+        root = lxml.html.document_fromstring(html.encode("utf-8"), parser=_UTF8_HTML_PARSER)
+    except (etree.ParserError, ValueError):
+        return fields
+
+    def first_text(xpaths):
+        for xpath in xpaths:
+            element = _first(xpath, root)
+            if element is not None:
+                return _text(element)
+        return None
+
+    fields["title"] = first_text(_TITLE_XPATHS)
+    fields["description"] = first_text(_DESCRIPTION_XPATHS)
+
+    for xpath in _IMAGE_XPATHS:
+        img_element = _first(xpath, root)
+        if img_element is not None and 'src' in img_element.attrib:
+            fields["image_link"] = img_element.get('src')
+            break
+
+    editor_notes_div = _first(_EDITOR_NOTES_XPATH, root)
+    brand_info_div = _first(_BRAND_INFO_XPATH, root)
+    fields["editor_notes"] = _text(editor_notes_div) if editor_notes_div is not None else ""
+    fields["brand_info"] = _text(brand_info_div) if brand_info_div is not None else ""
+
+    for img in _GALLERY_XPATH(root):
+        src = img.get('src')
+        if src is not None and src not in fields["images"]:
+            fields["images"].append(src)
+
+    # The low-stock note is read from the last price element looked at
+    price_div = None
+    for xpath in _PRICE_XPATHS:
+        price_div = _first(xpath, root)
+        if price_div is not None:
+            price = normalize_price(_text(price_div))
+            if price:
+                fields["price"] = price
+                break
+    price_span = _first(_PRICE_NOTE_XPATH, price_div) if price_div is not None else None
+    if price_span is not None:
+        fields["price_note"] = _text(price_span)
+
+    fields["brand"] = first_text(_BRAND_XPATHS)
+
+    for xpath in _BREADCRUMB_XPATHS:
+        breadcrumb_elements = xpath(root)
+        if breadcrumb_elements:
+            fields["breadcrumbs"] = [_text(crumb) for crumb in breadcrumb_elements[1:-1]]
+            break
+
+    fields["out_of_stock"] = any(_first(xpath, root) is not None for xpath in _OUT_OF_STOCK_XPATHS)
+
+    fields["variant_options"] = [
+        (_text(variant_el), variant_el.get('value', ''))
+        for variant_el in _VARIANT_XPATH(root)[1:]
+    ]
+
+    code_info = _first(_CODE_INFO_XPATH, root)
+    if code_info is not None:
+        fields["code_info"] = _text(code_info)
+
+    return fields
+
+BACKENDS = {
+    "lxml": extract_fields_lxml,
+    "bs4": extract_fields_bs4,
+}
+
+def parser_parity_diff(html):
+    """Fields on which the lxml and bs4 backends disagree: {field: (lxml, bs4)}."""
+    lxml_fields = extract_fields_lxml(html)
+    bs4_fields = extract_fields_bs4(html)
+    return {
+        key: (lxml_fields[key], bs4_fields[key])
+        for key in lxml_fields
+        if lxml_fields[key] != bs4_fields[key]
+    }
+
+def extract_page_fields(html, backend=PARSER_BACKEND, url=""):
+    """Raw product fields from a product page using the chosen backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown parser backend '{backend}', expected one of {sorted(BACKENDS)}")
+    if PARSER_PARITY_CHECK:
+        diff = parser_parity_diff(html)
+        if diff:
+            logger.warning(f"⚠️ Parser parity mismatch for {url}: {diff}")
+    return BACKENDS[backend](html)
+
+def main():
+    """Check lxml/bs4 parity on saved product pages."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    mismatches = 0
+    for path in sys.argv[1:]:
+        with open(path, encoding="utf-8") as f:
+            diff = parser_parity_diff(f.read())
+        if diff:
+            mismatches += 1
+            logger.warning(f"❌ {path}: {diff}")
+        else:
+            logger.info(f"✅ {path}: backends agree")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Persistent product store for incremental feed generation.
+
+Holds the last extracted record for every product URL together with a content
+fingerprint and the extraction time. Each run only re-extracts URLs that are
+new, modified (sitemap lastmod newer than the extraction), stale (older than
+PRODUCT_MAX_AGE_HOURS) or flagged (failed last time or requested with
+--refresh); everything else is served from the store.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_STORE_FILE = os.getenv("PRODUCT_STORE_FILE", "product_store.json")
+
+# Records older than this are re-extracted even if nothing flagged them
+PRODUCT_MAX_AGE_HOURS = float(os.getenv("PRODUCT_MAX_AGE_HOURS", "72"))
+
+def product_fingerprint(product):
+    """Stable SHA-256 of a product record's content."""
+    payload = json.dumps(product, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ProductStore:
+    def __init__(self, path=PRODUCT_STORE_FILE):
+        """
+        Load the store from disk.
+
+        Args:
+            path: JSON file of {url: {product, fingerprint, extracted_at, flagged}}.
+        """
+        self.path = path
+        self.entries = {}
+        self._dirty = False
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("products", {})
+                logger.info(f"Cache HIT: Loaded {len(self.entries)} stored products from {path}")
+            except Exception as e:
+                logger.error(f"Error loading product store {path}: {e}")
+        else:
+            logger.info(f"Cache MISS: No {path} found, all products will be extracted.")
+
+    def get(self, url):
+        """Return the stored product record for a URL, or None."""
+        entry = self.entries.get(url)
+        return entry.get("product") if entry else None
+
+    def extraction_reason(self, url, max_age_hours=PRODUCT_MAX_AGE_HOURS, now=None, lastmod=None):
+        """
+        Why a URL must be extracted this run: "new", "flagged", "modified",
+        "stale", or None when the stored record can be reused.
+        lastmod is the sitemap's naive UTC ISO modification time, if any.
+        """
+        entry = self.entries.get(url)
+        if entry and entry.get("flagged"):
+            return "flagged"
+        if not entry or not entry.get("product"):
+            return "new"
+        now = now or datetime.utcnow()
+        try:
+            extracted_at = datetime.fromisoformat(entry["extracted_at"])
+        except (KeyError, TypeError, ValueError):
+            return "stale"
+        if lastmod:
+            try:
+                if datetime.fromisoformat(lastmod) > extracted_at:
+                    return "modified"
+            except ValueError:
+                pass
+        if now - extracted_at > timedelta(hours=max_age_hours):
+            return "stale"
+        return None
+
+    def extracted_since(self, url, since):
+        """True if the URL was successfully extracted at or after `since` (ISO string)."""
+        entry = self.entries.get(url)
+        if not entry or entry.get("flagged") or not entry.get("product"):
+            return False
+        return entry.get("extracted_at", "") >= since
+
+    def update(self, url, product):
+        """Store a freshly extracted record. Returns True if its content changed."""
+        fingerprint = product_fingerprint(product)
+        previous = self.entries.get(url, {})
+        self.entries[url] = {
+            "product": product,
+            "fingerprint": fingerprint,
+            "extracted_at": datetime.utcnow().isoformat(),
+            "flagged": False,
+        }
+        self._dirty = True
+        return previous.get("fingerprint") != fingerprint
+
+    def flag(self, url):
+        """Mark a URL for re-extraction on the next run."""
+        entry = self.entries.setdefault(url, {"product": None, "fingerprint": "", "extracted_at": ""})
+        entry["flagged"] = True
+        self._dirty = True
+
+    def prune(self, urls):
+        """Drop products whose URLs are no longer in the crawl output."""
+        keep = set(urls)
+        removed = [url for url in self.entries if url not in keep]
+        for url in removed:
+            del self.entries[url]
+        if removed:
+            self._dirty = True
+            logger.info(f"🧹 Pruned {len(removed)} products no longer listed by the crawler")
+        return len(removed)
+
+    def save(self):
+        """Write the store atomically if anything changed."""
+        if not self._dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"products": self.entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            logger.info(f"✅ Saved {len(self.entries)} products to {self.path}")
+        except Exception as e:
+            logger.error(f"❌ Failed to save product store: {e}")
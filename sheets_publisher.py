@@ -4,18 +4,293 @@ import gspread
 from google.oauth2.service_account import Credentials
 import json
 import logging
+import random
+import threading
 import time
+from collections import deque
 from gspread.exceptions import APIError
+from gspread.utils import rowcol_to_a1
+
+from politeness import parse_retry_after
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 3
-RETRY_DELAY = 5  # seconds
+# Retries for quota and transient API errors, with exponential backoff
+# (RETRY_DELAY * 2^attempt, capped at RETRY_MAX_DELAY) plus up to a second
+# of random jitter, or the server's Retry-After when it sends one
+MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+RETRY_DELAY = 2  # seconds
+RETRY_MAX_DELAY = 64  # seconds
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+# Sheets API quota: requests per minute per user. Requests wait for a free
+# slot in the current minute instead of running into 429s.
+WRITES_PER_MINUTE = int(os.getenv("SHEETS_WRITES_PER_MINUTE", "60"))
+READS_PER_MINUTE = int(os.getenv("SHEETS_READS_PER_MINUTE", "60"))
+
+# Uploads are split into row blocks whose JSON payload stays under the
+# recommended 2 MB request size
+MAX_REQUEST_BYTES = int(os.getenv("SHEETS_MAX_REQUEST_BYTES", str(2 * 1024 * 1024)))
+MAX_BLOCK_ROWS = int(os.getenv("SHEETS_MAX_BLOCK_ROWS", "10000"))
+
+# "diff" writes only the rows that changed since the last publish; "full"
+# clears the worksheet and uploads every cell
+PUBLISH_MODE = os.getenv("PUBLISH_MODE", "diff")
+# Column that identifies a product row in diff mode
+KEY_COLUMN = "id"
+
+def block_range(first_row, first_col, rows, cols):
+    """A1 range of a rows x cols block, e.g. block_range(2, 27, 1, 3) -> "AA2:AC2"."""
+    return f"{rowcol_to_a1(first_row, first_col)}:{rowcol_to_a1(first_row + rows - 1, first_col + cols - 1)}"
+
+def row_range(row, first_col, width):
+    """A1 range of width cells in one row."""
+    return block_range(row, first_col, 1, width)
+
+def payload_size(value):
+    """Approximate JSON size of a request value in bytes."""
+    return len(json.dumps(value, default=str, ensure_ascii=False).encode("utf-8"))
+
+def split_by_size(items, max_bytes=MAX_REQUEST_BYTES, max_items=MAX_BLOCK_ROWS):
+    """Split a list into consecutive blocks under max_bytes and max_items each."""
+    blocks = []
+    block = []
+    size = 2
+    for item in items:
+        item_size = payload_size(item)
+        # Items after the first also take a ", " separator inside the JSON list
+        if block and (size + 2 + item_size > max_bytes or len(block) >= max_items):
+            blocks.append(block)
+            block = []
+            size = 2
+        size += item_size + (2 if block else 0)
+        block.append(item)
+    if block:
+        blocks.append(block)
+    return blocks
+
+class MinuteQuota:
+    def __init__(self, limit, clock=time.monotonic, sleep=time.sleep, window=60.0):
+        """
+        Sliding-window request quota.
+
+        Args:
+            limit: Requests allowed per window.
+            clock: Monotonic clock in seconds.
+            sleep: Sleep function, called while the window is full.
+            window: Window length in seconds.
+        """
+        self.limit = limit
+        self.clock = clock
+        self.sleep = sleep
+        self.window = window
+        self.sent = deque()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request fits in the window, then count it."""
+        while True:
+            with self._lock:
+                now = self.clock()
+                # Small tolerance so a wait of exactly the remaining time frees the slot
+                while self.sent and now - self.sent[0] >= self.window - 1e-6:
+                    self.sent.popleft()
+                if len(self.sent) < self.limit:
+                    self.sent.append(now)
+                    return
+                delay = self.sent[0] + self.window - now
+            logger.info(f"⏳ Sheets quota of {self.limit} requests/minute reached; waiting {delay:.1f}s")
+            self.waited += delay
+            self.sleep(delay)
+
+# Shared by every worksheet in the process, like the quota itself
+write_quota = MinuteQuota(WRITES_PER_MINUTE)
+read_quota = MinuteQuota(READS_PER_MINUTE)
+
+class ChunkedSheetUploader:
+    def __init__(self, worksheet, write_quota=write_quota, read_quota=read_quota, sleep=time.sleep,
+                 rng=random, max_request_bytes=MAX_REQUEST_BYTES, max_block_rows=MAX_BLOCK_ROWS):
+        """
+        Quota-aware, retrying request layer for one worksheet.
+
+        Args:
+            worksheet: gspread Worksheet (or anything with the same methods).
+            write_quota: MinuteQuota for write requests.
+            read_quota: MinuteQuota for read requests.
+            sleep: Sleep function used between retries.
+            rng: Random source for backoff jitter.
+            max_request_bytes: Payload size limit of one request.
+            max_block_rows: Row limit of one request.
+        """
+        self.worksheet = worksheet
+        self.write_quota = write_quota
+        self.read_quota = read_quota
+        self.sleep = sleep
+        self.rng = rng
+        self.max_request_bytes = max_request_bytes
+        self.max_block_rows = max_block_rows
+        self.stats = {"requests": 0, "retries": 0}
+
+    def backoff(self, attempt, error):
+        """Seconds to wait before retry number attempt (1-based)."""
+        retry_after = parse_retry_after(getattr(getattr(error, "response", None), "headers", {}).get("Retry-After"))
+        if retry_after is not None:
+            return retry_after
+        return min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** (attempt - 1)) + self.rng.uniform(0, 1)
+
+    def call(self, action, description, write=True):
+        """
+        Run one API request under the quota, retrying quota and transient
+        errors with backoff. Other API errors are raised immediately.
+        """
+        quota = self.write_quota if write else self.read_quota
+        for attempt in range(MAX_RETRIES + 1):
+            quota.acquire()
+            self.stats["requests"] += 1
+            try:
+                return action()
+            except APIError as e:
+                if getattr(e, "code", None) not in RETRYABLE_CODES or attempt == MAX_RETRIES:
+                    logger.error(f"APIError on attempt {attempt + 1} of {description}: {e}")
+                    raise
+                delay = self.backoff(attempt + 1, e)
+                self.stats["retries"] += 1
+                logger.warning(f"APIError on attempt {attempt + 1} of {description}: {e}; retrying in {delay:.1f}s")
+                self.sleep(delay)
+
+    def _blocks(self, items):
+        return split_by_size(items, self.max_request_bytes, self.max_block_rows)
+
+    def read_values(self):
+        """All values of the worksheet, in one read request."""
+        return self.call(self.worksheet.get_all_values, "sheet read", write=False)
+
+    def ensure_size(self, rows, cols=0):
+        """Grow the worksheet grid to at least rows x cols."""
+        worksheet = self.worksheet
+        if rows > worksheet.row_count:
+            self.call(lambda: worksheet.add_rows(rows - worksheet.row_count), "row resize")
+        if cols > worksheet.col_count:
+            self.call(lambda: worksheet.add_cols(cols - worksheet.col_count), "column resize")
+
+    def update_rows(self, rows, first_row=1, first_col=1):
+        """Write rows starting at (first_row, first_col), one request per block."""
+        row = first_row
+        for block in self._blocks(rows):
+            width = max(len(values) for values in block)
+            range_name = block_range(row, first_col, len(block), width)
+            self.call(lambda: self.worksheet.update(range_name=range_name, values=block, value_input_option='RAW'),
+                      f"upload of {range_name}")
+            row += len(block)
+
+    def batch_update(self, data):
+        """Write {"range", "values"} entries, packed into as few requests as fit."""
+        for block in self._blocks(data):
+            self.call(lambda: self.worksheet.batch_update(block, raw=True), f"batch update of {len(block)} ranges")
+
+    def append_rows(self, rows):
+        """Append rows after the last row of the table, one request per block."""
+        for block in self._blocks(rows):
+            self.call(lambda: self.worksheet.append_rows(block, value_input_option='RAW'),
+                      f"append of {len(block)} rows")
+
+    def delete_rows(self, rows):
+        """Delete row numbers, as runs of adjacent rows in one request."""
+        # Runs bottom-up, so each deletion leaves the rows above it in place
+        runs = []
+        for row in sorted(rows, reverse=True):
+            if runs and runs[-1][0] == row + 1:
+                runs[-1][0] = row
+            else:
+                runs.append([row, row])
+        requests = [{
+            "deleteDimension": {
+                "range": {"sheetId": self.worksheet.id, "dimension": "ROWS",
+                          "startIndex": first - 1, "endIndex": last}
+            }
+        } for first, last in runs]
+        for block in self._blocks(requests):
+            self.call(lambda: self.worksheet.spreadsheet.batch_update({"requests": block}), "row deletion")
+
+def read_feed_values(csv_file_path):
+    """Header and rows of a feed CSV as the exact strings in the file."""
+    df = pd.read_csv(csv_file_path, dtype=str, keep_default_na=False)
+    return df.columns.tolist(), df.values.tolist()
+
+def diff_sheet_rows(current, header, rows, key=KEY_COLUMN):
+    """
+    Plan the writes that turn the worksheet values `current` into
+    header + rows, matching product rows by their key column.
+
+    Changed rows are rewritten from their first to their last changed cell.
+    New rows fill the slots of removed rows first and are then appended;
+    slots left over are deleted. The sheet keeps its row order, so rows
+    that did not change are never touched.
+
+    Returns:
+        dict with "writes" ((row, first_col, values) in sheet coordinates),
+        "deletes" (row numbers), "last_row" and inserted/updated/deleted
+        counts, or None when the sheet needs a full rewrite (empty sheet,
+        different header, no key column or duplicate keys in the feed).
+    """
+    width = len(header)
+    if not current or key not in header:
+        return None
+    sheet_header = current[0]
+    if sheet_header[:width] != header or any(sheet_header[width:]):
+        return None
+    key_col = header.index(key)
+
+    target = {}
+    for row in rows:
+        row_key = row[key_col]
+        if not row_key or row_key in target:
+            return None
+        target[row_key] = row
+
+    writes = []
+    placed = set()
+    free_rows = []
+    updated = 0
+    for number, values in enumerate(current[1:], start=2):
+        values = (values + [""] * width)[:width]
+        row_key = values[key_col]
+        if row_key not in target or row_key in placed:
+            free_rows.append(number)
+            continue
+        placed.add(row_key)
+        new_values = target[row_key]
+        changed = [col for col in range(width) if values[col] != new_values[col]]
+        if changed:
+            updated += 1
+            writes.append((number, changed[0] + 1, new_values[changed[0]:changed[-1] + 1]))
+
+    inserts = [row for row_key, row in target.items() if row_key not in placed]
+    next_row = len(current) + 1
+    for index, new_values in enumerate(inserts):
+        if index < len(free_rows):
+            number = free_rows[index]
+        else:
+            number = next_row
+            next_row += 1
+        writes.append((number, 1, new_values))
+    deletes = free_rows[len(inserts):]
+
+    return {
+        "writes": writes,
+        "deletes": deletes,
+        "last_row": next_row - 1,
+        "inserted": len(inserts),
+        "updated": updated,
+        "deleted": len(deletes),
+    }
 
 class GoogleSheetsPublisher:
-    def __init__(self, credentials_json_string, spreadsheet_id, worksheet_name=None):
+    def __init__(self, credentials_json_string=None, spreadsheet_id=None, worksheet_name=None, worksheet=None,
+                 uploader_factory=ChunkedSheetUploader):
         """
         Initialize the Google Sheets publisher.
 
@@ -23,9 +298,17 @@ class GoogleSheetsPublisher:
             credentials_json_string: JSON string of service account credentials.
             spreadsheet_id: The Google Sheets spreadsheet ID.
             worksheet_name: Worksheet tab name to update; defaults to first sheet if None.
+            worksheet: Worksheet to publish to instead of opening spreadsheet_id
+                (e.g. a fake in tests); no credentials are needed then.
+            uploader_factory: Builds the request layer for a worksheet.
         """
         self.spreadsheet_id = spreadsheet_id
         self.worksheet_name = worksheet_name
+        self.worksheet = worksheet
+        self.uploader_factory = uploader_factory
+        self.gc = None
+        if worksheet is not None:
+            return
 
         # Parse credentials and authorize client
         credentials_dict = json.loads(credentials_json_string)
@@ -39,6 +322,31 @@ class GoogleSheetsPublisher:
         self.gc = gspread.authorize(self.credentials)
         logger.info("Google Sheets client authorized successfully.")
 
+    def open_worksheet(self):
+        """The target worksheet, created when it does not exist yet."""
+        if self.worksheet is not None:
+            return self.worksheet
+
+        logger.info(f"Opening spreadsheet ID: {self.spreadsheet_id}")
+        spreadsheet = self.gc.open_by_key(self.spreadsheet_id)
+
+        # Get or create worksheet
+        if self.worksheet_name:
+            try:
+                worksheet = spreadsheet.worksheet(self.worksheet_name)
+                logger.info(f"Found existing worksheet: '{self.worksheet_name}'")
+            except gspread.WorksheetNotFound:
+                worksheet = spreadsheet.add_worksheet(title=self.worksheet_name, rows=1000, cols=50)
+                logger.info(f"Created new worksheet: '{self.worksheet_name}'")
+        else:
+            worksheet = spreadsheet.sheet1
+            logger.info(f"Using first worksheet: '{worksheet.title}'")
+        return worksheet
+
+    def uploader(self, worksheet):
+        """The quota-aware request layer for a worksheet."""
+        return self.uploader_factory(worksheet)
+
     def clear_and_update_sheet(self, csv_file_path):
         """
         Clear the worksheet and upload CSV data in bulk.
@@ -51,54 +359,33 @@ class GoogleSheetsPublisher:
             bool: True on success, False on failure.
         """
         try:
-            logger.info(f"Opening spreadsheet ID: {self.spreadsheet_id}")
-            spreadsheet = self.gc.open_by_key(self.spreadsheet_id)
-
-            # Get or create worksheet
-            if self.worksheet_name:
-                try:
-                    worksheet = spreadsheet.worksheet(self.worksheet_name)
-                    logger.info(f"Found existing worksheet: '{self.worksheet_name}'")
-                except gspread.WorksheetNotFound:
-                    worksheet = spreadsheet.add_worksheet(title=self.worksheet_name, rows=1000, cols=50)
-                    logger.info(f"Created new worksheet: '{self.worksheet_name}'")
-            else:
-                worksheet = spreadsheet.sheet1
-                logger.info(f"Using first worksheet: '{worksheet.title}'")
+            worksheet = self.open_worksheet()
+            uploader = self.uploader(worksheet)
 
-            # Read CSV data into DataFrame
+            # Exact strings from the CSV, as in diff mode, so ids and prices
+            # are not reformatted (602 -> "602.0") and the next diff matches
             logger.info(f"Reading CSV file: {csv_file_path}")
-            df = pd.read_csv(csv_file_path)
-            df.fillna('', inplace=True)  # Replace NaNs with empty strings
+            header, rows = read_feed_values(csv_file_path)
 
             # Clear existing worksheet content
             logger.info("Clearing existing worksheet content...")
-            worksheet.clear()
+            uploader.call(worksheet.clear, "worksheet clear")
 
             # Prepare data: header + rows ONLY (no metadata)
-            data_to_upload = [df.columns.tolist()] + df.values.tolist()
+            data_to_upload = [header] + rows
             total_rows = len(data_to_upload)
-            total_cols = len(df.columns)
+            total_cols = len(header)
 
             logger.info(f"Uploading {total_rows} rows and {total_cols} columns to Google Sheets...")
             logger.info("CLEAN MODE: No metadata will be added to prevent Merchant Center conflicts")
 
-            # Retry wrapper for worksheet update
-            for attempt in range(1, MAX_RETRIES + 1):
-                try:
-                    worksheet.update(
-                        range_name=f'A1:{chr(64 + total_cols)}{total_rows}',
-                        values=data_to_upload,
-                        value_input_option='RAW'
-                    )
-                    logger.info("Data upload succeeded - CLEAN feed with no metadata interference")
-                    break
-                except APIError as e:
-                    logger.error(f"APIError on attempt {attempt} of data upload: {e}")
-                    if attempt == MAX_RETRIES:
-                        raise
-                    logger.info(f"Retrying in {RETRY_DELAY} seconds...")
-                    time.sleep(RETRY_DELAY)
+            # Diff publishes delete rows, so the grid may be smaller than the feed
+            uploader.ensure_size(total_rows, total_cols)
+
+            # Row blocks under the request size limit, each retried on its own
+            uploader.update_rows(data_to_upload)
+            logger.info(f"Data upload succeeded in {uploader.stats['requests']} requests "
+                        f"({uploader.stats['retries']} retries) - CLEAN feed with no metadata interference")
 
             # NO METADATA SECTION - This was causing Merchant Center to treat metadata as products!
             # The following section has been REMOVED to prevent merchant feed conflicts:
@@ -107,7 +394,7 @@ class GoogleSheetsPublisher:
             # - Generated By text
             # These were being interpreted as product data by Google Merchant Center
 
-            logger.info(f"✅ Successfully updated Google Sheets with {len(df)} products (CLEAN VERSION)")
+            logger.info(f"✅ Successfully updated Google Sheets with {len(rows)} products (CLEAN VERSION)")
             logger.info("🚨 IMPORTANT: No metadata added to prevent Merchant Center conflicts")
             return True
 
@@ -115,6 +402,61 @@ class GoogleSheetsPublisher:
             logger.error(f"❌ Error updating Google Sheets: {e}")
             return False
 
+    def diff_and_update_sheet(self, csv_file_path):
+        """
+        Write only the rows that changed since the last publish.
+
+        The current sheet values are read once and compared with the CSV by
+        product id; changed cells, new rows and removed rows are sent in one
+        values batch_update and one row-deletion batch_update (split only
+        when they exceed the request size limit). Falls back
+        to clear_and_update_sheet when the sheet cannot be diffed (empty,
+        different header, no or duplicate ids).
+
+        Args:
+            csv_file_path: Path to CSV file containing data.
+
+        Returns:
+            bool: True on success, False on failure.
+        """
+        try:
+            worksheet = self.open_worksheet()
+            uploader = self.uploader(worksheet)
+            header, rows = read_feed_values(csv_file_path)
+            current = uploader.read_values()
+
+            plan = diff_sheet_rows(current, header, rows)
+            if plan is None:
+                logger.info("Sheet layout differs from the feed; falling back to a full upload")
+                return self.clear_and_update_sheet(csv_file_path)
+
+            if not plan["writes"] and not plan["deletes"]:
+                logger.info(f"✅ Google Sheets already matches the feed ({len(rows)} products); nothing to upload")
+                return True
+
+            uploader.ensure_size(plan["last_row"])
+
+            if plan["writes"]:
+                uploader.batch_update([{"range": row_range(row, first_col, len(values)), "values": [values]}
+                                       for row, first_col, values in plan["writes"]])
+
+            if plan["deletes"]:
+                uploader.delete_rows(plan["deletes"])
+
+            logger.info(f"✅ Updated Google Sheets with {len(rows)} products: {plan['inserted']} inserted, "
+                        f"{plan['updated']} updated, {plan['deleted']} deleted (CLEAN VERSION)")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error updating Google Sheets: {e}")
+            return False
+
+    def publish(self, csv_file_path):
+        """Publish a feed CSV with the configured PUBLISH_MODE."""
+        if PUBLISH_MODE == "full":
+            return self.clear_and_update_sheet(csv_file_path)
+        return self.diff_and_update_sheet(csv_file_path)
+
     def append_to_sheet(self, csv_file_path):
         """
         Append rows from CSV to existing worksheet.
@@ -127,15 +469,16 @@ class GoogleSheetsPublisher:
             bool: True on success, False on failure.
         """
         try:
-            spreadsheet = self.gc.open_by_key(self.spreadsheet_id)
-            worksheet = spreadsheet.worksheet(self.worksheet_name)
-
-            df = pd.read_csv(csv_file_path)
-            data_to_append = df.values.tolist()
+            if self.worksheet is not None:
+                worksheet = self.worksheet
+            else:
+                spreadsheet = self.gc.open_by_key(self.spreadsheet_id)
+                worksheet = spreadsheet.worksheet(self.worksheet_name)
 
-            worksheet.append_rows(data_to_append, value_input_option='RAW')
+            _, rows = read_feed_values(csv_file_path)
+            self.uploader(worksheet).append_rows(rows)
 
-            logger.info(f"✅ Successfully appended {len(df)} products to Google Sheets (CLEAN VERSION)")
+            logger.info(f"✅ Successfully appended {len(rows)} products to Google Sheets (CLEAN VERSION)")
             return True
 
         except Exception as e:
@@ -163,7 +506,7 @@ def main():
         worksheet_name=WORKSHEET_NAME
     )
 
-    success = publisher.clear_and_update_sheet(CSV_FILE_PATH)
+    success = publisher.publish(CSV_FILE_PATH)
 
     if success:
         logger.info("🎉 Google Sheets update completed successfully! (CLEAN VERSION)")
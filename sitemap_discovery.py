@@ -0,0 +1,210 @@
+"""
+Product discovery from sitemaps and structured data.
+
+- robots.txt "Sitemap:" entries plus /sitemap.xml, following sitemap indexes
+  (gzip-compressed sitemaps included) and keeping each URL's <lastmod>
+- JSON-LD ItemList / Product blocks embedded in listing pages
+
+The crawler uses these as a fast path: when a source lists the whole catalogue
+the paginated HTML crawl is skipped, and lastmod lets the feed generator
+re-extract only products modified since their last extraction.
+"""
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from urllib.parse import urljoin
+
+from lxml import etree
+
+from http_client import FETCH_ERRORS, build_headers, fetch
+
+logger = logging.getLogger(__name__)
+
+# A sitemap is trusted as complete when it lists at least this share of the
+# products already known, and never fewer than SITEMAP_MIN_PRODUCTS
+SITEMAP_COMPLETE_RATIO = float(os.getenv("SITEMAP_COMPLETE_RATIO", "0.95"))
+SITEMAP_MIN_PRODUCTS = int(os.getenv("SITEMAP_MIN_PRODUCTS", "100"))
+
+# Upper bound on sitemap documents fetched per run (indexes included)
+MAX_SITEMAPS = int(os.getenv("MAX_SITEMAPS", "50"))
+
+_XML_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+
+def normalize_lastmod(value):
+    """W3C datetime from a sitemap as a naive UTC ISO string ("" if invalid)."""
+    value = (value or "").strip()
+    if not value:
+        return ""
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return ""
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+def clean_product_url(url, base_url):
+    """Absolute on-site product URL without query/fragment, or None."""
+    if not isinstance(url, str) or "/product/" not in url:
+        return None
+    full_url = urljoin(base_url, url.strip()).split("?")[0].split("#")[0]
+    return full_url if full_url.startswith(base_url) else None
+
+def robots_sitemaps(base_url):
+    """Sitemap URLs declared in robots.txt."""
+    robots_url = urljoin(base_url, "/robots.txt")
+    try:
+        response = fetch(robots_url, headers=build_headers(), timeout=10)
+    except FETCH_ERRORS as e:
+        logger.warning(f"⚠️ Could not fetch {robots_url}: {e}")
+        return []
+    if response.status_code != 200:
+        logger.info(f"No robots.txt at {robots_url} (HTTP {response.status_code})")
+        return []
+
+    sitemaps = []
+    for line in response.text.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip().lower() == "sitemap" and value.strip():
+            sitemaps.append(urljoin(base_url, value.strip()))
+    return sitemaps
+
+def parse_sitemap(content):
+    """
+    Parse a sitemap document.
+
+    Returns:
+        ("index", [(loc, lastmod), ...]) for a sitemap index,
+        ("urlset", [(loc, lastmod), ...]) for a URL set, or (None, []) when
+        the document is not a sitemap.
+    """
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    try:
+        root = etree.fromstring(content, parser=_XML_PARSER)
+    except etree.XMLSyntaxError:
+        return None, []
+    if root is None:
+        return None, []
+
+    kind = etree.QName(root).localname
+    if kind == "sitemapindex":
+        entry_tag, kind = "{*}sitemap", "index"
+    elif kind == "urlset":
+        entry_tag = "{*}url"
+    else:
+        return None, []
+
+    entries = []
+    for entry in root.iterfind(entry_tag):
+        loc = entry.findtext("{*}loc")
+        if loc and loc.strip():
+            entries.append((loc.strip(), normalize_lastmod(entry.findtext("{*}lastmod"))))
+    return kind, entries
+
+def discover_sitemap_products(base_url):
+    """
+    Walk every sitemap reachable from robots.txt and /sitemap.xml.
+
+    Returns:
+        {product_url: lastmod} for the product URLs listed (lastmod may be "").
+    """
+    pending = robots_sitemaps(base_url) + [urljoin(base_url, "/sitemap.xml")]
+    seen = set()
+    products = {}
+
+    while pending and len(seen) < MAX_SITEMAPS:
+        sitemap_url = pending.pop(0)
+        if sitemap_url in seen:
+            continue
+        seen.add(sitemap_url)
+        try:
+            response = fetch(sitemap_url, headers=build_headers({"Accept": "application/xml,text/xml;q=0.9,*/*;q=0.8"}))
+        except FETCH_ERRORS as e:
+            logger.warning(f"⚠️ Could not fetch sitemap {sitemap_url}: {e}")
+            continue
+        if response.status_code != 200:
+            logger.info(f"No sitemap at {sitemap_url} (HTTP {response.status_code})")
+            continue
+
+        kind, entries = parse_sitemap(response.content)
+        if kind == "index":
+            logger.info(f"🗺️ Sitemap index {sitemap_url}: {len(entries)} child sitemaps")
+            pending.extend(urljoin(sitemap_url, loc) for loc, _ in entries)
+        elif kind == "urlset":
+            found = 0
+            for loc, lastmod in entries:
+                product_url = clean_product_url(loc, base_url)
+                if product_url:
+                    # Keep the newest lastmod if a URL is listed twice
+                    products[product_url] = max(products.get(product_url, ""), lastmod)
+                    found += 1
+            logger.info(f"🗺️ Sitemap {sitemap_url}: {len(entries)} URLs, {found} products")
+        else:
+            logger.info(f"Ignoring {sitemap_url}: not a sitemap document")
+
+    if pending:
+        logger.warning(f"⚠️ Stopped after {MAX_SITEMAPS} sitemaps, {len(pending)} left unread")
+    return products
+
+def _json_ld_nodes(data):
+    """Yield every JSON object in a JSON-LD document, including @graph members."""
+    if isinstance(data, list):
+        for item in data:
+            yield from _json_ld_nodes(item)
+    elif isinstance(data, dict):
+        yield data
+        for key in ("@graph", "itemListElement", "item", "mainEntity"):
+            if key in data:
+                yield from _json_ld_nodes(data[key])
+
+def _node_types(node):
+    types = node.get("@type", [])
+    return set(types if isinstance(types, list) else [types])
+
+def json_ld_product_links(soup, base_url):
+    """
+    Product URLs from the JSON-LD blocks of a page.
+
+    Returns:
+        (urls, declared_total): URLs of Product nodes and ItemList entries in
+        document order, and the largest ItemList numberOfItems declared on the
+        page (None when no list declares one).
+    """
+    urls = []
+    declared_total = None
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or script.get_text() or "null")
+        except (TypeError, ValueError):
+            continue
+        for node in _json_ld_nodes(data):
+            types = _node_types(node)
+            if "ItemList" in types:
+                try:
+                    total = int(node.get("numberOfItems"))
+                    declared_total = max(declared_total or 0, total)
+                except (TypeError, ValueError):
+                    pass
+            candidates = []
+            if "Product" in types or "ListItem" in types:
+                candidates.extend([node.get("url"), node.get("@id")])
+                item = node.get("item")
+                if isinstance(item, str):
+                    candidates.append(item)
+                elif isinstance(item, dict):
+                    candidates.extend([item.get("url"), item.get("@id")])
+            for candidate in candidates:
+                product_url = clean_product_url(candidate, base_url)
+                if product_url:
+                    if product_url not in urls:
+                        urls.append(product_url)
+                    break
+    return urls, declared_total
+
+def is_complete(found, known, min_products=SITEMAP_MIN_PRODUCTS, ratio=SITEMAP_COMPLETE_RATIO):
+    """Whether a source listing `found` products can replace the HTML crawl."""
+    return found >= max(min_products, ratio * known)
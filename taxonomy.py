@@ -0,0 +1,185 @@
+"""
+Google product taxonomy service.
+
+Parses google_product_taxonomy.txt ("<id> - <A > B > C>" per line) once into
+an indexed structure shared by the validator, the category fixer and the
+category updater:
+
+- id -> path and path -> id (exact and case-insensitive)
+- parent, children and ancestors of a category
+
+The indexes are pickled next to the taxonomy, keyed by the SHA-256 of the
+text file, so later loads skip parsing entirely and a new taxonomy download
+is picked up automatically.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+
+logger = logging.getLogger(__name__)
+
+TAXONOMY_FILE = os.getenv("TAXONOMY_FILE", "google_product_taxonomy.txt")
+# Pickled index; defaults to "<taxonomy file without extension>.pickle"
+TAXONOMY_CACHE_FILE = os.getenv("TAXONOMY_CACHE_FILE", "")
+
+# Bump when the pickled layout changes
+CACHE_FORMAT = 1
+
+PATH_SEPARATOR = " > "
+
+class Taxonomy:
+    def __init__(self, entries, version="", file_hash=""):
+        """
+        Build the indexes.
+
+        Args:
+            entries: (category_id, path) pairs in file order.
+            version: Version line of the taxonomy file, if any.
+            file_hash: SHA-256 of the taxonomy file.
+        """
+        self.version = version
+        self.file_hash = file_hash
+        self.paths = {}
+        self.ids = {}
+        self._ids_lower = {}
+        self.parents = {}
+        self.child_ids = {}
+
+        for category_id, path in entries:
+            self.paths[category_id] = path
+            self.ids[path] = category_id
+            self._ids_lower.setdefault(path.lower(), category_id)
+            self.child_ids.setdefault(category_id, [])
+
+        for category_id, path in self.paths.items():
+            parent_path, _, _ = path.rpartition(PATH_SEPARATOR)
+            parent_id = self.ids.get(parent_path) if parent_path else None
+            self.parents[category_id] = parent_id
+            if parent_id is not None:
+                self.child_ids[parent_id].append(category_id)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, category_id):
+        """Whether a category ID (int or numeric string) exists."""
+        return self.normalize_id(category_id) in self.paths
+
+    @staticmethod
+    def normalize_id(category_id):
+        """A category ID as int, or None when it is not numeric."""
+        try:
+            return int(str(category_id).strip())
+        except ValueError:
+            return None
+
+    def path(self, category_id, default=None):
+        """Full path of a category, e.g. "Home & Garden > Decor > Vases"."""
+        return self.paths.get(self.normalize_id(category_id), default)
+
+    def name(self, category_id, default=None):
+        """Last segment of a category's path."""
+        path = self.path(category_id)
+        return path.rpartition(PATH_SEPARATOR)[2] if path else default
+
+    def id_for(self, path, default=None):
+        """Category ID of a path (case-insensitive)."""
+        path = path.strip()
+        if path in self.ids:
+            return self.ids[path]
+        return self._ids_lower.get(path.lower(), default)
+
+    def parent(self, category_id):
+        """Parent category ID, or None for top-level (and unknown) categories."""
+        return self.parents.get(self.normalize_id(category_id))
+
+    def children(self, category_id):
+        """Direct subcategory IDs, in taxonomy order."""
+        return list(self.child_ids.get(self.normalize_id(category_id), []))
+
+    def ancestors(self, category_id):
+        """Ancestor IDs from the top-level category down to the parent."""
+        chain = []
+        parent = self.parent(category_id)
+        while parent is not None:
+            chain.append(parent)
+            parent = self.parents.get(parent)
+        return chain[::-1]
+
+    def id_strings(self):
+        """Every category ID as a string (for validating feed values)."""
+        return {str(category_id) for category_id in self.paths}
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def parse_taxonomy(path=TAXONOMY_FILE, file_hash=""):
+    """Parse the taxonomy text file into a Taxonomy."""
+    entries = []
+    version = ""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                if "Version" in line and not version:
+                    version = line.partition(":")[2].strip()
+                continue
+            id_text, separator, category_path = line.partition(" - ")
+            if not separator:
+                continue
+            try:
+                entries.append((int(id_text.strip()), category_path.strip()))
+            except ValueError:
+                continue
+    return Taxonomy(entries, version=version, file_hash=file_hash)
+
+# Taxonomies loaded in this process, by (file, hash)
+_loaded = {}
+
+def load_taxonomy(path=TAXONOMY_FILE, cache_path=None):
+    """
+    The taxonomy of a file, from the pickle cache when it was built from the
+    same file contents, otherwise parsed and cached.
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Taxonomy file not found: {path}")
+    if cache_path is None:
+        cache_path = TAXONOMY_CACHE_FILE or f"{os.path.splitext(path)[0]}.pickle"
+
+    file_hash = file_sha256(path)
+    key = (os.path.abspath(path), file_hash)
+    if key in _loaded:
+        return _loaded[key]
+
+    taxonomy = None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("format") == CACHE_FORMAT and cached.get("file_hash") == file_hash:
+                taxonomy = cached["taxonomy"]
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable taxonomy cache {cache_path}: {e}")
+
+    if taxonomy is None:
+        taxonomy = parse_taxonomy(path, file_hash)
+        if cache_path:
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"format": CACHE_FORMAT, "file_hash": file_hash, "taxonomy": taxonomy}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        logger.info(f"✅ Parsed {len(taxonomy)} taxonomy categories from {path} and cached them in {cache_path}")
+    else:
+        logger.info(f"✅ Loaded {len(taxonomy)} taxonomy categories from cache {cache_path}")
+
+    _loaded[key] = taxonomy
+    return taxonomy
@@ -0,0 +1,127 @@
+"""
+In-memory stand-in for a gspread Worksheet.
+
+Holds a grid of cell values, records every API call in `calls` and raises
+queued APIErrors (e.g. 429) on the next requests, so the uploader and the
+publisher run without credentials or network access.
+"""
+
+from collections import deque
+
+from gspread.exceptions import APIError
+from gspread.utils import a1_to_rowcol
+
+class FakeResponse:
+    """The parts of a requests.Response that APIError and the uploader read."""
+
+    def __init__(self, code, headers=None):
+        self.status_code = code
+        self.headers = headers or {}
+        self.text = ""
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": f"fake error {self.status_code}", "status": "FAKE"}}
+
+def api_error(code, retry_after=None):
+    """An APIError with an HTTP status code and optional Retry-After header."""
+    headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+    return APIError(FakeResponse(code, headers))
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def batch_update(self, body):
+        self.worksheet._request("spreadsheet.batch_update", body)
+        # Only deleteDimension on rows is used by the uploader
+        for request in body["requests"]:
+            span = request["deleteDimension"]["range"]
+            del self.worksheet.cells[span["startIndex"]:span["endIndex"]]
+            self.worksheet.row_count -= span["endIndex"] - span["startIndex"]
+        return {}
+
+class FakeWorksheet:
+    def __init__(self, values=None, rows=1000, cols=26, title="fake"):
+        """
+        Args:
+            values: Initial cell values, a list of rows.
+            rows: Grid row count.
+            cols: Grid column count.
+            title: Worksheet title.
+        """
+        self.cells = [list(row) for row in values or []]
+        self.row_count = max(rows, len(self.cells))
+        self.col_count = max([cols] + [len(row) for row in self.cells])
+        self.title = title
+        self.id = 0
+        self.spreadsheet = FakeSpreadsheet(self)
+        self.calls = []
+        self.failures = deque()
+
+    def fail_next(self, *errors):
+        """Raise these errors (APIError instances) on the next requests, in order."""
+        self.failures.extend(errors)
+
+    def _request(self, name, payload=None):
+        self.calls.append((name, payload))
+        if self.failures:
+            raise self.failures.popleft()
+
+    def requests(self, name):
+        """Payloads of the recorded calls of one method."""
+        return [payload for call, payload in self.calls if call == name]
+
+    def _write(self, row, col, values):
+        last_row = row + len(values) - 1
+        last_col = col + max(len(v) for v in values) - 1
+        if last_row > self.row_count or last_col > self.col_count:
+            raise api_error(400)
+        while len(self.cells) < last_row:
+            self.cells.append([])
+        for offset, row_values in enumerate(values):
+            cells = self.cells[row - 1 + offset]
+            cells.extend([""] * (col - 1 + len(row_values) - len(cells)))
+            cells[col - 1:col - 1 + len(row_values)] = [str(value) for value in row_values]
+
+    def values(self):
+        """Cell values trimmed and padded like get_all_values(), without a request."""
+        rows = [list(row) for row in self.cells]
+        for row in rows:
+            while row and row[-1] == "":
+                row.pop()
+        while rows and not rows[-1]:
+            rows.pop()
+        width = max([len(row) for row in rows] + [0])
+        return [row + [""] * (width - len(row)) for row in rows]
+
+    def get_all_values(self):
+        self._request("get_all_values")
+        return self.values()
+
+    def clear(self):
+        self._request("clear")
+        self.cells = []
+
+    def add_rows(self, rows):
+        self._request("add_rows", rows)
+        self.row_count += rows
+
+    def add_cols(self, cols):
+        self._request("add_cols", cols)
+        self.col_count += cols
+
+    def update(self, range_name, values, value_input_option=None):
+        self._request("update", {"range": range_name, "values": values})
+        self._write(*a1_to_rowcol(range_name.split(":")[0]), values)
+
+    def batch_update(self, data, raw=True):
+        self._request("batch_update", data)
+        for entry in data:
+            self._write(*a1_to_rowcol(entry["range"].split(":")[0]), entry["values"])
+
+    def append_rows(self, values, value_input_option=None):
+        self._request("append_rows", values)
+        row = len(self.values()) + 1
+        # The API grows the grid for appended rows
+        self.row_count = max(self.row_count, row + len(values) - 1)
+        self._write(row, 1, values)
@@ -0,0 +1,68 @@
+import csv
+import random
+
+import pytest
+from lxml import etree
+
+import feed_writers
+from feed_writers import CsvFeedWriter, ExternalSorter, XmlFeedWriter, sub_element
+
+G_NS = "http://base.google.com/ns/1.0"
+
+def test_external_sorter_merges_spilled_runs_in_key_order(tmp_path):
+    rng = random.Random(7)
+    records = [(rng.randrange(50), position) for position in range(200)]
+    sorter = ExternalSorter(buffer_size=16, spill_dir=str(tmp_path))
+    for key, position in records:
+        sorter.add(key, (key, position))
+
+    assert len(sorter._runs) == 200 // 16
+    # Equal keys keep insertion order across runs
+    assert list(sorter.sorted()) == sorted(records)
+    sorter.close()
+    assert sorter._runs == []
+
+def item(link):
+    element = etree.Element("item")
+    sub_element(element, "title", f"Product {link}")
+    sub_element(element, f"{{{G_NS}}}link", link)
+    return element
+
+def write_rss(path, links, sort):
+    writer = XmlFeedWriter(str(path), "rss", attrib={"version": "2.0"}, nsmap={"g": G_NS}, container="channel",
+                           indent="  ", sort_key=(lambda e: e.findtext(f"{{{G_NS}}}link")) if sort else None)
+    for link in links:
+        writer.write(item(link))
+    return writer.close()
+
+def test_sorted_xml_matches_records_written_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(feed_writers, "SORT_BUFFER_RECORDS", 4)
+    links = [f"https://x/{n:02d}" for n in range(23)]
+    shuffled = random.Random(1).sample(links, len(links))
+
+    assert write_rss(tmp_path / "sorted.xml", shuffled, sort=True) == 23
+    write_rss(tmp_path / "ordered.xml", links, sort=False)
+    sorted_xml = (tmp_path / "sorted.xml").read_bytes()
+    assert sorted_xml == (tmp_path / "ordered.xml").read_bytes()
+    # The g prefix is declared once, on <rss>
+    assert sorted_xml.count(b"xmlns:g=") == 1
+
+def test_csv_feed_is_sorted_from_the_partial_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(feed_writers, "SORT_BUFFER_RECORDS", 3)
+    path = tmp_path / "feed.csv"
+    writer = CsvFeedWriter(str(path), ["id", "title", "link"])
+    links = [f"https://x/{n:02d}" for n in range(10)]
+    for n, link in enumerate(random.Random(2).sample(links, len(links))):
+        writer.write({"id": n, "title": f"Line one\nline {n}, \"quoted\"", "link": link})
+    assert (tmp_path / "feed.csv.partial").exists()
+
+    assert writer.close() == 10
+    with open(path, newline="", encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    assert [row["link"] for row in rows] == links
+    assert all(row["title"] == f"Line one\nline {row['id']}, \"quoted\"" for row in rows)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["feed.csv"]
+
+def test_csv_sort_key_must_be_a_field(tmp_path):
+    with pytest.raises(ValueError):
+        CsvFeedWriter(str(tmp_path / "feed.csv"), ["id", "title"])
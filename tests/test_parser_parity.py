@@ -0,0 +1,57 @@
+import glob
+import os
+
+import pytest
+
+from product_feed_generator import parse_product_html
+from product_parsers import extract_fields_bs4, extract_fields_lxml, parser_parity_diff
+
+PAGES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "product_pages", "*.html")))
+
+def read_page(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+@pytest.fixture(params=PAGES, ids=lambda path: os.path.basename(path)[:-5])
+def page(request):
+    return read_page(request.param)
+
+def test_fixture_pages_exist():
+    assert len(PAGES) >= 3
+
+def test_backends_extract_the_same_fields(page):
+    assert extract_fields_lxml(page) == extract_fields_bs4(page)
+    assert parser_parity_diff(page) == {}
+
+def test_backends_build_the_same_product(page):
+    url = "https://www.joyandco.com/products/fixture-product"
+    assert parse_product_html(page, url, {}, backend="lxml") == parse_product_html(page, url, {}, backend="bs4")
+
+def page_fields(name):
+    return extract_fields_lxml(read_page(os.path.join(os.path.dirname(PAGES[0]), name)))
+
+def test_sale_price_page():
+    fields = page_fields("sale_price.html")
+    # The struck-through price comes first in the price element
+    assert fields["price"] == "150.00"
+    assert fields["price_note"] == "Only 2 left in stock - last items!"
+    assert fields["title"] == "Ceramic Vase – Sand"
+    assert fields["breadcrumbs"] == ["Home & Living", "Decor"]
+    assert fields["variant_options"] == [("Small", "s"), ("Large", "l")]
+    assert fields["code_info"] == "Product code - CV1205"
+
+def test_missing_fields_page():
+    fields = page_fields("missing_fields.html")
+    assert fields["title"] is None
+    assert fields["price"] is None
+    assert fields["image_link"] == ""
+    assert fields["images"] == []
+    assert fields["breadcrumbs"] == []
+    assert fields["variant_options"] == []
+
+def test_multiple_images_page():
+    fields = page_fields("multiple_images.html")
+    assert fields["image_link"] == "https://cdn.example.com/rings-2.jpg"
+    assert fields["images"] == [f"https://cdn.example.com/rings-{n}.jpg" for n in (1, 2, 3, 4)]
+    assert fields["out_of_stock"] is True
+    assert fields["price"] == "89.00"
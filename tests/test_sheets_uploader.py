@@ -0,0 +1,228 @@
+import pytest
+from gspread.exceptions import APIError
+
+import sheets_publisher
+from fake_gspread import FakeWorksheet, api_error
+from sheets_publisher import (
+    ChunkedSheetUploader, GoogleSheetsPublisher, MinuteQuota, payload_size, split_by_size
+)
+
+class FakeClock:
+    """Monotonic clock that only moves when sleep() is called."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class FixedJitter:
+    def uniform(self, low, high):
+        return 0.5
+
+def make_uploader(worksheet, clock=None, limit=1000, **kwargs):
+    clock = clock or FakeClock()
+    quota = MinuteQuota(limit, clock=clock, sleep=clock.sleep)
+    return ChunkedSheetUploader(worksheet, write_quota=quota, read_quota=quota, sleep=clock.sleep,
+                                rng=FixedJitter(), **kwargs)
+
+def rows(count, width=3):
+    return [[f"r{row:03d}c{col}" for col in range(width)] for row in range(count)]
+
+# ── chunk boundaries ──
+
+def test_split_by_size_keeps_every_block_under_the_byte_limit():
+    items = rows(50)
+    limit = payload_size(items[:7])
+    blocks = split_by_size(items, max_bytes=limit, max_items=1000)
+
+    assert [item for block in blocks for item in block] == items
+    assert all(payload_size(block) <= limit for block in blocks)
+    # The limit is exactly seven rows' worth, so blocks are full
+    assert [len(block) for block in blocks] == [7] * 7 + [1]
+
+def test_split_by_size_row_limit():
+    assert [len(block) for block in split_by_size(rows(7), max_items=3)] == [3, 3, 1]
+
+def test_split_by_size_keeps_an_oversized_item_on_its_own():
+    big = ["x" * 100]
+    blocks = split_by_size([["a"], big, ["b"]], max_bytes=20)
+    assert blocks == [[["a"]], [big], [["b"]]]
+
+def test_update_rows_sends_one_request_per_block():
+    worksheet = FakeWorksheet()
+    data = rows(7)
+    make_uploader(worksheet, max_block_rows=3).update_rows(data)
+
+    assert [request["range"] for request in worksheet.requests("update")] == ["A1:C3", "A4:C6", "A7:C7"]
+    assert worksheet.values() == data
+
+def test_batch_update_splits_by_payload_size():
+    worksheet = FakeWorksheet()
+    data = [{"range": f"A{row}:C{row}", "values": [values]} for row, values in enumerate(rows(20), start=1)]
+    limit = payload_size(data[:5])
+    make_uploader(worksheet, max_request_bytes=limit).batch_update(data)
+
+    requests = worksheet.requests("batch_update")
+    # Ranges of later rows are longer ("A10:C10"), so those blocks hold fewer
+    assert len(requests[0]) == 5
+    assert [entry for request in requests for entry in request] == data
+    assert all(payload_size(request) <= limit for request in requests)
+    assert worksheet.values() == rows(20)
+
+def test_delete_rows_merges_adjacent_rows_bottom_up():
+    worksheet = FakeWorksheet(rows(10))
+    make_uploader(worksheet).delete_rows([3, 4, 5, 8])
+
+    (body,) = worksheet.requests("spreadsheet.batch_update")
+    spans = [(r["deleteDimension"]["range"]["startIndex"], r["deleteDimension"]["range"]["endIndex"])
+             for r in body["requests"]]
+    assert spans == [(7, 8), (2, 5)]
+    assert worksheet.values() == [row for number, row in enumerate(rows(10), start=1) if number not in (3, 4, 5, 8)]
+
+def test_ensure_size_grows_the_grid_only_when_needed():
+    worksheet = FakeWorksheet(rows=10, cols=5)
+    uploader = make_uploader(worksheet)
+    uploader.ensure_size(8, 5)
+    assert worksheet.calls == []
+    uploader.ensure_size(12, 7)
+    assert (worksheet.row_count, worksheet.col_count) == (12, 7)
+
+# ── backoff ──
+
+def test_429_is_retried_with_exponential_backoff_and_jitter():
+    worksheet = FakeWorksheet()
+    worksheet.fail_next(api_error(429), api_error(429), api_error(503))
+    clock = FakeClock()
+    uploader = make_uploader(worksheet, clock)
+    uploader.update_rows(rows(2))
+
+    assert clock.sleeps == [2.5, 4.5, 8.5]
+    assert uploader.stats == {"requests": 4, "retries": 3}
+    assert worksheet.values() == rows(2)
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(sheets_publisher, "MAX_RETRIES", 8)
+    worksheet = FakeWorksheet()
+    worksheet.fail_next(*[api_error(429) for _ in range(8)])
+    clock = FakeClock()
+    make_uploader(worksheet, clock).update_rows(rows(1))
+
+    assert clock.sleeps == [2.5, 4.5, 8.5, 16.5, 32.5, 64.5, 64.5, 64.5]
+
+def test_retry_after_header_replaces_the_backoff():
+    worksheet = FakeWorksheet()
+    worksheet.fail_next(api_error(429, retry_after=7))
+    clock = FakeClock()
+    make_uploader(worksheet, clock).update_rows(rows(1))
+
+    assert clock.sleeps == [7]
+
+def test_non_retryable_errors_are_raised_at_once():
+    worksheet = FakeWorksheet()
+    worksheet.fail_next(api_error(400))
+    clock = FakeClock()
+    with pytest.raises(APIError):
+        make_uploader(worksheet, clock).update_rows(rows(1))
+    assert clock.sleeps == []
+    assert len(worksheet.requests("update")) == 1
+
+def test_retries_give_up_after_max_retries():
+    worksheet = FakeWorksheet()
+    worksheet.fail_next(*[api_error(429) for _ in range(sheets_publisher.MAX_RETRIES + 1)])
+    with pytest.raises(APIError):
+        make_uploader(worksheet).update_rows(rows(1))
+    assert len(worksheet.requests("update")) == sheets_publisher.MAX_RETRIES + 1
+
+# ── quota ──
+
+def test_quota_waits_for_the_oldest_request_to_leave_the_window():
+    clock = FakeClock()
+    quota = MinuteQuota(2, clock=clock, sleep=clock.sleep)
+    quota.acquire()
+    clock.now = 10.0
+    quota.acquire()
+    quota.acquire()
+
+    assert clock.sleeps == [50.0]
+    assert quota.waited == 50.0
+    assert list(quota.sent) == [10.0, 60.0]
+
+def test_uploader_requests_wait_on_the_quota():
+    worksheet = FakeWorksheet()
+    clock = FakeClock()
+    uploader = make_uploader(worksheet, clock, limit=3, max_block_rows=1)
+    uploader.update_rows(rows(7))
+
+    # Three requests per minute: rows 4-6 wait for the first window, row 7 for the second
+    assert clock.sleeps == [60.0, 60.0]
+    assert len(worksheet.requests("update")) == 7
+
+def test_retries_count_against_the_quota():
+    worksheet = FakeWorksheet()
+    worksheet.fail_next(api_error(429))
+    clock = FakeClock()
+    make_uploader(worksheet, clock, limit=1).update_rows(rows(1))
+
+    # Backoff of 2.5s, then the rest of the minute for the retry's slot
+    assert clock.sleeps == [2.5, 57.5]
+
+# ── publisher with an injected worksheet ──
+
+def write_feed(path, header, feed_rows):
+    path.write_text("\n".join(",".join(row) for row in [header] + feed_rows) + "\n", encoding="utf-8")
+    return str(path)
+
+def make_publisher(worksheet):
+    return GoogleSheetsPublisher(worksheet=worksheet, uploader_factory=make_uploader)
+
+def test_publisher_runs_without_credentials(tmp_path):
+    worksheet = FakeWorksheet(rows=2, cols=2)
+    header = ["id", "title", "link"]
+    feed = [["a", "Vase", "https://x/a"], ["b", "Bowl", "https://x/b"], ["c", "Cup", "https://x/c"]]
+    publisher = make_publisher(worksheet)
+
+    assert publisher.gc is None
+    assert publisher.clear_and_update_sheet(write_feed(tmp_path / "feed.csv", header, feed))
+    assert worksheet.values() == [header] + feed
+
+def test_publisher_diff_writes_only_changed_rows(tmp_path):
+    header = ["id", "title", "link"]
+    feed = [["a", "Vase", "https://x/a"], ["b", "Bowl", "https://x/b"], ["c", "Cup", "https://x/c"]]
+    worksheet = FakeWorksheet([header] + feed)
+    feed[1][1] = "Big Bowl"
+    del feed[2]
+    feed.append(["d", "Plate", "https://x/d"])
+
+    assert make_publisher(worksheet).diff_and_update_sheet(write_feed(tmp_path / "feed.csv", header, feed))
+    (data,) = worksheet.requests("batch_update")
+    assert data == [{"range": "B3:B3", "values": [["Big Bowl"]]},
+                    {"range": "A4:C4", "values": [["d", "Plate", "https://x/d"]]}]
+    assert worksheet.values() == [header] + feed
+
+def test_full_upload_keeps_csv_strings_so_the_next_diff_is_empty(tmp_path):
+    header = ["id", "title", "price", "sale_price"]
+    feed = [["602", "Vase", "120.00 AED", ""], ["0731", "Bowl", "85.50", "NA"], ["9", "Cup", "7", "5"]]
+    path = write_feed(tmp_path / "feed.csv", header, feed)
+    worksheet = FakeWorksheet()
+    publisher = make_publisher(worksheet)
+
+    assert publisher.clear_and_update_sheet(path)
+    assert worksheet.values() == [header] + feed
+
+    worksheet.calls.clear()
+    assert publisher.diff_and_update_sheet(path)
+    assert [call for call, _ in worksheet.calls] == ["get_all_values"]
+
+def test_append_keeps_csv_strings(tmp_path):
+    header = ["id", "price"]
+    worksheet = FakeWorksheet([header, ["1", "10"]])
+    publisher = make_publisher(worksheet)
+
+    assert publisher.append_to_sheet(write_feed(tmp_path / "feed.csv", header, [["002", ""], ["3", "4.50"]]))
+    assert worksheet.values() == [header, ["1", "10"], ["002", ""], ["3", "4.50"]]
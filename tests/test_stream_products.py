@@ -0,0 +1,58 @@
+import glob
+import os
+
+import pytest
+
+import product_feed_generator
+from product_feed_generator import extract_products, stream_products
+
+PAGE = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "product_pages", "*.html")))[0]
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode("utf-8")
+
+@pytest.fixture
+def fake_fetch(monkeypatch):
+    with open(PAGE, encoding="utf-8") as f:
+        page = f.read()
+    monkeypatch.setattr(product_feed_generator, "fetch_product_page", lambda url, cached=None: FakeResponse(page))
+
+def product_urls(count, pulled, fail_at=None):
+    for n in range(count):
+        if n == fail_at:
+            raise RuntimeError("discovery broke")
+        pulled.append(n)
+        yield f"https://www.joyandco.com/products/item-{n:02d}"
+
+def test_feeder_keeps_at_most_max_in_flight_urls_unfinished(fake_fetch):
+    pulled = []
+    finished = 0
+    for url, data in stream_products(product_urls(30, pulled), {}, fetch_workers=2, parse_workers=1,
+                                     max_in_flight=3):
+        assert data is not None
+        finished += 1
+        # The feeder may hold one more URL while it waits for a slot
+        assert len(pulled) - finished <= 3 + 1
+    assert finished == 30
+
+def test_feeder_errors_are_raised_after_submitted_urls_finish(fake_fetch):
+    results = []
+    with pytest.raises(RuntimeError, match="discovery broke"):
+        for url, data in stream_products(product_urls(10, [], fail_at=5), {}, fetch_workers=2, parse_workers=1):
+            results.append(url)
+    assert len(results) == 5
+
+def test_extract_products_fills_every_position_of_a_repeated_url(fake_fetch):
+    a, b = "https://www.joyandco.com/products/a", "https://www.joyandco.com/products/b"
+    calls = []
+    results = extract_products([a, b, a, a], {}, fetch_workers=2, parse_workers=1,
+                               on_result=lambda i, url, data: calls.append((i, url)))
+
+    assert all(results)
+    assert results[0] == results[2] == results[3]
+    assert results[0]["link"] == a and results[1]["link"] == b
+    assert sorted(calls) == [(0, a), (1, b)]